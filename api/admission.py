@@ -0,0 +1,124 @@
+import math
+from typing import Any, Callable, Dict
+from fastapi import HTTPException
+from api.asgi import header_value
+from api.v1.edi.responses import EDIJSONResponse
+from funcs.utils.admission import get_admission_limiter, get_admission_unit_bytes, request_weight
+from funcs.utils.edi_logging import log_edi
+from funcs.utils.server_config import get_max_body_bytes
+from funcs.utils.stage_timing import stage
+
+# Only the EDI endpoints are admission controlled; health checks and metrics always answer
+ADMISSION_PATH_PREFIX = "/v1/edi"
+
+
+class RequestTooLarge(HTTPException):
+    """
+    The request body grew past EDI_MAX_BODY_BYTES while it was being read.
+    An HTTPException, so handlers that wrap body parsing errors let it through.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(
+            status_code=413,
+            detail={
+                "message": f"Request body exceeds {max_bytes} bytes",
+                "code": "PAYLOAD_TOO_LARGE"
+            },
+            headers={"Connection": "close"}
+        )
+
+
+def too_large_response(max_bytes: int) -> EDIJSONResponse:
+    error = RequestTooLarge(max_bytes)
+    return EDIJSONResponse({"detail": error.detail}, status_code=error.status_code, headers=error.headers)
+
+
+class BodySizeLimitMiddleware:
+    """
+    Pure ASGI middleware rejecting request bodies over EDI_MAX_BODY_BYTES
+    with 413, before a handler buffers them.
+
+    A declared Content-Length is checked up front; chunked bodies are
+    counted as they arrive. If a streaming handler has already started
+    its response when the limit is hit, the connection is dropped instead.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.max_bytes = get_max_body_bytes()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or self.max_bytes <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = header_value(scope, b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            await too_large_response(self.max_bytes)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            if received > self.max_bytes:
+                raise RequestTooLarge(self.max_bytes)
+            return message
+
+        async def tracking_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestTooLarge:
+            if response_started:
+                raise
+            await too_large_response(self.max_bytes)(scope, receive, send)
+
+
+class AdmissionMiddleware:
+    """
+    Pure ASGI middleware limiting the EDI work a worker takes on at once.
+
+    Each request is weighted by its Content-Length (see request_weight)
+    and holds its units until its response has been sent. When the
+    limiter is full, requests queue for up to EDI_ADMISSION_QUEUE_TIMEOUT
+    seconds and are then shed with 503 SERVER_BUSY and Retry-After, so
+    latency stays bounded instead of growing with the backlog.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.unit_bytes = get_admission_unit_bytes()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        limiter = get_admission_limiter()
+        if scope["type"] != "http" or limiter is None or not scope["path"].startswith(ADMISSION_PATH_PREFIX):
+            await self.app(scope, receive, send)
+            return
+
+        weight = request_weight(header_value(scope, b"content-length"), self.unit_bytes)
+
+        with stage("admission"):
+            shed_reason = await limiter.acquire(weight)
+        if shed_reason is not None:
+            log_edi("warning", "Shedding %s %s (%s, weight %d)", scope["method"], scope["path"], shed_reason, weight)
+            response = EDIJSONResponse(
+                {"detail": {"message": "Server is busy, retry later", "code": "SERVER_BUSY"}},
+                status_code=503,
+                headers={"Retry-After": str(max(1, math.ceil(limiter.timeout)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(weight)
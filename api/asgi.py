@@ -0,0 +1,9 @@
+from typing import Any, Dict, Optional
+
+
+def header_value(scope: Dict[str, Any], name: bytes) -> Optional[str]:
+    """First value of the request header name (lowercase) in an ASGI scope, or None."""
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
@@ -0,0 +1,189 @@
+import time
+from typing import Any, Callable, Dict, Optional
+from fastapi import APIRouter, Header, HTTPException, Query, Response
+from api.asgi import header_value
+from api.v1.edi.responses import EDIJSONResponse
+from funcs.utils.profiling import PSTATS_SORT_KEYS, get_profile_store, get_profiling_token, token_matches
+from funcs.utils.stage_timing import collect_stage_timings, server_timing_enabled
+
+# Request header carrying EDI_PROFILING_TOKEN, to profile a request or read profiles
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+# Response header naming the stored profile of a profiled request
+PROFILE_ID_HEADER = "X-Profile-Id"
+# Where profiles are read; requests to it are never profiled themselves
+PROFILES_PATH = "/v1/debug/profiles"
+
+
+class ServerTimingMiddleware:
+    """
+    Pure ASGI middleware timing the stages of each request (parse, cache,
+    decode, validate, render, serialize, log) and reporting them in a
+    Server-Timing response header.
+
+    Stages are recorded by stage() blocks in the router and services; the
+    header is added when the response starts, so work done while a
+    streaming response is being sent is not included.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+        self.enabled = server_timing_enabled()
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        with collect_stage_timings() as timings:
+            async def timed_receive():
+                message = await receive()
+                if message["type"] == "http.request" and not message.get("more_body", False):
+                    timings.body_received = time.perf_counter()
+                return message
+
+            async def timing_send(message):
+                if message["type"] == "http.response.start":
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                    message = {**message, "headers": headers}
+                await send(message)
+
+            await self.app(scope, timed_receive, timing_send)
+
+
+class ProfilingMiddleware:
+    """
+    Pure ASGI middleware running cProfile over requests that carry a valid
+    X-Profile-Token header, keeping the result in the profile store.
+
+    Off unless EDI_PROFILING_TOKEN is set. One request is profiled at a
+    time per worker; others sent meanwhile are served unprofiled.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http" or get_profiling_token() is None or scope["path"].startswith(PROFILES_PATH):
+            await self.app(scope, receive, send)
+            return
+        if not token_matches(header_value(scope, PROFILE_TOKEN_HEADER.lower().encode("latin-1"))):
+            await self.app(scope, receive, send)
+            return
+
+        store = get_profile_store()
+        started = store.try_start()
+        if started is None:
+            await self.app(scope, receive, send)
+            return
+
+        profile_id, profiler = started
+        started_at = time.time()
+        start = time.perf_counter()
+        status = 500
+
+        async def profiled_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((PROFILE_ID_HEADER.lower().encode("latin-1"), profile_id.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            store.finish(profile_id, profiler, scope["method"], scope["path"], status,
+                         started_at, time.perf_counter() - start)
+
+
+router = APIRouter(
+    prefix=PROFILES_PATH,
+    tags=["Diagnostics"]
+)
+
+
+def check_profile_token(token: Optional[str]):
+    """Profiles are only served when profiling is on and the request carries its token."""
+    if get_profiling_token() is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": "Profiling is disabled",
+                "code": "PROFILING_DISABLED"
+            }
+        )
+    if not token_matches(token):
+        raise HTTPException(
+            status_code=403,
+            detail={
+                "message": f"A valid {PROFILE_TOKEN_HEADER} header is required",
+                "code": "FORBIDDEN"
+            }
+        )
+
+
+def stored_profile(profile_id: str):
+    profile = get_profile_store().get(profile_id)
+    if profile is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": f"No profile {profile_id} in this worker",
+                "code": "PROFILE_NOT_FOUND"
+            }
+        )
+    return profile
+
+
+@router.get("", response_class=EDIJSONResponse)
+async def list_profiles(token: Optional[str] = Header(None, alias=PROFILE_TOKEN_HEADER)):
+    """
+    Profiles of requests sent with X-Profile-Token, newest first
+
+    Profiles are kept in memory per worker process.
+    """
+    check_profile_token(token)
+    profiles = get_profile_store().list()
+    return EDIJSONResponse({
+        "status": "success",
+        "profiles": [profile.summary() for profile in profiles]
+    })
+
+
+@router.get("/{profile_id}", response_class=Response)
+async def download_profile(profile_id: str, token: Optional[str] = Header(None, alias=PROFILE_TOKEN_HEADER)):
+    """
+    One profile in the pstats file format, for pstats, snakeviz or similar tools
+    """
+    check_profile_token(token)
+    profile = stored_profile(profile_id)
+    return Response(
+        profile.stats,
+        media_type="application/octet-stream",
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile.id}.prof"'}
+    )
+
+
+@router.get("/{profile_id}/text", response_class=Response)
+async def profile_text(
+    profile_id: str,
+    sort: str = Query("cumulative", description=f"One of: {', '.join(PSTATS_SORT_KEYS)}"),
+    limit: int = Query(50, ge=1, le=1000, description="Functions listed"),
+    token: Optional[str] = Header(None, alias=PROFILE_TOKEN_HEADER)
+):
+    """
+    One profile as pstats prints it
+    """
+    check_profile_token(token)
+    if sort not in PSTATS_SORT_KEYS:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": f"Unsupported sort: {sort}. Use one of: {', '.join(PSTATS_SORT_KEYS)}",
+                "code": "INVALID_SORT"
+            }
+        )
+    profile = stored_profile(profile_id)
+    return Response(profile.text(sort, limit), media_type="text/plain")
@@ -0,0 +1,161 @@
+import time
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+from fastapi import APIRouter, Response
+from services.edi_cache import get_decode_cache, get_generate_cache
+from funcs.utils.metrics import (
+    LATENCY_BUCKETS,
+    PROMETHEUS_CONTENT_TYPE,
+    REGISTRY,
+    SIZE_BUCKETS,
+    CallbackMetric,
+    Counter,
+    Histogram
+)
+
+# Route label of requests no route matched, so unknown paths cannot grow the label set
+UNMATCHED_ROUTE = "unmatched"
+
+REQUESTS = Counter(
+    "edi_http_requests_total",
+    "HTTP requests by method, route template and status code",
+    ("method", "route", "status"),
+    registry=REGISTRY
+)
+REQUEST_DURATION = Histogram(
+    "edi_http_request_duration_seconds",
+    "Time from receiving a request to sending the last byte of its response",
+    ("method", "route"),
+    registry=REGISTRY,
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_SIZE = Histogram(
+    "edi_http_request_size_bytes",
+    "Request body bytes received",
+    ("method", "route"),
+    registry=REGISTRY,
+    buckets=SIZE_BUCKETS
+)
+RESPONSE_SIZE = Histogram(
+    "edi_http_response_size_bytes",
+    "Response body bytes sent",
+    ("method", "route"),
+    registry=REGISTRY,
+    buckets=SIZE_BUCKETS
+)
+REQUESTS_IN_PROGRESS = CallbackMetric(
+    "edi_http_requests_in_progress",
+    "HTTP requests being handled by this worker",
+    "gauge",
+    lambda: [((), MetricsMiddleware.in_progress)],
+    registry=REGISTRY
+)
+
+
+def iter_cache_stats() -> Iterator[Tuple[str, Dict[str, int]]]:
+    for name, get_cache in (("decode", get_decode_cache), ("generate", get_generate_cache)):
+        cache = get_cache()
+        if cache is not None:
+            yield name, cache.stats()
+
+
+def cache_stat(key: str) -> Callable[[], Iterator[Tuple[Tuple[str, ...], float]]]:
+    def samples():
+        for name, stats in iter_cache_stats():
+            yield (name,), stats[key]
+    return samples
+
+
+def cache_hit_ratio() -> Iterator[Tuple[Tuple[str, ...], float]]:
+    for name, stats in iter_cache_stats():
+        lookups = stats["hits"] + stats["misses"]
+        yield (name,), stats["hits"] / lookups if lookups else 0.0
+
+
+for _key, _type, _help in (
+    ("hits", "counter", "Cache lookups served from the cache"),
+    ("misses", "counter", "Cache lookups that missed, including expired entries"),
+    ("evictions", "counter", "Entries evicted to stay within the entry or byte budget"),
+    ("entries", "gauge", "Entries held"),
+    ("bytes", "gauge", "Approximate bytes held"),
+):
+    CallbackMetric(f"edi_cache_{_key}" + ("_total" if _type == "counter" else ""), _help, _type,
+                   cache_stat(_key), ("cache",), registry=REGISTRY)
+CallbackMetric("edi_cache_hit_ratio", "Hits over lookups since the worker started", "gauge",
+               cache_hit_ratio, ("cache",), registry=REGISTRY)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route request counts, latency and
+    body sizes.
+
+    Routes are labelled by their path template (e.g. /v1/edi/decode), looked
+    up from the endpoint the router matched, so path parameters and unknown
+    paths never create new series. The cost is two clock reads and a few
+    dict updates per request; bodies are counted, never copied.
+    """
+
+    in_progress = 0
+
+    def __init__(self, app: Any):
+        self.app = app
+        self._route_paths: Optional[Dict[Any, str]] = None
+
+    def route_label(self, scope: Dict[str, Any]) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        if self._route_paths is None:
+            self._route_paths = {
+                getattr(route, "endpoint", None): route.path
+                for route in scope["app"].routes
+                if hasattr(route, "path")
+            }
+        return self._route_paths.get(endpoint, UNMATCHED_ROUTE)
+
+    async def __call__(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        received = 0
+        sent = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal received
+            message = await receive()
+            received += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal sent, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                sent += len(message.get("body", b""))
+            await send(message)
+
+        MetricsMiddleware.in_progress += 1
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            MetricsMiddleware.in_progress -= 1
+            method = scope["method"]
+            route = self.route_label(scope)
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_DURATION.observe(time.perf_counter() - start, method, route)
+            REQUEST_SIZE.observe(received, method, route)
+            RESPONSE_SIZE.observe(sent, method, route)
+
+
+router = APIRouter(tags=["Monitoring"])
+
+
+@router.get("/metrics", response_class=Response)
+async def metrics():
+    """
+    Metrics of this worker process in the Prometheus text format
+    """
+    return Response(REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
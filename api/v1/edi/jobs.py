@@ -0,0 +1,104 @@
+import asyncio
+from typing import Any, Dict, List, Literal, Optional
+from fastapi import APIRouter, HTTPException, Request
+from pydantic import BaseModel, Field
+from api.v1.edi.responses import EDIJSONResponse
+from api.v1.edi.router import offload
+from services.edi_jobs import JOBS_SUBMITTED, get_job_runner, get_job_store
+from services.edi_serializer import RawJSON
+from funcs.utils.edi_logging import log_edi
+
+router = APIRouter(
+    prefix="/v1/edi/jobs",
+    tags=["EDI Jobs"]
+)
+
+class JobRequest(BaseModel):
+    """Request model for a job: the /decode or /generate request body, plus its type"""
+    type: Literal["decode", "generate"]
+    edi: Optional[str] = Field(None, description="EDI message of a decode job")
+    cargo_items: Optional[List[Dict[str, Any]]] = Field(None, description="Cargo items of a generate job")
+
+def job_runner_or_404():
+    runner = get_job_runner()
+    if runner is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": "Jobs are disabled",
+                "code": "JOBS_DISABLED"
+            }
+        )
+    return runner
+
+@router.post("", status_code=202, response_class=EDIJSONResponse)
+async def submit_job(job_request: JobRequest, request: Request):
+    """
+    Queue a decode or generate job for large messages and bookings
+
+    Returns at once with 202 and the job, whose status and result are at
+    the URL in the Location header. Jobs run in background processes of
+    any worker on this host, at a lower priority than requests.
+    """
+    runner = job_runner_or_404()
+    if job_request.type == "decode" and not job_request.edi:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "EDI message is required",
+                "code": "EMPTY_EDI"
+            }
+        )
+    if job_request.type == "generate" and not job_request.cargo_items:
+        raise HTTPException(
+            status_code=400,
+            detail={
+                "message": "No cargo items provided",
+                "code": "EMPTY_CARGO_ITEMS"
+            }
+        )
+
+    # The job process parses the body again, so it is stored as received.
+    # In a thread: the insert may wait for another process's transaction
+    body = await request.body()
+    job = await asyncio.to_thread(get_job_store().create, job_request.type, body)
+    JOBS_SUBMITTED.inc(job.type)
+    runner.notify()
+    log_edi("info", "Queued %s job %s (%d bytes)", job.type, job.id, len(body))
+
+    return EDIJSONResponse(
+        {"status": "success", "job": job.to_dict()},
+        status_code=202,
+        headers={"Location": f"{router.prefix}/{job.id}"}
+    )
+
+@router.get("/{job_id}", response_class=EDIJSONResponse)
+async def get_job(job_id: str):
+    """
+    Status and progress of a job, and its result once it has succeeded
+
+    The result is the body the synchronous /decode or /generate endpoint
+    would have returned. Jobs are kept for EDI_JOB_TTL seconds after they
+    finish.
+    """
+    job_runner_or_404()
+    store = get_job_store()
+    job = store.get(job_id)
+    if job is None:
+        raise HTTPException(
+            status_code=404,
+            detail={
+                "message": f"No job {job_id}, or it has expired",
+                "code": "JOB_NOT_FOUND"
+            }
+        )
+
+    result = None
+    if job.state == "succeeded":
+        text = await offload(job.result_size, store.result, job_id)
+        result = RawJSON(text) if text is not None else None
+    return EDIJSONResponse({
+        "status": "success",
+        "job": job.to_dict(),
+        "result": result
+    })
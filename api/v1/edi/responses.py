@@ -0,0 +1,39 @@
+from typing import Any
+from starlette.responses import Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+from services.edi_serializer import dump_envelope
+
+
+class EDIJSONResponse(Response):
+    """
+    JSON response for the EDI endpoints.
+
+    Renders the envelope with dump_envelope instead of jsonable_encoder and
+    json.dumps, so decoded items (as RawJSON) and large EDI strings are
+    written to bytes once, without intermediate dict copies. Pre-rendered
+    bytes are sent unchanged.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dump_envelope(content)
+
+
+class BodyStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse for endpoints that keep reading the request body while
+    the response is being sent.
+
+    The stock StreamingResponse listens for client disconnects by pulling
+    messages from receive(), which would swallow request body chunks. Here
+    the body iterator owns receive(); a disconnect surfaces as ClientDisconnect
+    from request.stream() instead.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+
+        if self.background is not None:
+            await self.background()
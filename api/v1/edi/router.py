@@ -1,11 +1,39 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List, Dict, Any
-from pydantic import BaseModel
-from services.edi_decoder import decode_edi_to_items
-from services.edi_generator import generate_edi_message
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from typing import List, Dict, Any, AsyncIterator, Callable, Optional, Tuple, Union
+from pydantic import BaseModel, Field, ValidationError
+from api.v1.edi.responses import BodyStreamingResponse, EDIJSONResponse
+from services.edi_decoder import DecodedCargoItem, StreamingEDIDecoder, decode_edi_bytes, decode_edi_records
+from services.edi_cache import (
+    IdempotencyKeyMismatch,
+    get_decode_cache,
+    get_generate_cache,
+    make_bytes_cache_key,
+    make_cache_key,
+    make_etag,
+    make_payload_fingerprint
+)
+from services.edi_batch import decode_edi_batch, generate_edi_batch
+from services.edi_generator import generate_edi_message, iter_edi_message
+from services.edi_serializer import RawJSON, cargo_items_json, dump_cargo_item, dump_envelope
+from services.edi_validator import check_edi_message
 from services.form_validator import EDIFormRequest
-from funcs.utils.edi_logging import log_edi
-import logging
+from funcs.utils.edi_logging import log_edi, capture_request_logs, PayloadPreview
+from funcs.utils.metrics import ITEMS_DECODED, ITEMS_GENERATED
+from funcs.utils.offload import ExecutorSaturated, run_offloaded
+from funcs.utils.process_pool import map_in_process_pool
+from funcs.utils.stage_timing import record_body_parsing, stage
+import codecs
+import email.message
+import json
+
+# Error caps of /validate
+DEFAULT_VALIDATE_MAX_ERRORS = 100
+MAX_VALIDATE_MAX_ERRORS = 10000
+
+# Content types accepted by /decode/raw
+RAW_EDI_MEDIA_TYPES = ("application/edifact", "text/plain")
 
 # Create router with prefix
 router = APIRouter(
@@ -13,95 +41,457 @@ router = APIRouter(
     tags=["EDI Operations"]
 )
 
-# Memory handler for logging
-class MemoryHandler(logging.Handler):
-    def __init__(self):
-        super().__init__()
-        self.logs = []
-        
-    def emit(self, record):
-        log_entry = self.format(record)
-        self.logs.append(log_entry)
-        
-    def get_logs(self):
-        return self.logs
-        
-    def clear(self):
-        self.logs = []
-
-# Initialize memory log handler
-memory_handler = MemoryHandler()
-memory_handler.setFormatter(logging.Formatter("%(asctime)s - %(levelname)s - %(message)s"))
-
-# Get EDIService logger and add memory handler
-edi_logger = logging.getLogger("EDIService")
-edi_logger.addHandler(memory_handler)
-
-# Helper function: Remove None values
-def remove_none_values(obj: Dict[str, Any]) -> Dict[str, Any]:
-    return {k: v for k, v in obj.items() if v is not None}
-
 class DecodeRequest(BaseModel):
     """Request model for EDI decoding"""
     edi: str
 
+class ValidateRequest(BaseModel):
+    """Request model for EDI validation"""
+    edi: str
+    fail_fast: bool = Field(False, description="Stop at the first error.")
+    max_errors: int = Field(
+        DEFAULT_VALIDATE_MAX_ERRORS,
+        ge=1,
+        le=MAX_VALIDATE_MAX_ERRORS,
+        description="Stop once this many errors have been found."
+    )
+
+class BatchDecodeRequest(BaseModel):
+    """Request model for batch EDI decoding"""
+    messages: List[str] = Field(
+        ...,
+        min_length=1,
+        description="EDI messages to decode. At least one message is required."
+    )
+
+class BatchGenerateRequest(BaseModel):
+    """Request model for batch EDI generation"""
+    bookings: List[Dict[str, Any]] = Field(
+        ...,
+        min_length=1,
+        description="Bookings shaped like the /generate request body. At least one booking is required."
+    )
+
 class GenerateRequest(BaseModel):
     """Request model for EDI generation"""
     cargo_items: List[dict]
 
-@router.post("/decode")
-async def decode_edi(request: DecodeRequest):
+async def offload(size: int, func: Callable[..., Any], *args: Any) -> Any:
+    """
+    Run CPU-bound func(*args) for a payload of size bytes, off the event loop
+    when it is large. A full executor is reported as 503 with Retry-After.
+    """
+    try:
+        return await run_offloaded(size, func, *args)
+    except ExecutorSaturated as e:
+        log_edi("warning", "Offload executor saturated: %s", e)
+        raise HTTPException(
+            status_code=503,
+            detail={
+                "message": "Server is busy, retry later",
+                "code": "SERVER_BUSY"
+            },
+            headers={"Retry-After": "1"}
+        )
+
+def decode_items_json(decode: Callable[[Any], List[DecodedCargoItem]], edi: Union[str, bytes]) -> Tuple[int, RawJSON]:
+    """Decode edi with decode and serialize the items; the unit of work decode endpoints offload."""
+    records = decode(edi)
+    return len(records), cargo_items_json(records)
+
+async def decode_cached(edi: Union[str, bytes], decode: Callable[[Any], List[DecodedCargoItem]],
+                        make_key: Callable[[Any], str]) -> Tuple[int, RawJSON]:
+    """
+    Decode and serialize edi, through the decode cache if it is enabled.
+
+    The cache holds serialized items and is looked up and filled in this
+    process; only misses are offloaded. A hit never waits in the executor
+    queue, and results decoded in the process pool are still cached.
+    """
+    cache = get_decode_cache()
+    if cache is None:
+        return await offload(len(edi), decode_items_json, decode, edi)
+
+    with stage("cache"):
+        key = make_key(edi)
+    items = cache.lookup(key)
+    if items is not None:
+        return items
+
+    try:
+        items = await offload(len(edi), decode_items_json, decode, edi)
+    except ValueError as e:
+        cache.store_error(key, e)
+        raise
+    cache.store(key, *items)
+    return items
+
+async def decode_response(edi: Union[str, bytes], decode: Callable[[Any], List[DecodedCargoItem]],
+                          make_key: Callable[[Any], str], include_logs: bool) -> EDIJSONResponse:
+    """
+    Shared body of the single-message decode endpoints: decode edi with
+    decode, keyed in the decode cache by make_key, and wrap the items, or
+    the error, in the decode envelope.
+    """
+    with capture_request_logs(include_logs) as captured_logs:
+        if not edi:
+            raise HTTPException(
+                status_code=400, 
+                detail={
+                    "message": "EDI message is required",
+                    "code": "EMPTY_EDI"
+                }
+            )
+
+        try:
+            # Items go straight from decoded records to JSON, None values omitted
+            item_count, items_json = await decode_cached(edi, decode, make_key)
+            ITEMS_DECODED.inc(amount=item_count)
+
+            response = {
+                "status": "success",
+                "cargo_items": items_json
+            }
+            if captured_logs is not None:
+                response["logs"] = list(captured_logs)
+            return EDIJSONResponse(response)
+        except HTTPException:
+            raise
+        except UnicodeDecodeError as e:
+            log_edi("error", "EDI body is not valid UTF-8: %s", e)
+            detail = {
+                "message": "EDI message must be UTF-8 encoded",
+                "code": "INVALID_ENCODING",
+                "error": str(e)
+            }
+            if captured_logs is not None:
+                detail["logs"] = list(captured_logs)
+            raise HTTPException(
+                status_code=400,
+                detail=detail
+            )
+        except Exception as e:
+            log_edi("error", "EDI decoding failed: %s", e)
+            detail = {
+                "message": "EDI decoding failed",
+                "code": "DECODE_ERROR",
+                "error": str(e)
+            }
+            if captured_logs is not None:
+                detail["logs"] = list(captured_logs)
+            raise HTTPException(
+                status_code=500, 
+                detail=detail
+            )
+
+@router.post("/decode", response_class=EDIJSONResponse)
+async def decode_edi(request: DecodeRequest, include_logs: bool = False):
     """
     Decode EDI message into cargo items
+
+    Pass include_logs=true to get the log lines of this request back.
+    Identical resent messages are served from the decode cache.
+    """
+    record_body_parsing()
+    return await decode_response(request.edi, decode_edi_records, make_cache_key, include_logs)
+
+@router.post(
+    "/decode/raw",
+    response_class=EDIJSONResponse,
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {media_type: {"schema": {"type": "string"}} for media_type in RAW_EDI_MEDIA_TYPES}
+        }
+    }
+)
+async def decode_edi_raw(request: Request, include_logs: bool = False):
     """
-    # Clear previous logs
-    memory_handler.clear()
-    
+    Decode a raw EDI body (application/edifact or text/plain, UTF-8) into cargo items
+
+    Same response as /decode, without wrapping the message in JSON. The body
+    is decoded straight from its bytes, one segment at a time.
+    """
+    content_type = request.headers.get("content-type")
+    if content_type:
+        message = email.message.Message()
+        message["content-type"] = content_type
+        if message.get_content_type() not in RAW_EDI_MEDIA_TYPES:
+            raise HTTPException(
+                status_code=415,
+                detail={
+                    "message": f"Unsupported media type: {content_type}. Use one of: {', '.join(RAW_EDI_MEDIA_TYPES)}",
+                    "code": "UNSUPPORTED_MEDIA_TYPE"
+                }
+            )
+
+    body = await request.body()
+    return await decode_response(body, decode_edi_bytes, make_bytes_cache_key, include_logs)
+
+@router.post("/validate", response_class=EDIJSONResponse)
+async def validate_edi(request: ValidateRequest):
+    """
+    Check an EDI message against the segment grammar without decoding it
+
+    Invalid messages are a successful response with valid=false and one
+    structured error (code, line, byte offset, message) per problem found.
+    Checking stops after max_errors errors, or the first with fail_fast;
+    truncated=true then means more errors may follow.
+    """
+    record_body_parsing()
     if not request.edi:
         raise HTTPException(
-            status_code=400, 
+            status_code=400,
             detail={
                 "message": "EDI message is required",
                 "code": "EMPTY_EDI"
             }
         )
 
+    result = await offload(len(request.edi), check_edi_message, request.edi, request.fail_fast, request.max_errors)
+    return EDIJSONResponse({
+        "status": "success",
+        "valid": result.valid,
+        "error_count": len(result.issues),
+        "truncated": result.truncated,
+        "line_count": result.line_count,
+        "errors": [issue.to_dict() for issue in result.issues]
+    })
+
+@router.post("/decode/batch", response_class=EDIJSONResponse)
+async def decode_edi_batch_endpoint(request: BatchDecodeRequest):
+    """
+    Decode many EDI messages in one call.
+
+    Messages are decoded in the shared process pool so the event loop stays
+    free. Each message gets its own result or error, in input order.
+    """
+    record_body_parsing()
+    log_edi("info", "Decoding EDI batch of %d messages", len(request.messages))
+
+    with stage("pool"):
+        results = await map_in_process_pool(decode_edi_batch, request.messages)
+    error_count = sum(1 for result in results if result["status"] == "error")
+    ITEMS_DECODED.inc(amount=sum(len(result["cargo_items"]) for result in results if result["status"] == "success"))
+
+    return EDIJSONResponse({
+        "status": "success",
+        "results": results,
+        "message_count": len(results),
+        "error_count": error_count
+    })
+
+@router.get("/decode/cache", response_class=EDIJSONResponse)
+async def decode_cache_stats():
+    """
+    Hit, miss and eviction counters of this worker's decode cache
+    """
+    cache = get_decode_cache()
+    return EDIJSONResponse({
+        "status": "success",
+        "enabled": cache is not None,
+        "cache": cache.stats() if cache is not None else None
+    })
+
+async def stream_decoded_items(request: Request) -> AsyncIterator[str]:
+    """
+    Decode the raw request body chunk by chunk, yielding NDJSON cargo item
+    lines as soon as each LIN block closes. The final line is a status record.
+    """
+    decoder = StreamingEDIDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+
     try:
-        items = decode_edi_to_items(request.edi)
-        logs = memory_handler.get_logs()
-        
-        # Remove None values
-        cleaned_items = [remove_none_values(item.dict()) for item in items]
-        
-        return {
-            "status": "success",
-            "cargo_items": cleaned_items,
-            "logs": logs
-        }
-    except Exception as e:
-        log_edi("error", f"EDI decoding failed: {str(e)}")
-        logs = memory_handler.get_logs()
-        raise HTTPException(
-            status_code=500, 
-            detail={
-                "message": "EDI decoding failed",
-                "code": "DECODE_ERROR",
-                "logs": logs,
-                "error": str(e)
-            }
+        async for chunk in request.stream():
+            items = decoder.feed(text_decoder.decode(chunk))
+            if items:
+                yield "".join(dump_cargo_item(item) + "\n" for item in items)
+
+        items = decoder.feed(text_decoder.decode(b"", final=True)) + decoder.close()
+        if items:
+            yield "".join(dump_cargo_item(item) + "\n" for item in items)
+
+        ITEMS_DECODED.inc(amount=decoder.item_count)
+        yield json.dumps({"status": "success", "item_count": decoder.item_count}, separators=(",", ":")) + "\n"
+    except ValueError as e:
+        log_edi("error", "EDI stream decoding failed: %s", e)
+        yield json.dumps({
+            "status": "error",
+            "message": "EDI decoding failed",
+            "code": "DECODE_ERROR",
+            "error": str(e),
+            "item_count": decoder.item_count
+        }, separators=(",", ":")) + "\n"
+
+@router.post("/decode/stream")
+async def decode_edi_stream(request: Request):
+    """
+    Decode a raw EDI body (text/plain, optionally chunked) into NDJSON cargo items.
+
+    Items are streamed while the message is still being received, so a
+    later validation error can follow items already sent. Clients must check
+    the final status line before trusting the items.
+    """
+    return BodyStreamingResponse(
+        stream_decoded_items(request),
+        media_type="application/x-ndjson"
+    )
+
+def parse_json_body(body_bytes: bytes, content_type: Optional[str]) -> Any:
+    """
+    Parse a JSON request body the way FastAPI does for a body model parameter:
+    JSON for JSON (or missing) content types, raw bytes otherwise, None when
+    empty. Invalid JSON raises the same 422 error FastAPI would.
+    """
+    if not body_bytes:
+        return None
+
+    if content_type:
+        message = email.message.Message()
+        message["content-type"] = content_type
+        subtype = message.get_content_subtype()
+        if message.get_content_maintype() != "application" or not (subtype == "json" or subtype.endswith("+json")):
+            return body_bytes
+
+    try:
+        with stage("parse"):
+            return json.loads(body_bytes)
+    except json.JSONDecodeError as e:
+        raise RequestValidationError(
+            [{
+                "type": "json_invalid",
+                "loc": ("body", e.pos),
+                "msg": "JSON decode error",
+                "input": {},
+                "ctx": {"error": e.msg}
+            }],
+            body=e.doc
         )
 
-@router.post("/generate")
-async def generate_edi(request: Request, form_data: EDIFormRequest):
+def parse_generate_body(body_bytes: bytes, content_type: Optional[str], fingerprint: bool) -> Tuple[Any, Optional[str]]:
     """
-    Generate EDI message from cargo items
+    Parse a /generate body and, when fingerprint is set, hash it for the
+    response cache; the first unit of work /generate offloads. The
+    fingerprint is None for payloads that are not JSON objects.
+    """
+    payload = parse_json_body(body_bytes, content_type)
+    if not fingerprint or not isinstance(payload, dict):
+        return payload, None
+    with stage("cache"):
+        return payload, make_payload_fingerprint(payload)
+
+def validate_generate_body(payload: Any) -> EDIFormRequest:
     """
+    Validate a /generate body into EDIFormRequest, raising the same 422
+    errors as declaring it as the endpoint's body parameter.
+    """
+    if payload is None:
+        missing = ValidationError.from_exception_data("Field required", [{"type": "missing", "loc": ("body",), "input": None}])
+        raise RequestValidationError(missing.errors())
     try:
-        # Log request data
-        body = await request.json()
-        log_edi("info", f"Received request data: {body}")
+        return EDIFormRequest.model_validate(payload)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors()],
+            body=payload
+        )
+
+def render_generate_body(payload: Any) -> Tuple[int, bytes]:
+    """
+    Validate a /generate body and render its response; the unit of work
+    /generate offloads. Returns (0, b"") when there are no cargo items.
+    """
+    # Includes building the CargoItem models
+    with stage("validate"):
+        form_data = validate_generate_body(payload)
+    if not form_data.cargo_items:
+        return 0, b""
+
+    item_count = len(form_data.cargo_items)
+    log_edi("info", "Validated %d cargo items", item_count)
+
+    edi_output = generate_edi_message(form_data.cargo_items)
+    log_edi("info", "Generated EDI for %d cargo items (%d chars)", item_count, len(edi_output))
+
+    return item_count, dump_envelope({
+        "status": "success",
+        "edi": edi_output,
+        "item_count": item_count
+    })
 
-        if not form_data.cargo_items:
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag."""
+    if if_none_match is None:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+def cached_generate_response(body: bytes, etag: str, if_none_match: Optional[str], replayed: bool = False) -> Response:
+    """The /generate response for a rendered body: 304 when the client already has it."""
+    headers = {"ETag": etag}
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return EDIJSONResponse(body, headers=headers)
+
+@router.post(
+    "/generate",
+    response_class=EDIJSONResponse,
+    # The body is read by hand so cached requests skip validation;
+    # document it as the EDIFormRequest it is validated into
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {"application/json": {"schema": {"$ref": "#/components/schemas/EDIFormRequest"}}}
+        }
+    }
+)
+async def generate_edi(
+    request: Request,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match")
+):
+    """
+    Generate EDI message from cargo items
+
+    Responses carry a strong ETag; send it back in If-None-Match to get a 304.
+    Repeats of a payload (or of an Idempotency-Key) within the cache TTL get
+    the stored response bytes back without revalidating or re-rendering.
+    Reusing an Idempotency-Key with a different payload is rejected with 422.
+    """
+    # The body is parsed exactly once, off the event loop when it is large;
+    # only a bounded preview of it is logged
+    body_bytes = await request.body()
+    cache = get_generate_cache()
+    payload, fingerprint = await offload(
+        len(body_bytes), parse_generate_body, body_bytes, request.headers.get("content-type"), cache is not None
+    )
+    log_edi("debug", "Received request data: %s", PayloadPreview(payload))
+
+    if fingerprint is not None:
+        try:
+            with stage("cache"):
+                cached, replayed = cache.lookup(fingerprint, idempotency_key)
+        except IdempotencyKeyMismatch as e:
+            log_edi("error", "Idempotency key conflict: %s", idempotency_key)
+            raise HTTPException(
+                status_code=422,
+                detail={
+                    "message": str(e),
+                    "code": "IDEMPOTENCY_KEY_REUSED"
+                }
+            )
+        if cached is not None:
+            log_edi("info", "Serving cached EDI for request %s", fingerprint)
+            return cached_generate_response(cached.body, cached.etag, if_none_match, replayed)
+
+    try:
+        item_count, body = await offload(len(body_bytes), render_generate_body, payload)
+        if not item_count:
             log_edi("error", "No cargo items provided")
             raise HTTPException(
                 status_code=400,
@@ -110,24 +500,12 @@ async def generate_edi(request: Request, form_data: EDIFormRequest):
                     "code": "EMPTY_CARGO_ITEMS"
                 }
             )
+        ITEMS_GENERATED.inc(amount=item_count)
 
-        # Log validated data
-        log_edi("info", f"Validated cargo items: {[item.dict() for item in form_data.cargo_items]}")
-
-        edi_output = generate_edi_message(form_data.cargo_items)
-        
-        # Log success
-        for idx, item in enumerate(form_data.cargo_items, start=1):
-            log_edi("info", f"Generated EDI for item #{idx}: {item.dict()}")
-
-        return {
-            "status": "success",
-            "edi": edi_output,
-            "item_count": len(form_data.cargo_items)
-        }
-
+    except (HTTPException, RequestValidationError):
+        raise
     except ValueError as e:
-        log_edi("error", f"Validation error: {str(e)}")
+        log_edi("error", "Validation error: %s", e)
         raise HTTPException(
             status_code=422,
             detail={
@@ -136,7 +514,7 @@ async def generate_edi(request: Request, form_data: EDIFormRequest):
             }
         )
     except Exception as e:
-        log_edi("error", f"EDI generation failed: {str(e)}")
+        log_edi("error", "EDI generation failed: %s", e)
         raise HTTPException(
             status_code=500,
             detail={
@@ -144,4 +522,64 @@ async def generate_edi(request: Request, form_data: EDIFormRequest):
                 "code": "GENERATION_ERROR",
                 "error": str(e)
             }
-        ) 
\ No newline at end of file
+        )
+
+    if fingerprint is not None:
+        with stage("cache"):
+            entry = cache.put(fingerprint, body, idempotency_key)
+        return cached_generate_response(entry.body, entry.etag, if_none_match)
+    return cached_generate_response(body, make_etag(body), if_none_match)
+
+@router.get("/generate/cache", response_class=EDIJSONResponse)
+async def generate_cache_stats():
+    """
+    Hit, miss and eviction counters of this worker's /generate response cache
+    """
+    cache = get_generate_cache()
+    return EDIJSONResponse({
+        "status": "success",
+        "enabled": cache is not None,
+        "cache": cache.stats() if cache is not None else None
+    })
+
+@router.post("/generate/stream")
+async def generate_edi_stream(form_data: EDIFormRequest):
+    """
+    Generate EDI message from cargo items, streamed as text/plain.
+
+    The message is formatted in chunks of cargo items while it is being sent,
+    so large bookings never exist in memory as one string.
+    """
+    record_body_parsing()
+    log_edi("info", "Streaming EDI for %d cargo items", len(form_data.cargo_items))
+    ITEMS_GENERATED.inc(amount=len(form_data.cargo_items))
+
+    return StreamingResponse(
+        iter_edi_message(form_data.cargo_items),
+        media_type="text/plain",
+        headers={"X-Item-Count": str(len(form_data.cargo_items))}
+    )
+
+@router.post("/generate/batch", response_class=EDIJSONResponse)
+async def generate_edi_batch_endpoint(request: BatchGenerateRequest):
+    """
+    Generate EDI messages for many bookings in one call.
+
+    Each booking is validated with the EDIFormRequest rules and rendered in
+    the shared process pool. A booking that fails validation gets its own
+    structured error without affecting the others; results keep input order.
+    """
+    record_body_parsing()
+    log_edi("info", "Generating EDI batch of %d bookings", len(request.bookings))
+
+    with stage("pool"):
+        results = await map_in_process_pool(generate_edi_batch, request.bookings)
+    error_count = sum(1 for result in results if result["status"] == "error")
+    ITEMS_GENERATED.inc(amount=sum(result["item_count"] for result in results if result["status"] == "success"))
+
+    return EDIJSONResponse({
+        "status": "success",
+        "results": results,
+        "booking_count": len(results),
+        "error_count": error_count
+    })
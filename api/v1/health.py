@@ -1,4 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from api.warmup import get_warmup
+from funcs.utils.admission import get_admission_limiter
+from funcs.utils.offload import get_offload_executor
 
 router = APIRouter(
     prefix="/api/v1/health",
@@ -9,8 +13,53 @@ router = APIRouter(
 async def health_check():
     """
     Health check endpoint for AWS App Runner
+
+    Same as /live.
+    """
+    return {
+        "status": "healthy",
+        "service": "cargo-edi-backend"
+    }
+
+@router.get("/live")
+async def liveness_check():
+    """
+    Liveness: the worker's event loop is answering. Never reflects load,
+    so a busy instance is not restarted.
     """
     return {
         "status": "healthy",
         "service": "cargo-edi-backend"
-    } 
\ No newline at end of file
+    }
+
+@router.get("/ready")
+async def readiness_check():
+    """
+    Readiness: 503 until this worker has warmed up (see EDI_WARMUP), and
+    while it is saturated, i.e. EDI requests are queueing for admission or
+    the offload executor is full, so load balancers send new traffic
+    elsewhere until it drains.
+    """
+    warmup = get_warmup()
+    limiter = get_admission_limiter()
+    executor = get_offload_executor()
+    checks = {
+        "warmup": "ok" if warmup.finished else warmup.status,
+        "admission": "saturated" if limiter is not None and limiter.saturated else "ok",
+        "executor": "saturated" if executor.kind != "inline" and executor.in_flight >= executor.capacity else "ok"
+    }
+    ready = all(check == "ok" for check in checks.values())
+    if ready:
+        status = "ready"
+    elif not warmup.finished:
+        status = "starting"
+    else:
+        status = "saturated"
+    return JSONResponse(
+        {
+            "status": status,
+            "service": "cargo-edi-backend",
+            "checks": checks
+        },
+        status_code=200 if ready else 503
+    )
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from fastapi import FastAPI
+from api.v1.edi.responses import EDIJSONResponse
+from services.edi_decoder import StreamingEDIDecoder, decode_edi_bytes, decode_edi_records
+from services.edi_generator import generate_edi_message, iter_edi_message
+from services.edi_serializer import cargo_items_json
+from services.edi_validator import check_edi_message
+from services.form_validator import EDIFormRequest
+from funcs.utils.edi_logging import log_edi
+from funcs.utils.offload import get_offload_executor
+from funcs.utils.process_pool import start_process_pool
+
+# blocking: warm up before the worker accepts connections; background: serve
+# at once and report not ready until warm; off: no warmup
+WARMUP_MODES = ("blocking", "background", "off")
+
+# Valid samples only: invalid ones would be counted as validation failures
+WARMUP_BOOKING = {
+    "cargo_items": [
+        {"cargo_type": "FCL", "package_count": 10, "container_number": "ABCU1234567",
+         "master_bill_number": "MB123", "house_bill_number": "HB123"},
+        {"cargo_type": "lcl", "package_count": 1},
+        {"cargo_type": "FCX", "package_count": 250}
+    ]
+}
+# WARMUP_BOOKING as EDI
+WARMUP_EDI = (
+    "LIN+1+I'\nPAC+++FCL:67:95'\nPAC+10+1'\nPCI+1'\nRFF+AAQ:ABCU1234567'\nPCI+1'\nRFF+MB:MB123'\n"
+    "PCI+1'\nRFF+BH:HB123'\nLIN+2+I'\nPAC+++LCL:67:95'\nPAC+1+1'\nLIN+3+I'\nPAC+++FCX:67:95'\nPAC+250+1'"
+)
+
+
+def get_warmup_mode() -> str:
+    mode = os.getenv("EDI_WARMUP", "blocking")
+    if mode not in WARMUP_MODES:
+        raise ValueError(f"Unknown warmup mode: {mode}. Use one of: {', '.join(WARMUP_MODES)}")
+    return mode
+
+
+def warm_form_validation():
+    EDIFormRequest.model_validate(WARMUP_BOOKING)
+    EDIFormRequest.model_validate_json(EDIJSONResponse(WARMUP_BOOKING).body)
+
+
+def warm_generate():
+    cargo_items = EDIFormRequest.model_validate(WARMUP_BOOKING).cargo_items
+    generate_edi_message(cargo_items)
+    for _ in iter_edi_message(cargo_items, items_per_chunk=2):
+        pass
+
+
+def warm_decode():
+    decode_edi_records(WARMUP_EDI)
+    decode_edi_bytes(WARMUP_EDI.encode("utf-8"))
+    decoder = StreamingEDIDecoder()
+    decoder.feed(WARMUP_EDI)
+    decoder.close()
+
+
+def warm_validate():
+    if not check_edi_message(WARMUP_EDI).valid:
+        raise ValueError("Warmup EDI message does not validate")
+
+
+def warm_serialize():
+    records = decode_edi_records(WARMUP_EDI)
+    EDIJSONResponse({"status": "success", "cargo_items": cargo_items_json(records)})
+
+
+def warm_workers():
+    get_offload_executor().start()
+    start_process_pool()
+
+
+class Warmup:
+    """
+    Startup phase of a worker process: runs the form validators, encoders
+    and decoders once on a small valid booking, starts the offload threads
+    and batch pool processes and builds the OpenAPI document, so the first
+    requests do not pay for lazy initialization. The uncached service
+    functions are used, so the decode and /generate caches stay empty.
+
+    Each step is timed. A failing step is logged and the rest still run:
+    warmup only delays readiness, it never stops the worker from serving.
+    """
+
+    def __init__(self):
+        self.status = "pending"
+        self.durations: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "off")
+
+    def steps(self, app: FastAPI) -> List[Tuple[str, Callable[[], Any]]]:
+        steps = [
+            ("form_validation", warm_form_validation),
+            ("generate", warm_generate),
+            ("decode", warm_decode),
+            ("validate", warm_validate),
+            ("serialize", warm_serialize),
+            ("workers", warm_workers),
+        ]
+        if app.openapi_url is not None:
+            steps.append(("openapi", app.openapi))
+        return steps
+
+    def run(self, app: FastAPI):
+        """Run every step, then log how long each took."""
+        self.status = "running"
+        self.durations = {}
+        self.errors = {}
+        started = time.perf_counter()
+        for name, step in self.steps(app):
+            step_started = time.perf_counter()
+            try:
+                step()
+            except Exception as e:
+                log_edi("error", "Warmup step %s failed: %s", name, e)
+                self.errors[name] = str(e)
+            self.durations[name] = time.perf_counter() - step_started
+        self.durations["total"] = time.perf_counter() - started
+        self.status = "failed" if self.errors else "done"
+        log_edi(
+            "info", "Warmup %s in %.1f ms (%s)", self.status, self.durations["total"] * 1000,
+            ", ".join(f"{name} {duration * 1000:.1f} ms" for name, duration in self.durations.items() if name != "total")
+        )
+
+
+_warmup = Warmup()
+
+
+def get_warmup() -> Warmup:
+    """Warmup state of this worker process."""
+    return _warmup
+
+
+async def start_warmup(app: FastAPI) -> Optional[asyncio.Task]:
+    """
+    Warm this worker up as EDI_WARMUP says. In blocking mode this returns
+    once warm; in background mode it returns the task warming up in a
+    thread, for the caller to await on shutdown.
+    """
+    warmup = get_warmup()
+    mode = get_warmup_mode()
+    if mode == "off":
+        warmup.status = "off"
+        return None
+    if mode == "blocking":
+        warmup.run(app)
+        return None
+    return asyncio.create_task(asyncio.to_thread(warmup.run, app))
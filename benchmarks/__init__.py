@@ -0,0 +1,4 @@
+import os
+
+# Benchmarks measure the services, not console logging; set before services are imported
+os.environ.setdefault("EDI_LOG_LEVEL", "WARNING")
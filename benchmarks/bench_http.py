@@ -0,0 +1,148 @@
+"""
+In-process ASGI load benchmark for /v1/edi/decode and /v1/edi/generate.
+
+Requests are driven straight through the ASGI interface, so the numbers
+cover routing, body parsing, validation, the handler and JSON encoding,
+without sockets or a server in the way.
+
+Every iteration sends the same body, so the main cases run with the decode
+and /generate caches disabled; the "cached" cases repeat them with the
+caches on, measuring cache hits.
+
+Run from the repository root:
+    python -m benchmarks.bench_http
+"""
+import asyncio
+import json
+import os
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from benchmarks.manifests import make_cargo_dicts, make_edi_message
+from benchmarks.timing import percentile
+
+DEFAULT_SIZES = (1, 100, 1_000)
+DEFAULT_CONCURRENCY = (1, 16)
+DEFAULT_REQUESTS = 200
+CACHE_SIZE_VARIABLES = ("EDI_DECODE_CACHE_SIZE", "EDI_GENERATE_CACHE_SIZE")
+
+
+async def asgi_request(app, method: str, path: str, body: bytes = b"",
+                       headers: Optional[Dict[str, str]] = None) -> Tuple[int, bytes]:
+    """Send one HTTP request to an ASGI app and return (status, body)."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = 0
+    chunks = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Request fully sent: only a disconnect can follow
+        await asyncio.Event().wait()
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            chunks.append(message.get("body", b""))
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()],
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    await app(scope, receive, send)
+    return status, b"".join(chunks)
+
+
+async def load(app, path: str, body: bytes, requests: int, concurrency: int) -> Dict:
+    """Send requests with up to concurrency in flight and collect latencies."""
+    latencies: List[float] = []
+    failures = 0
+    headers = {"content-type": "application/json"}
+    queue = iter(range(requests))
+
+    async def worker():
+        nonlocal failures
+        for _ in queue:
+            start = time.perf_counter()
+            status, _ = await asgi_request(app, "POST", path, body, headers)
+            latencies.append(time.perf_counter() - start)
+            if status != 200:
+                failures += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "failures": failures,
+        "requests_per_s": requests / elapsed,
+        "p50_ms": percentile(latencies, 0.50) * 1e3,
+        "p95_ms": percentile(latencies, 0.95) * 1e3,
+        "p99_ms": percentile(latencies, 0.99) * 1e3,
+    }
+
+
+def run_cases(app, sizes: Sequence[int], concurrency_levels: Sequence[int], requests: int, label: str = "") -> List[Dict]:
+    results = []
+    for size in sizes:
+        bodies = {
+            "/v1/edi/decode": json.dumps({"edi": make_edi_message(size)}).encode(),
+            "/v1/edi/generate": json.dumps({"cargo_items": make_cargo_dicts(size)}).encode(),
+        }
+        # Fewer requests for big payloads so a full run stays in minutes
+        count = max(20, requests * 100 // max(size, 100))
+        for path, body in bodies.items():
+            for concurrency in concurrency_levels:
+                stats = asyncio.run(load(app, path, body, count, concurrency))
+                results.append({
+                    "suite": "http",
+                    "name": f"POST {path}{label} c={concurrency}",
+                    "size": size,
+                    "body_bytes": len(body),
+                    "median_s": stats["p50_ms"] / 1e3,
+                    **stats,
+                })
+    return results
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES, concurrency_levels: Sequence[int] = DEFAULT_CONCURRENCY,
+        requests: int = DEFAULT_REQUESTS) -> List[Dict]:
+    from main import app
+
+    # The caches are created from the environment on first use, and not
+    # while it disables them: run the uncached cases first
+    saved = {name: os.environ.get(name) for name in CACHE_SIZE_VARIABLES}
+    os.environ.update({name: "0" for name in CACHE_SIZE_VARIABLES})
+    try:
+        results = run_cases(app, sizes, concurrency_levels, requests)
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+    return results + run_cases(app, sizes, concurrency_levels, requests, label=" cached")
+
+
+def print_results(results: List[Dict]):
+    print(f"{'benchmark':<36}{'items':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for result in results:
+        print(f"{result['name']:<36}{result['size']:>8}{result['requests_per_s']:>10.1f}"
+              f"{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}")
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,93 @@
+"""
+Per-line logging overhead of a 10k-item decode.
+
+Compares the frame-inspecting log_edi this repo used to ship with the
+current level-checked, lazily formatted one, with DEBUG suppressed and
+with DEBUG enabled (records go to a NullHandler so only logging costs count).
+
+Run from the repository root:
+    python -m benchmarks.bench_logging
+"""
+import inspect
+import logging
+import os
+import time
+
+from funcs.utils import edi_logging
+from services import edi_decoder, edi_validator
+
+ITEM_COUNT = 10_000
+REPEAT = 5
+
+
+def legacy_log_edi(level: str, message: str, *args):
+    """log_edi as it was before lazy formatting: always inspects the caller frame."""
+    if args:
+        message = message % args
+    frame = inspect.currentframe().f_back
+    filename = os.path.basename(frame.f_code.co_filename)
+    function_name = frame.f_code.co_name
+    line_number = frame.f_lineno
+
+    formatted = f"[{filename}][{function_name}][{line_number}] - {message}"
+
+    level = level.lower()
+    if level == "debug":
+        edi_logging.logger.debug(formatted)
+    elif level == "info":
+        edi_logging.logger.info(formatted)
+    elif level == "warning":
+        edi_logging.logger.warning(formatted)
+    elif level == "error":
+        edi_logging.logger.error(formatted)
+    else:
+        edi_logging.logger.info(formatted)
+
+
+def build_message(item_count: int) -> str:
+    segments = []
+    for idx in range(1, item_count + 1):
+        segments.append(f"LIN+{idx}+I'\nPAC+++LCL:67:95'\nPAC+10+1'\nPCI+1'\nRFF+AAQ:ABC{idx}'")
+    return "\n".join(segments)
+
+
+def time_decode(edi: str) -> float:
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        edi_decoder.decode_edi_to_items(edi)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    logger = edi_logging.logger
+    saved_handlers, saved_level = logger.handlers[:], logger.level
+    logger.handlers = [logging.NullHandler()]
+
+    edi = build_message(ITEM_COUNT)
+    line_count = edi.count("\n") + 1
+    results = {}
+
+    try:
+        for level in (logging.INFO, logging.DEBUG):
+            logger.setLevel(level)
+            for name, func in (("legacy", legacy_log_edi), ("current", edi_logging.log_edi)):
+                edi_decoder.log_edi = edi_validator.log_edi = func
+                results[(logging.getLevelName(level), name)] = time_decode(edi)
+    finally:
+        edi_decoder.log_edi = edi_validator.log_edi = edi_logging.log_edi
+        logger.handlers = saved_handlers
+        logger.setLevel(saved_level)
+
+    print(f"decode of {ITEM_COUNT} items ({line_count} lines), best of {REPEAT}")
+    print(f"{'logger level':<14}{'log_edi':<10}{'total ms':>10}{'us/line':>10}")
+    for (level, name), seconds in results.items():
+        print(f"{level:<14}{name:<10}{seconds * 1e3:>10.1f}{seconds * 1e6 / line_count:>10.2f}")
+    for level in ("INFO", "DEBUG"):
+        saved = results[(level, "legacy")] - results[(level, "current")]
+        print(f"{level}: current log_edi saves {saved * 1e6 / line_count:.2f} us per line")
+
+
+if __name__ == "__main__":
+    main()
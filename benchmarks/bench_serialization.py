@@ -0,0 +1,106 @@
+"""
+Serialization cost of the /v1/edi endpoints.
+
+decode+serialize: "pydantic" is the path the router used to take:
+CargoItem models, .dict(), None removal and JSON encoding of the resulting
+dicts. "records" decodes to DecodedCargoItem tuples and encodes them
+straight to JSON bytes.
+
+raw decode: the /decode request path (DecodeRequest JSON body, then
+decode_edi_records) versus /decode/raw (decode_edi_bytes on the body bytes).
+
+response: rendering the decode and generate envelopes with FastAPI's
+default path (jsonable_encoder, then JSONResponse) versus EDIJSONResponse.
+
+Run from the repository root:
+    python -m benchmarks.bench_serialization
+"""
+import json
+import tracemalloc
+from typing import Dict, List, Sequence
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from api.v1.edi.responses import EDIJSONResponse
+from api.v1.edi.router import DecodeRequest
+from benchmarks.manifests import make_edi_message
+from benchmarks.timing import measure, repeat_for
+from services.edi_decoder import decode_edi_bytes, decode_edi_records, decode_edi_to_items
+from services.edi_serializer import cargo_items_json, dump_cargo_items
+
+DEFAULT_SIZES = (100, 1_000, 10_000)
+
+
+def pydantic_path(edi: str) -> bytes:
+    items = decode_edi_to_items(edi)
+    cleaned = [{k: v for k, v in item.model_dump().items() if v is not None} for item in items]
+    return json.dumps(cleaned, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def records_path(edi: str) -> bytes:
+    return dump_cargo_items(decode_edi_records(edi))
+
+
+def peak_bytes(func) -> int:
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def default_response(content: Dict) -> bytes:
+    return JSONResponse(jsonable_encoder(content)).body
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES) -> List[Dict]:
+    results = []
+
+    def record(name, size, func):
+        timing = measure(func, repeat_for(size))
+        results.append({
+            "suite": "serialization",
+            "name": name,
+            "size": size,
+            **timing,
+            "per_item_us": timing["median_s"] * 1e6 / size,
+            "peak_kib": peak_bytes(func) / 1024,
+        })
+
+    for size in sizes:
+        edi = make_edi_message(size)
+        assert pydantic_path(edi) == records_path(edi)
+        record("decode+serialize pydantic", size, lambda: pydantic_path(edi))
+        record("decode+serialize records", size, lambda: records_path(edi))
+
+        json_body = json.dumps({"edi": edi}).encode()
+        raw_body = edi.encode()
+        assert decode_edi_records(DecodeRequest.model_validate_json(json_body).edi) == decode_edi_bytes(raw_body)
+        record("decode json body", size, lambda: decode_edi_records(DecodeRequest.model_validate_json(json_body).edi))
+        record("decode raw body", size, lambda: decode_edi_bytes(raw_body))
+
+        records = decode_edi_records(edi)
+        item_dicts = [record.to_dict() for record in records]
+        record("response decode default", size,
+               lambda: default_response({"status": "success", "cargo_items": item_dicts}))
+        record("response decode EDIJSONResponse", size,
+               lambda: EDIJSONResponse({"status": "success", "cargo_items": cargo_items_json(records)}).body)
+
+        envelope = {"status": "success", "edi": edi, "item_count": size}
+        assert default_response(envelope) == EDIJSONResponse(envelope).body
+        record("response generate default", size, lambda: default_response(envelope))
+        record("response generate EDIJSONResponse", size, lambda: EDIJSONResponse(envelope).body)
+    return results
+
+
+def print_results(results: List[Dict]):
+    print(f"{'benchmark':<38}{'items':>8}{'median ms':>12}{'us/item':>10}{'peak KiB':>12}")
+    for result in results:
+        print(f"{result['name']:<38}{result['size']:>8}{result['median_s'] * 1e3:>12.3f}"
+              f"{result['per_item_us']:>10.2f}{result['peak_kib']:>12.0f}")
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,60 @@
+"""
+Service-level benchmarks: decode, validate, generate and form validation.
+
+Form validation is timed on the dicts of a parsed /generate body, on the
+raw JSON body, and on an unnormalized booking whose every field has to be
+stripped or converted; at 10_000 items these are the 10k-item bookings.
+
+Run from the repository root:
+    python -m benchmarks.bench_services
+"""
+import json
+from typing import Dict, List, Sequence
+
+from benchmarks.manifests import make_cargo_dicts, make_cargo_items, make_edi_message, make_unnormalized_cargo_dicts
+from benchmarks.timing import measure, repeat_for
+from services.edi_decoder import decode_edi_to_items
+from services.edi_generator import generate_edi_message
+from services.edi_validator import validate_edi_message
+from services.form_validator import EDIFormRequest
+
+DEFAULT_SIZES = (1, 10, 100, 1_000, 10_000, 100_000)
+
+
+def run(sizes: Sequence[int] = DEFAULT_SIZES) -> List[Dict]:
+    results = []
+    for size in sizes:
+        edi = make_edi_message(size)
+        items = make_cargo_items(size)
+        payload = {"cargo_items": make_cargo_dicts(size)}
+        body = json.dumps(payload)
+        unnormalized = {"cargo_items": make_unnormalized_cargo_dicts(size)}
+
+        cases = {
+            "decode_edi_to_items": lambda: decode_edi_to_items(edi),
+            "validate_edi_message": lambda: validate_edi_message(edi),
+            "generate_edi_message": lambda: generate_edi_message(items),
+            "EDIFormRequest.model_validate": lambda: EDIFormRequest.model_validate(payload),
+            "EDIFormRequest.model_validate_json": lambda: EDIFormRequest.model_validate_json(body),
+            "EDIFormRequest unnormalized": lambda: EDIFormRequest.model_validate(unnormalized),
+        }
+        for name, func in cases.items():
+            timing = measure(func, repeat_for(size))
+            results.append({
+                "suite": "services",
+                "name": name,
+                "size": size,
+                **timing,
+                "per_item_us": timing["median_s"] * 1e6 / size,
+            })
+    return results
+
+
+def print_results(results: List[Dict]):
+    print(f"{'benchmark':<40}{'items':>8}{'median ms':>12}{'us/item':>10}")
+    for result in results:
+        print(f"{result['name']:<40}{result['size']:>8}{result['median_s'] * 1e3:>12.3f}{result['per_item_us']:>10.2f}")
+
+
+if __name__ == "__main__":
+    print_results(run())
@@ -0,0 +1,105 @@
+"""
+Import-time budget report for the app, built from python -X importtime.
+
+Imports the app module in fresh interpreters, keeps the fastest run, and
+prints the import time per top-level package and the slowest modules.
+Exits with status 1 when the total exceeds --budget-ms.
+
+Examples, from the repository root:
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time --budget-ms 600 --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from typing import Dict, List, NamedTuple
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BUDGET_MS = 1000.0
+
+
+class ImportTime(NamedTuple):
+    """One line of -X importtime output; times in microseconds."""
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def parse_importtime(stderr: str) -> List[ImportTime]:
+    """Parse the 'import time: self | cumulative | module' lines, nesting from indentation."""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # The header line
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append(ImportTime(name.strip(), int(fields[0]), int(fields[1]), depth))
+    return imports
+
+
+def measure(module: str) -> List[ImportTime]:
+    """Import module in a fresh interpreter under -X importtime."""
+    with tempfile.TemporaryDirectory() as log_dir:
+        # Keep the app's log file out of the repository
+        env = {**os.environ, "EDI_LOG_FILE": os.path.join(log_dir, "edi.log")}
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True
+        )
+    return parse_importtime(completed.stderr)
+
+
+def total_us(imports: List[ImportTime]) -> int:
+    return sum(entry.self_us for entry in imports)
+
+
+def by_package(imports: List[ImportTime]) -> Dict[str, int]:
+    """Self time summed per top-level package."""
+    totals: Dict[str, int] = defaultdict(int)
+    for entry in imports:
+        totals[entry.module.split(".")[0]] += entry.self_us
+    return dict(totals)
+
+
+def print_report(imports: List[ImportTime], top: int):
+    total = total_us(imports)
+    print(f"{'package':<30} {'ms':>9} {'share':>7}")
+    for package, package_us in sorted(by_package(imports).items(), key=lambda item: -item[1])[:top]:
+        print(f"{package:<30} {package_us / 1000:>9.1f} {package_us / total:>7.1%}")
+    print()
+    print(f"{'module':<50} {'self ms':>9} {'cumul ms':>9}")
+    for entry in sorted(imports, key=lambda entry: -entry.self_us)[:top]:
+        print(f"{entry.module:<50} {entry.self_us / 1000:>9.1f} {entry.cumulative_us / 1000:>9.1f}")
+    print()
+    print(f"Total: {total / 1000:.1f} ms over {len(imports)} modules")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time budget report")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--runs", type=int, default=3, help="Interpreters to try; the fastest is reported (default: 3)")
+    parser.add_argument("--top", type=int, default=20, help="Packages and modules listed (default: 20)")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help=f"Allowed total import time (default: {DEFAULT_BUDGET_MS:g})")
+    args = parser.parse_args(argv)
+
+    imports = min((measure(args.module) for _ in range(max(1, args.runs))), key=total_us)
+    print_report(imports, args.top)
+
+    total_ms = total_us(imports) / 1000
+    if total_ms > args.budget_ms:
+        print(f"Over budget: {total_ms:.1f} ms > {args.budget_ms:g} ms")
+        return 1
+    print(f"Within budget of {args.budget_ms:g} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
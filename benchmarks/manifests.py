@@ -0,0 +1,53 @@
+"""Synthetic cargo manifests for the benchmarks."""
+import random
+from typing import Any, Dict, List
+
+from services.edi_generator import CargoItem, generate_edi_message
+
+CARGO_TYPES = ["LCL", "FCL", "FCX"]
+
+
+def make_cargo_dicts(item_count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    Cargo items as they arrive in a /generate request body.
+    Each optional RFF field is present on roughly half of the items, so the
+    manifests mix items with zero to three PCI/RFF pairs.
+    """
+    rng = random.Random(seed)
+    items = []
+    for idx in range(1, item_count + 1):
+        item = {
+            "cargo_type": rng.choice(CARGO_TYPES),
+            "package_count": rng.randint(1, 999),
+        }
+        if rng.random() < 0.5:
+            item["container_number"] = f"MSCU{idx:07d}"
+        if rng.random() < 0.5:
+            item["master_bill_number"] = f"MB{idx:09d}"
+        if rng.random() < 0.5:
+            item["house_bill_number"] = f"HB{idx:09d}"
+        items.append(item)
+    return items
+
+
+def make_unnormalized_cargo_dicts(item_count: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """
+    make_cargo_dicts as a hand-filled booking form sends them: lower-case,
+    padded cargo types, package counts as strings and padded references,
+    so form validation has to normalize every field.
+    """
+    items = []
+    for item in make_cargo_dicts(item_count, seed):
+        item = {key: f" {value} " for key, value in item.items()}
+        item["cargo_type"] = item["cargo_type"].lower()
+        item["package_count"] = item["package_count"].strip()
+        items.append(item)
+    return items
+
+
+def make_cargo_items(item_count: int, seed: int = 42) -> List[CargoItem]:
+    return [CargoItem(**item) for item in make_cargo_dicts(item_count, seed)]
+
+
+def make_edi_message(item_count: int, seed: int = 42) -> str:
+    return generate_edi_message(make_cargo_items(item_count, seed))
@@ -0,0 +1,115 @@
+"""
+Run the benchmark suite and write machine-readable results.
+
+Results go to benchmarks/results/<commit>.json by default. Pass --compare
+with an earlier results file to flag regressions in median time.
+
+Examples, from the repository root:
+    python -m benchmarks.run
+    python -m benchmarks.run --quick --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from benchmarks import bench_http, bench_serialization, bench_services
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+QUICK_SIZES = (1, 100, 1_000)
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def result_key(result: Dict) -> str:
+    return f"{result['suite']}:{result['name']}:{result['size']}"
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float) -> List[str]:
+    """Return one line per benchmark whose median regressed by more than threshold."""
+    baseline_by_key = {result_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        before = baseline_by_key.get(result_key(result))
+        if before is None or not before["median_s"]:
+            continue
+        change = result["median_s"] / before["median_s"] - 1
+        if change > threshold:
+            regressions.append(
+                f"{result_key(result)}: {before['median_s'] * 1e3:.3f} ms -> "
+                f"{result['median_s'] * 1e3:.3f} ms (+{change:.0%})"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Cargo EDI benchmark suite")
+    parser.add_argument("--suite", choices=["services", "serialization", "http", "all"], default="all")
+    parser.add_argument("--sizes", type=int, nargs="+", help="Manifest sizes in cargo items")
+    parser.add_argument("--quick", action="store_true", help=f"Only sizes {QUICK_SIZES}")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="Allowed median slowdown before a regression is reported (default: 0.10)")
+    args = parser.parse_args(argv)
+
+    sizes = args.sizes or (QUICK_SIZES if args.quick else None)
+    commit = git_commit()
+    results = []
+
+    if args.suite in ("services", "all"):
+        service_results = bench_services.run(sizes or bench_services.DEFAULT_SIZES)
+        bench_services.print_results(service_results)
+        results += service_results
+    if args.suite in ("serialization", "all"):
+        serialization_results = bench_serialization.run(sizes or bench_serialization.DEFAULT_SIZES)
+        bench_serialization.print_results(serialization_results)
+        results += serialization_results
+    if args.suite in ("http", "all"):
+        http_results = bench_http.run(sizes or bench_http.DEFAULT_SIZES)
+        bench_http.print_results(http_results)
+        results += http_results
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,36 @@
+"""Timing helpers shared by the benchmark modules."""
+import statistics
+import time
+from typing import Any, Callable, Dict, List
+
+
+def repeat_for(item_count: int) -> int:
+    """Fewer repeats for bigger inputs so a full run stays in minutes."""
+    if item_count >= 100_000:
+        return 3
+    if item_count >= 10_000:
+        return 5
+    if item_count >= 1_000:
+        return 10
+    return 50
+
+
+def measure(func: Callable[[], Any], repeat: int) -> Dict[str, float]:
+    """Time func repeat times after one warmup call."""
+    func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "min_s": min(samples),
+        "median_s": statistics.median(samples),
+        "mean_s": statistics.fmean(samples),
+    }
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
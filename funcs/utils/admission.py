@@ -0,0 +1,164 @@
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Deque, Optional, Tuple
+from funcs.utils.metrics import LATENCY_BUCKETS, REGISTRY, CallbackMetric, Counter, Histogram
+
+# Work units admitted at once per worker process; 0 turns admission control off
+DEFAULT_ADMISSION_CAPACITY = 64
+# Request body bytes per work unit, on top of one unit per request:
+# about 200 cargo items, sent as EDI or as JSON
+DEFAULT_ADMISSION_UNIT_BYTES = 16 * 1024
+# Seconds a request may wait for capacity before it is shed
+DEFAULT_ADMISSION_QUEUE_TIMEOUT = 2.0
+# Requests allowed to wait at once; more are shed immediately
+DEFAULT_ADMISSION_MAX_QUEUE = 128
+
+ADMISSION_SHED = Counter(
+    "edi_admission_shed_total",
+    "Requests rejected with 503: queue_full when too many were waiting, timeout when capacity did not free up in time",
+    ("reason",),
+    registry=REGISTRY
+)
+ADMISSION_WAIT = Histogram(
+    "edi_admission_wait_seconds",
+    "Time admitted requests waited for capacity",
+    registry=REGISTRY,
+    buckets=LATENCY_BUCKETS
+)
+
+
+class AdmissionLimiter:
+    """
+    Weighted, first-come first-served limit on the work in flight.
+
+    A request holds weight units from admission until its response is sent.
+    Requests that do not fit wait in arrival order, so a large one is not
+    starved by a stream of small ones; a request heavier than the whole
+    capacity is admitted alone. Waiters give up after timeout seconds, and
+    once max_queue are waiting new requests are turned away at once.
+    Runs on one event loop; not thread-safe.
+    """
+
+    def __init__(self, capacity: int, max_queue: int, timeout: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.in_use = 0
+        self._waiters: Deque[Tuple[int, asyncio.Future]] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether new requests would have to wait."""
+        return bool(self._waiters) or self.in_use >= self.capacity
+
+    def _fits(self, weight: int) -> bool:
+        return self.in_use == 0 or self.in_use + weight <= self.capacity
+
+    async def acquire(self, weight: int) -> Optional[str]:
+        """
+        Wait until weight units are free and take them.
+        Returns None once admitted, or the reason the request is shed.
+        """
+        weight = min(weight, self.capacity)
+        if not self._waiters and self._fits(weight):
+            self.in_use += weight
+            return None
+        if len(self._waiters) >= self.max_queue:
+            ADMISSION_SHED.inc("queue_full")
+            return "queue_full"
+
+        start = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        entry = (weight, waiter)
+        self._waiters.append(entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Admitted just as the deadline passed
+                ADMISSION_WAIT.observe(time.perf_counter() - start)
+                return None
+            self._waiters.remove(entry)
+            waiter.cancel()
+            # The head may have been the one blocking the next waiters
+            self._wake()
+            ADMISSION_SHED.inc("timeout")
+            return "timeout"
+        except BaseException:
+            if waiter.done() and not waiter.cancelled():
+                self.release(weight)
+            else:
+                self._waiters.remove(entry)
+                waiter.cancel()
+                self._wake()
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - start)
+        return None
+
+    def release(self, weight: int):
+        self.in_use -= min(weight, self.capacity)
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self._fits(self._waiters[0][0]):
+            weight, waiter = self._waiters.popleft()
+            self.in_use += weight
+            waiter.set_result(None)
+
+
+def get_admission_unit_bytes() -> int:
+    return max(1, int(os.getenv("EDI_ADMISSION_UNIT_BYTES", DEFAULT_ADMISSION_UNIT_BYTES)))
+
+
+def request_weight(content_length: Optional[str], unit_bytes: int) -> int:
+    """
+    Work units of a request: one, plus one per unit_bytes of body.
+    Bodies of unknown length (chunked streams) count as one unit.
+    """
+    try:
+        length = int(content_length) if content_length is not None else 0
+    except ValueError:
+        length = 0
+    return 1 + max(0, length) // unit_bytes
+
+
+_admission_limiter: Optional[AdmissionLimiter] = None
+
+
+def get_admission_limiter() -> Optional[AdmissionLimiter]:
+    """
+    Return the shared admission limiter, creating it on first use.
+    Returns None when EDI_ADMISSION_CAPACITY is 0.
+    """
+    global _admission_limiter
+    if _admission_limiter is None:
+        capacity = int(os.getenv("EDI_ADMISSION_CAPACITY", DEFAULT_ADMISSION_CAPACITY))
+        if capacity <= 0:
+            return None
+        _admission_limiter = AdmissionLimiter(
+            capacity,
+            max_queue=max(0, int(os.getenv("EDI_ADMISSION_MAX_QUEUE", DEFAULT_ADMISSION_MAX_QUEUE))),
+            timeout=float(os.getenv("EDI_ADMISSION_QUEUE_TIMEOUT", DEFAULT_ADMISSION_QUEUE_TIMEOUT))
+        )
+    return _admission_limiter
+
+
+def _limiter_gauge(attribute: str):
+    def samples():
+        if _admission_limiter is not None:
+            yield (), getattr(_admission_limiter, attribute)
+    return samples
+
+
+CallbackMetric("edi_admission_in_use", "Work units held by admitted requests", "gauge",
+               _limiter_gauge("in_use"), registry=REGISTRY)
+CallbackMetric("edi_admission_capacity", "Work units admitted at once", "gauge",
+               _limiter_gauge("capacity"), registry=REGISTRY)
+CallbackMetric("edi_admission_queued", "Requests waiting for admission", "gauge",
+               _limiter_gauge("queued"), registry=REGISTRY)
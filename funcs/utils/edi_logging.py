@@ -1,22 +1,132 @@
+import atexit
 import logging
 import os
-import inspect
+import queue
+import reprlib
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+from typing import Any, Callable, Deque, Iterator, List, Optional
+from funcs.utils.stage_timing import current_stage_timings
 
+# Default number of log lines kept per request when capture is requested
+DEFAULT_REQUEST_LOG_LIMIT = 500
+# Defaults for the background log file writer; the file is relative to the working directory
+DEFAULT_LOG_FILE = "edi.{pid}.log"
+DEFAULT_LOG_QUEUE_SIZE = 10000
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_BACKUP_COUNT = 5
+DROP_POLICIES = ("drop_newest", "drop_oldest", "block")
+# Default cap, in characters, on request payloads rendered into log lines
+DEFAULT_LOG_PAYLOAD_LIMIT = 1000
 
-def create_logger():
-    logger = logging.getLogger("EDIService")
-    logger.setLevel(logging.DEBUG)
+# Log buffer of the request currently being handled, if it asked for logs
+_request_logs: ContextVar[Optional[Deque[str]]] = ContextVar("edi_request_logs", default=None)
 
-    if logger.hasHandlers():
-        return logger
 
+class BackgroundQueueHandler(QueueHandler):
+    """
+    QueueHandler that owns the QueueListener thread writing to its sinks.
+
+    emit() only puts the prepared record on a bounded queue, so console and
+    file I/O happen on the writer thread instead of the request path. When
+    the queue is full, drop_policy decides what gives:
+    "drop_newest" discards the incoming record, "drop_oldest" evicts the
+    oldest queued record, and "block" waits for room.
+
+    In a forked child the writer thread is restarted on first use, with
+    sinks rebuilt by reopen_sinks if given, so the child does not share
+    the parent's file handlers.
+    """
+
+    def __init__(self, sinks: List[logging.Handler], maxsize: int, drop_policy: str = "drop_newest",
+                 reopen_sinks: Optional[Callable[[], List[logging.Handler]]] = None):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Unknown log drop policy: {drop_policy}")
+        super().__init__(queue.Queue(maxsize))
+        self.sinks = sinks
+        self.drop_policy = drop_policy
+        self.reopen_sinks = reopen_sinks
+        self.dropped = 0
+        self.listener: Optional[QueueListener] = None
+        self._pid: Optional[int] = None
+
+    def start(self):
+        """Start the background writer thread."""
+        self.listener = QueueListener(self.queue, *self.sinks, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def stop(self):
+        """Flush queued records and stop the writer thread."""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def enqueue(self, record: logging.LogRecord):
+        if self._pid is not None and self._pid != os.getpid():
+            # Forked worker (e.g. the batch process pool): the writer thread did not survive
+            self.queue = queue.Queue(self.queue.maxsize)
+            if self.reopen_sinks is not None:
+                self.sinks = self.reopen_sinks()
+            self.start()
+
+        # Handing the record to the writer thread is all the request waits for
+        timings = current_stage_timings()
+        if timings is None:
+            self._put(record)
+            return
+        start = time.perf_counter()
+        self._put(record)
+        timings.add("log", time.perf_counter() - start)
+
+    def _put(self, record: logging.LogRecord):
+        if self.drop_policy == "block":
+            self.queue.put(record)
+            return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.drop_policy == "drop_oldest":
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped += 1
+
+
+def create_file_handler() -> logging.Handler:
+    """
+    File sink for edi.<pid>.log with rotation.
+    Rotates by time when EDI_LOG_ROTATE_WHEN is set (e.g. "midnight"), by size otherwise.
+
+    Rotation renames files, which is only safe with one writing process:
+    "{pid}" in EDI_LOG_FILE is replaced by the process id, giving each
+    process (workers, batch pool and job processes alike) its own file.
+    """
+    log_file_path = os.getenv("EDI_LOG_FILE", DEFAULT_LOG_FILE).replace("{pid}", str(os.getpid()))
+    backup_count = int(os.getenv("EDI_LOG_BACKUP_COUNT", DEFAULT_LOG_BACKUP_COUNT))
+
+    rotate_when = os.getenv("EDI_LOG_ROTATE_WHEN")
+    if rotate_when:
+        return TimedRotatingFileHandler(log_file_path, when=rotate_when, backupCount=backup_count, delay=True)
+
+    max_bytes = int(os.getenv("EDI_LOG_MAX_BYTES", DEFAULT_LOG_MAX_BYTES))
+    return RotatingFileHandler(log_file_path, mode="a", maxBytes=max_bytes, backupCount=backup_count, delay=True)
+
+
+def create_sinks() -> List[logging.Handler]:
+    """Console and file handlers of the EDIService logger."""
     # Console handler
     console_handler = logging.StreamHandler()
     console_handler.setLevel(logging.DEBUG)
 
     # File handler
-    log_file_path = os.path.join(os.getcwd(), "edi.log")
-    file_handler = logging.FileHandler(log_file_path, mode="a")
+    file_handler = create_file_handler()
     file_handler.setLevel(logging.DEBUG)
 
     # Formatter
@@ -25,32 +135,141 @@ def create_logger():
     )
     console_handler.setFormatter(formatter)
     file_handler.setFormatter(formatter)
+    return [console_handler, file_handler]
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+
+def create_logger():
+    logger = logging.getLogger("EDIService")
+    logger.setLevel(os.getenv("EDI_LOG_LEVEL", "DEBUG").upper())
+
+    if logger.hasHandlers():
+        return logger
+
+    # Both sinks are written from a background thread
+    queue_handler = BackgroundQueueHandler(
+        create_sinks(),
+        maxsize=int(os.getenv("EDI_LOG_QUEUE_SIZE", DEFAULT_LOG_QUEUE_SIZE)),
+        drop_policy=os.getenv("EDI_LOG_DROP_POLICY", "drop_newest"),
+        reopen_sinks=create_sinks
+    )
+    queue_handler.start()
+    atexit.register(queue_handler.stop)
+
+    logger.addHandler(queue_handler)
 
     return logger
 
 
+class RequestLogHandler(logging.Handler):
+    """
+    Collects records into the log buffer of the current request.
+    Requests that did not ask for logs have no buffer, and their records are
+    dropped before any formatting or locking happens.
+    """
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        buffer = _request_logs.get()
+        if buffer is None:
+            return False
+        buffer.append(self.format(record))
+        return True
+
+    def emit(self, record: logging.LogRecord):
+        self.handle(record)
+
+
+def get_request_log_limit() -> int:
+    """Per-request log line limit from EDI_REQUEST_LOG_LIMIT."""
+    return int(os.getenv("EDI_REQUEST_LOG_LIMIT", DEFAULT_REQUEST_LOG_LIMIT))
+
+
+@contextmanager
+def capture_request_logs(enabled: bool = True, max_records: Optional[int] = None) -> Iterator[Optional[Deque[str]]]:
+    """
+    Capture EDIService log lines emitted in the current context.
+
+    Yields a ring buffer holding the most recent max_records lines, or None
+    when capture is not enabled. Buffers are per context, so concurrent
+    requests never see each other's lines.
+    """
+    if not enabled:
+        yield None
+        return
+
+    buffer = deque(maxlen=max_records or get_request_log_limit())
+    token = _request_logs.set(buffer)
+    try:
+        yield buffer
+    finally:
+        _request_logs.reset(token)
+
+
 logger = create_logger()
 
+request_log_handler = RequestLogHandler()
+request_log_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(levelname)s - [%(filename)s][%(funcName)s][%(lineno)d] - %(message)s")
+)
+logger.addHandler(request_log_handler)
+
+
+# log_edi level names
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "info": logging.INFO,
+    "warning": logging.WARNING,
+    "error": logging.ERROR,
+}
+
+
+def debug_enabled() -> bool:
+    """Whether DEBUG records would be emitted; lets hot loops check once up front."""
+    return logger.isEnabledFor(logging.DEBUG)
+
+
+def log_edi(level: str, message: str, *args):
+    """
+    Log message on the EDIService logger.
+
+    Extra args are merged into message %-style only if the record is actually
+    emitted, and nothing at all happens below the logger's level. Caller file,
+    function and line come from stacklevel, so no frame inspection is needed.
+    """
+    level_no = LOG_LEVELS.get(level.lower(), logging.INFO)  # default fallback
+    if logger.isEnabledFor(level_no):
+        logger.log(level_no, message, *args, stacklevel=2)
+
+
+def get_log_payload_limit() -> int:
+    """Payload log cap from EDI_LOG_PAYLOAD_LIMIT, in characters (0 logs no payloads)."""
+    return int(os.getenv("EDI_LOG_PAYLOAD_LIMIT", DEFAULT_LOG_PAYLOAD_LIMIT))
+
+
+class PayloadPreview:
+    """
+    Log argument rendering a bounded sample of a request payload.
+
+    Pass it to log_edi as a %s argument: nothing is formatted unless the
+    record is emitted, and then only the first few items of each list or
+    dict are rendered (reprlib), cut to EDI_LOG_PAYLOAD_LIMIT characters.
+    Log volume stays flat however large the payload is.
+    """
+
+    _repr = reprlib.Repr()
+    _repr.maxlevel = 4
+    _repr.maxlist = 3
+    _repr.maxdict = 6
+    _repr.maxstring = 60
+    _repr.maxother = 60
+
+    def __init__(self, value: Any):
+        self.value = value
 
-def log_edi(level: str, message: str):
-    frame = inspect.currentframe().f_back
-    filename = os.path.basename(frame.f_code.co_filename)
-    function_name = frame.f_code.co_name
-    line_number = frame.f_lineno
-
-    formatted = f"[{filename}][{function_name}][{line_number}] - {message}"
-
-    level = level.lower()
-    if level == "debug":
-        logger.debug(formatted)
-    elif level == "info":
-        logger.info(formatted)
-    elif level == "warning":
-        logger.warning(formatted)
-    elif level == "error":
-        logger.error(formatted)
-    else:
-        logger.info(formatted)  # default fallback
+    def __str__(self) -> str:
+        limit = get_log_payload_limit()
+        if limit <= 0:
+            return "<payload omitted>"
+        text = self._repr.repr(self.value)
+        if len(text) > limit:
+            text = text[:limit] + f"... ({len(text) - limit} more chars)"
+        return text
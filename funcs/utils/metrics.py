@@ -0,0 +1,235 @@
+import asyncio
+import math
+import os
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds between event loop lag probes; 0 disables the probe
+DEFAULT_LOOP_LAG_INTERVAL = 0.5
+# Content type of the Prometheus text exposition format (Starlette adds the charset)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_sample(name: str, labels: Tuple[Tuple[str, str], ...], value: float) -> str:
+    if not labels:
+        return f"{name} {format_value(value)}"
+    rendered = ",".join(f'{key}="{escape_label_value(str(label))}"' for key, label in labels)
+    return f"{name}{{{rendered}}} {format_value(value)}"
+
+
+class Metric(ABC):
+    """
+    Base class of the in-process metrics.
+
+    Label values are passed positionally in labelnames order. Updates take
+    a per-metric lock, so metrics can be shared with threadpool code.
+    """
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), registry: Optional["MetricsRegistry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _labels(self, label_values: Tuple[str, ...]) -> Tuple[Tuple[str, str], ...]:
+        return tuple(zip(self.labelnames, label_values))
+
+    @abstractmethod
+    def samples(self) -> Iterator[Sample]:
+        """(name, labels, value) of every series, as rendered."""
+
+    def reset(self):
+        """Drop all values and replace the lock, e.g. in a forked child."""
+        self._lock = threading.Lock()
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(format_sample(name, labels, value) for name, labels, value in self.samples())
+        return lines
+
+
+class Counter(Metric):
+    """Monotonic count per label combination. Names should end in _total."""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        self._values: Dict[Tuple[str, ...], float] = {}
+        super().__init__(*args, **kwargs)
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, self._labels(label_values), value
+
+    def reset(self):
+        super().reset()
+        self._values = {}
+
+
+class Histogram(Metric):
+    """
+    Cumulative histogram per label combination.
+
+    observe() only bumps one bucket count and the sum; buckets are made
+    cumulative when the metric is rendered.
+    """
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 registry: Optional["MetricsRegistry"] = None, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # Per series: one count per bucket, the +Inf count, then the sum
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        super().__init__(name, documentation, labelnames, registry)
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *label_values: str) -> int:
+        series = self._series.get(label_values)
+        return sum(series[:-1]) if series is not None else 0
+
+    def total(self, *label_values: str) -> float:
+        series = self._series.get(label_values)
+        return series[-1] if series is not None else 0
+
+    def samples(self) -> Iterator[Sample]:
+        with self._lock:
+            all_series = [(label_values, list(series)) for label_values, series in self._series.items()]
+        for label_values, series in all_series:
+            labels = self._labels(label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), series):
+                cumulative += count
+                yield self.name + "_bucket", labels + (("le", format_value(bound)),), cumulative
+            yield self.name + "_sum", labels, series[-1]
+            yield self.name + "_count", labels, cumulative
+
+    def reset(self):
+        super().reset()
+        self._series = {}
+
+
+class CallbackMetric(Metric):
+    """
+    Metric whose samples are read from callback() at scrape time, for values
+    already counted elsewhere (e.g. cache statistics).
+    callback returns (label values, value) pairs.
+    """
+
+    def __init__(self, name: str, documentation: str, metric_type: str,
+                 callback: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]],
+                 labelnames: Sequence[str] = (), registry: Optional["MetricsRegistry"] = None):
+        self.type = metric_type
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def samples(self) -> Iterator[Sample]:
+        for label_values, value in self.callback():
+            yield self.name, self._labels(tuple(label_values)), value
+
+
+class MetricsRegistry:
+    """
+    Metrics of this process, rendered in the Prometheus text format.
+
+    Each uvicorn worker (and each batch pool process) counts on its own;
+    a forked child starts from zero instead of inheriting the parent's counts.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self.reset)
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def unregister(self, name: str):
+        self._metrics.pop(name, None)
+
+    def reset(self):
+        for metric in list(self._metrics.values()):
+            metric.reset()
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Service-level metrics, updated where the work happens
+ITEMS_DECODED = Counter("edi_items_decoded_total", "Cargo items decoded from EDI messages", registry=REGISTRY)
+ITEMS_GENERATED = Counter("edi_items_generated_total", "Cargo items rendered into EDI messages", registry=REGISTRY)
+VALIDATION_FAILURES = Counter(
+    "edi_validation_failures_total",
+    "Validation errors by rule: EDI segment grammar (kind=edi) or booking form (kind=form)",
+    ("kind", "rule"),
+    registry=REGISTRY
+)
+EVENT_LOOP_LAG = Histogram(
+    "edi_event_loop_lag_seconds",
+    "Delay of the event loop in running a timer past its due time",
+    registry=REGISTRY,
+    buckets=LOOP_LAG_BUCKETS
+)
+
+
+def get_loop_lag_interval() -> float:
+    """Probe interval from EDI_METRICS_LOOP_LAG_INTERVAL."""
+    return float(os.getenv("EDI_METRICS_LOOP_LAG_INTERVAL", DEFAULT_LOOP_LAG_INTERVAL))
+
+
+async def monitor_event_loop_lag(interval: float, histogram: Histogram = EVENT_LOOP_LAG):
+    """
+    Sleep interval seconds at a time, recording how late each wakeup is.
+    Blocking work on the event loop shows up as lag; runs until cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + interval
+        await asyncio.sleep(interval)
+        histogram.observe(max(0.0, loop.time() - due))
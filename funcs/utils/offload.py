@@ -0,0 +1,190 @@
+import asyncio
+import contextvars
+import os
+import time
+from contextlib import suppress
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Tuple, TypeVar
+from funcs.utils.metrics import LATENCY_BUCKETS, REGISTRY, CallbackMetric, Counter, Histogram
+from funcs.utils.process_pool import get_pool_size, get_process_pool
+from funcs.utils.stage_timing import current_stage_timings
+
+R = TypeVar("R")
+
+# Payloads at least this many bytes (or characters) are handed to the executor
+DEFAULT_OFFLOAD_THRESHOLD = 64 * 1024
+# Offloaded calls waiting for a worker, beyond those running, before new ones are rejected
+DEFAULT_OFFLOAD_QUEUE_SIZE = 32
+OFFLOAD_EXECUTORS = ("thread", "process", "inline")
+
+OFFLOAD_CALLS = Counter(
+    "edi_executor_calls_total",
+    "CPU-bound calls by where they ran: inline on the event loop, executor, or rejected because the executor was full",
+    ("placement",),
+    registry=REGISTRY
+)
+OFFLOAD_WAIT = Histogram(
+    "edi_executor_queue_wait_seconds",
+    "Time offloaded calls waited for an executor worker",
+    registry=REGISTRY,
+    buckets=LATENCY_BUCKETS
+)
+OFFLOAD_RUN = Histogram(
+    "edi_executor_run_seconds",
+    "Time offloaded calls ran in an executor worker",
+    registry=REGISTRY,
+    buckets=LATENCY_BUCKETS
+)
+
+
+class ExecutorSaturated(RuntimeError):
+    """The offload executor has as many calls running and queued as it accepts."""
+
+
+def _timed_call(submitted: float, func: Callable[..., R], args: Tuple[Any, ...]) -> Tuple[float, float, R]:
+    # time.monotonic is system-wide, so it also compares across processes
+    started = time.monotonic()
+    result = func(*args)
+    return started - submitted, time.monotonic() - started, result
+
+
+class OffloadExecutor:
+    """
+    Size-aware dispatch of CPU-bound calls.
+
+    Calls on payloads smaller than threshold run inline: for them a thread
+    hop costs more than the work. Larger ones run in a thread pool (default)
+    or in the shared process pool, so one big manifest cannot stall every
+    other request on the event loop. At most workers + queue_size calls are
+    in flight; more raise ExecutorSaturated instead of queueing without bound.
+
+    Thread workers run in a copy of the caller's context, so request log
+    capture and stage timings keep working. Process workers start from the
+    pool's context: their log lines, stage timings and metrics stay in the
+    worker process, and arguments and results are pickled.
+    """
+
+    def __init__(self, kind: str, threshold: int, workers: int, queue_size: int):
+        if kind not in OFFLOAD_EXECUTORS:
+            raise ValueError(f"Unknown offload executor: {kind}. Use one of: {', '.join(OFFLOAD_EXECUTORS)}")
+        self.kind = kind
+        self.threshold = threshold
+        self.workers = workers
+        self.queue_size = queue_size
+        self.in_flight = 0
+        self._executor: Optional[Executor] = None
+
+    @property
+    def capacity(self) -> int:
+        return self.workers + self.queue_size
+
+    def _get_executor(self) -> Executor:
+        if self.kind == "process":
+            return get_process_pool()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="edi-offload")
+        return self._executor
+
+    async def run(self, size: int, func: Callable[..., R], *args: Any) -> R:
+        """
+        Call func(*args), inline when size is below the threshold and in the
+        executor otherwise. Raises ExecutorSaturated when the executor is full.
+        """
+        if self.kind == "inline" or size < self.threshold:
+            OFFLOAD_CALLS.inc("inline")
+            return func(*args)
+        if self.in_flight >= self.capacity:
+            OFFLOAD_CALLS.inc("rejected")
+            raise ExecutorSaturated(f"{self.in_flight} calls already running or queued")
+
+        OFFLOAD_CALLS.inc("executor")
+        loop = asyncio.get_running_loop()
+        submitted = time.monotonic()
+        if self.kind == "thread":
+            future = self._get_executor().submit(contextvars.copy_context().run, _timed_call, submitted, func, args)
+        else:
+            future = self._get_executor().submit(_timed_call, submitted, func, args)
+        # Released when the call finishes, even if the request awaiting it was cancelled
+        self.in_flight += 1
+        future.add_done_callback(lambda _: self._release(loop))
+
+        waited, ran, result = await asyncio.wrap_future(future)
+        OFFLOAD_WAIT.observe(waited)
+        OFFLOAD_RUN.observe(ran)
+        timings = current_stage_timings()
+        if timings is not None:
+            timings.add("queue", waited)
+        return result
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        def release():
+            self.in_flight -= 1
+        with suppress(RuntimeError):  # The loop is already closed
+            loop.call_soon_threadsafe(release)
+
+    def start(self):
+        """
+        Start every offload thread now rather than on the first large request.
+        Process workers belong to the shared pool; see start_process_pool.
+        """
+        if self.kind != "thread":
+            return
+        executor = self._get_executor()
+        # Calls that overlap each get a new thread, up to workers
+        for future in [executor.submit(time.sleep, 0.01) for _ in range(self.workers)]:
+            future.result()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_offload_executor: Optional[OffloadExecutor] = None
+
+
+def get_offload_executor() -> OffloadExecutor:
+    """
+    Return the shared offload executor, configured from EDI_OFFLOAD_EXECUTOR,
+    EDI_OFFLOAD_THRESHOLD, EDI_OFFLOAD_WORKERS and EDI_OFFLOAD_QUEUE_SIZE.
+    """
+    global _offload_executor
+    if _offload_executor is None:
+        kind = os.getenv("EDI_OFFLOAD_EXECUTOR", "thread")
+        if kind == "process":
+            workers = get_pool_size()
+        else:
+            workers = max(1, int(os.getenv("EDI_OFFLOAD_WORKERS", os.cpu_count() or 1)))
+        _offload_executor = OffloadExecutor(
+            kind,
+            threshold=int(os.getenv("EDI_OFFLOAD_THRESHOLD", DEFAULT_OFFLOAD_THRESHOLD)),
+            workers=workers,
+            queue_size=max(0, int(os.getenv("EDI_OFFLOAD_QUEUE_SIZE", DEFAULT_OFFLOAD_QUEUE_SIZE)))
+        )
+    return _offload_executor
+
+
+def shutdown_offload_executor():
+    """Stop the offload threads, if they were ever started. The process pool is shut down separately."""
+    global _offload_executor
+    if _offload_executor is not None:
+        _offload_executor.shutdown()
+        _offload_executor = None
+
+
+async def run_offloaded(size: int, func: Callable[..., R], *args: Any) -> R:
+    """Call func(*args) through the shared offload executor; see OffloadExecutor.run."""
+    return await get_offload_executor().run(size, func, *args)
+
+
+def _executor_gauge(attribute: str) -> Callable[[], Any]:
+    def samples():
+        if _offload_executor is not None and _offload_executor.kind != "inline":
+            yield (_offload_executor.kind,), getattr(_offload_executor, attribute)
+    return samples
+
+
+CallbackMetric("edi_executor_in_flight", "Offloaded calls running or queued", "gauge",
+               _executor_gauge("in_flight"), ("executor",), registry=REGISTRY)
+CallbackMetric("edi_executor_capacity", "Offloaded calls accepted at once: workers plus queue size", "gauge",
+               _executor_gauge("capacity"), ("executor",), registry=REGISTRY)
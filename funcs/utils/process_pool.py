@@ -0,0 +1,74 @@
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, List, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_in_pool_process = False
+
+
+def get_pool_size() -> int:
+    """Worker count from EDI_PROCESS_POOL_WORKERS, defaulting to the CPU count."""
+    configured = os.getenv("EDI_PROCESS_POOL_WORKERS")
+    if configured:
+        return max(1, int(configured))
+    return os.cpu_count() or 1
+
+
+def mark_pool_process():
+    """Initializer of the pool's worker processes."""
+    global _in_pool_process
+    _in_pool_process = True
+
+
+def in_pool_process() -> bool:
+    """Whether this is one of the shared pool's worker processes."""
+    return _in_pool_process
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared process pool, creating it on first use."""
+    global _process_pool
+    if _process_pool is None:
+        _process_pool = ProcessPoolExecutor(max_workers=get_pool_size(), initializer=mark_pool_process)
+    return _process_pool
+
+
+def start_process_pool():
+    """Start the shared pool's worker processes now rather than on the first batch request."""
+    pool = get_process_pool()
+    for future in [pool.submit(os.getpid) for _ in range(get_pool_size())]:
+        future.result()
+
+
+def shutdown_process_pool():
+    """Shut down the shared process pool, if it was ever started."""
+    global _process_pool
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=True, cancel_futures=True)
+        _process_pool = None
+
+
+async def map_in_process_pool(func: Callable[[List[T]], List[R]], items: Sequence[T]) -> List[R]:
+    """
+    Run func over items in the process pool without blocking the event loop.
+
+    func takes a list of items and returns one result per item. Items are
+    split into one contiguous chunk per worker, so small items do not pay a
+    pickling round trip each, and results come back in input order.
+    """
+    if not items:
+        return []
+
+    workers = get_pool_size()
+    chunk_size = -(-len(items) // workers)
+    chunks = [list(items[start:start + chunk_size]) for start in range(0, len(items), chunk_size)]
+
+    loop = asyncio.get_running_loop()
+    pool = get_process_pool()
+    chunk_results = await asyncio.gather(*(loop.run_in_executor(pool, func, chunk) for chunk in chunks))
+
+    return [result for results in chunk_results for result in results]
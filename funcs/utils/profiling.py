@@ -0,0 +1,127 @@
+import cProfile
+import hmac
+import io
+import itertools
+import marshal
+import os
+import pstats
+import threading
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+# Profiles kept in memory per worker process
+DEFAULT_PROFILE_HISTORY = 20
+PSTATS_SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class RequestProfile(NamedTuple):
+    """cProfile statistics of one request, as written by pstats.Stats.dump_stats."""
+    id: str
+    method: str
+    path: str
+    status: int
+    started_at: float
+    duration: float
+    stats: bytes
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration * 1000, 3),
+        }
+
+    def text(self, sort: str = "cumulative", limit: int = 50) -> str:
+        """Top functions by sort, as pstats prints them."""
+        stream = io.StringIO()
+        stats = pstats.Stats(stream=stream)
+        stats.stats = marshal.loads(self.stats)
+        stats.get_top_level_stats()
+        stats.sort_stats(sort).print_stats(limit)
+        return stream.getvalue()
+
+
+def get_profiling_token() -> Optional[str]:
+    """Secret from EDI_PROFILING_TOKEN; profiling is off when it is unset or empty."""
+    return os.getenv("EDI_PROFILING_TOKEN") or None
+
+
+def token_matches(candidate: Optional[str]) -> bool:
+    """Constant-time check of a client-supplied token against EDI_PROFILING_TOKEN."""
+    token = get_profiling_token()
+    if token is None or candidate is None:
+        return False
+    return hmac.compare_digest(candidate.encode("utf-8"), token.encode("utf-8"))
+
+
+class ProfileStore:
+    """
+    Last max_profiles request profiles of this process.
+
+    cProfile traces the whole thread, so only one request is profiled at a
+    time (try_start() returns None while another one is running), and
+    coroutines of other requests that run on the event loop meanwhile
+    show up in the profile too.
+    """
+
+    def __init__(self, max_profiles: int):
+        self._profiles: Deque[RequestProfile] = deque(maxlen=max_profiles)
+        self._lock = threading.Lock()
+        self._active = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def try_start(self) -> Optional[Tuple[str, cProfile.Profile]]:
+        """
+        Start profiling the current thread, unless a profile is already running.
+        Returns the id the profile will be stored under and the profiler.
+        """
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return f"{os.getpid()}-{next(self._ids)}", profiler
+
+    def finish(self, profile_id: str, profiler: cProfile.Profile, method: str, path: str, status: int,
+               started_at: float, duration: float) -> RequestProfile:
+        """Stop profiler and keep its statistics."""
+        profiler.disable()
+        self._active.release()
+        profiler.create_stats()
+        profile = RequestProfile(
+            id=profile_id,
+            method=method,
+            path=path,
+            status=status,
+            started_at=started_at,
+            duration=duration,
+            stats=marshal.dumps(profiler.stats)
+        )
+        with self._lock:
+            self._profiles.append(profile)
+        return profile
+
+    def list(self) -> List[RequestProfile]:
+        """Stored profiles, newest first."""
+        with self._lock:
+            return list(reversed(self._profiles))
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        with self._lock:
+            for profile in self._profiles:
+                if profile.id == profile_id:
+                    return profile
+        return None
+
+
+_profile_store: Optional[ProfileStore] = None
+
+
+def get_profile_store() -> ProfileStore:
+    """Return the shared profile store, sized by EDI_PROFILE_HISTORY."""
+    global _profile_store
+    if _profile_store is None:
+        _profile_store = ProfileStore(max(1, int(os.getenv("EDI_PROFILE_HISTORY", DEFAULT_PROFILE_HISTORY))))
+    return _profile_store
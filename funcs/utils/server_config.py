@@ -0,0 +1,127 @@
+import importlib.util
+import math
+import os
+from typing import Any, Dict, NamedTuple, Optional
+
+# Defaults of the production server (server.py)
+DEFAULT_PORT = 8000
+DEFAULT_WORKERS_PER_CPU = 1.0
+# Longer than the idle timeout of the load balancer in front (60 s on AWS), so it
+# never reuses a connection the server has just closed
+DEFAULT_KEEPALIVE_TIMEOUT = 75
+DEFAULT_BACKLOG = 2048
+DEFAULT_MAX_REQUESTS = 10000
+DEFAULT_GRACEFUL_TIMEOUT = 30
+DEFAULT_MAX_BODY_BYTES = 32 * 1024 * 1024
+
+
+class ServerConfig(NamedTuple):
+    """Settings of the production server, read from the environment by load_server_config."""
+    host: str
+    port: int
+    workers: int
+    loop: str
+    http: str
+    keepalive_timeout: int
+    backlog: int
+    max_connections: Optional[int]
+    max_requests: int
+    max_requests_jitter: int
+    graceful_timeout: int
+    log_level: str
+
+    def uvicorn_options(self) -> Dict[str, Any]:
+        """Keyword arguments of uvicorn.Config for one worker process."""
+        return {
+            "host": self.host,
+            "port": self.port,
+            "loop": self.loop,
+            "http": self.http,
+            "timeout_keep_alive": self.keepalive_timeout,
+            "backlog": self.backlog,
+            "limit_concurrency": self.max_connections,
+            "timeout_graceful_shutdown": self.graceful_timeout,
+            "log_level": self.log_level
+        }
+
+
+def read_cgroup_cpu_limit(root: str = "/sys/fs/cgroup") -> Optional[float]:
+    """
+    CPUs the container may use under its cgroup CPU quota, or None without one.
+    Reads cgroup v2 (cpu.max), then cgroup v1 (cpu.cfs_quota_us / cpu.cfs_period_us).
+    """
+    try:
+        with open(os.path.join(root, "cpu.max")) as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+        return None
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(os.path.join(root, "cpu", "cpu.cfs_quota_us")) as f:
+            quota = int(f.read())
+        with open(os.path.join(root, "cpu", "cpu.cfs_period_us")) as f:
+            period = int(f.read())
+        if quota > 0 and period > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def available_cpus() -> int:
+    """
+    CPUs this process can actually use: the ones it may be scheduled on,
+    capped by the container's CPU quota. os.cpu_count() reports the host's.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        cpus = len(os.sched_getaffinity(0))
+    else:
+        cpus = os.cpu_count() or 1
+    limit = read_cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
+
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def load_server_config() -> ServerConfig:
+    """
+    Build the server settings from the environment. Workers default to
+    EDI_WORKERS_PER_CPU per available CPU; uvloop and httptools are used
+    when they are installed.
+    """
+    workers = os.getenv("EDI_WORKERS")
+    if workers:
+        worker_count = int(workers)
+    else:
+        per_cpu = float(os.getenv("EDI_WORKERS_PER_CPU", DEFAULT_WORKERS_PER_CPU))
+        worker_count = round(available_cpus() * per_cpu)
+
+    max_requests = int(os.getenv("EDI_MAX_REQUESTS", DEFAULT_MAX_REQUESTS))
+    max_connections = os.getenv("EDI_MAX_CONNECTIONS")
+
+    return ServerConfig(
+        host=os.getenv("EDI_HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", DEFAULT_PORT)),
+        workers=max(1, worker_count),
+        loop=os.getenv("EDI_SERVER_LOOP") or ("uvloop" if installed("uvloop") else "asyncio"),
+        http=os.getenv("EDI_SERVER_HTTP") or ("httptools" if installed("httptools") else "h11"),
+        keepalive_timeout=int(os.getenv("EDI_KEEPALIVE_TIMEOUT", DEFAULT_KEEPALIVE_TIMEOUT)),
+        backlog=int(os.getenv("EDI_BACKLOG", DEFAULT_BACKLOG)),
+        max_connections=int(max_connections) if max_connections else None,
+        max_requests=max(0, max_requests),
+        # Spread restarts so workers do not all recycle at once
+        max_requests_jitter=int(os.getenv("EDI_MAX_REQUESTS_JITTER", max_requests // 10)),
+        graceful_timeout=int(os.getenv("EDI_GRACEFUL_TIMEOUT", DEFAULT_GRACEFUL_TIMEOUT)),
+        log_level=os.getenv("EDI_SERVER_LOG_LEVEL", "info")
+    )
+
+
+def get_max_body_bytes() -> int:
+    """Largest request body accepted, from EDI_MAX_BODY_BYTES; 0 means no limit."""
+    return int(os.getenv("EDI_MAX_BODY_BYTES", DEFAULT_MAX_BODY_BYTES))
@@ -0,0 +1,80 @@
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional
+
+# Stage timings of the request currently being handled, if it is being timed
+_stage_timings: ContextVar[Optional["StageTimings"]] = ContextVar("edi_stage_timings", default=None)
+
+
+class StageTimings:
+    """
+    Wall-clock time per named stage of one request.
+
+    A stage entered several times (e.g. "serialize" for the cargo items,
+    then for the envelope) accumulates. Stages may nest: "log" time is also part of the stage
+    that logged.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        # When the last request body chunk arrived, if it has
+        self.body_received: Optional[float] = None
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, durations in milliseconds, plus the total so far."""
+        entries: List[str] = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in self.durations.items()]
+        entries.append(f"total;dur={(time.perf_counter() - self.started) * 1000:.3f}")
+        return ", ".join(entries)
+
+
+def server_timing_enabled() -> bool:
+    """Whether responses carry a Server-Timing header (EDI_SERVER_TIMING, default on)."""
+    return os.getenv("EDI_SERVER_TIMING", "1").lower() not in ("0", "false", "no", "off")
+
+
+def current_stage_timings() -> Optional[StageTimings]:
+    return _stage_timings.get()
+
+
+@contextmanager
+def collect_stage_timings() -> Iterator[StageTimings]:
+    """Time the stages entered in the current context, e.g. one request."""
+    timings = StageTimings()
+    token = _stage_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _stage_timings.reset(token)
+
+
+def record_body_parsing(name: str = "parse"):
+    """
+    Called first thing in a handler whose body FastAPI parsed and validated:
+    records the time since the body was received as stage name.
+    """
+    timings = _stage_timings.get()
+    if timings is not None and timings.body_received is not None:
+        timings.add(name, time.perf_counter() - timings.body_received)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Add the time spent in the block to stage name of the current request.
+    Outside a timed request this costs one context variable lookup.
+    """
+    timings = _stage_timings.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - start)
@@ -1,14 +1,54 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager, suppress
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from api.admission import AdmissionMiddleware, BodySizeLimitMiddleware
+from api.diagnostics import ProfilingMiddleware, ServerTimingMiddleware, router as diagnostics_router
+from api.metrics import MetricsMiddleware, router as metrics_router
+from api.v1.edi.jobs import router as jobs_router
 from api.v1.edi.router import router as edi_router
 from api.v1.health import router as health_router
+from api.warmup import start_warmup
+from services.edi_jobs import start_job_runner, stop_job_runner
+from funcs.utils.metrics import get_loop_lag_interval, monitor_event_loop_lag
+from funcs.utils.offload import shutdown_offload_executor
+from funcs.utils.process_pool import shutdown_process_pool
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    interval = get_loop_lag_interval()
+    lag_monitor = asyncio.create_task(monitor_event_loop_lag(interval)) if interval > 0 else None
+    warmup = await start_warmup(app)
+    await start_job_runner()
+    yield
+    # Lets running jobs finish; queued ones are left to other workers
+    await stop_job_runner()
+    if warmup is not None:
+        await warmup
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await lag_monitor
+    # Stop offload threads and batch workers with the app
+    shutdown_offload_executor()
+    shutdown_process_pool()
+
+# The interactive docs and the OpenAPI document; EDI_DOCS_ENABLED=0 turns them off in production
+DOCS_ENABLED = os.getenv("EDI_DOCS_ENABLED", "1") != "0"
 
 app = FastAPI(
     title="Cargo EDI API",
     description="API for generating and decoding cargo EDI messages",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    openapi_url="/openapi.json" if DOCS_ENABLED else None
 )
 
+# Innermost, so CORS preflights are never queued and shed responses get CORS headers
+app.add_middleware(AdmissionMiddleware)
+app.add_middleware(BodySizeLimitMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -18,17 +58,28 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Middleware added later wraps the earlier ones: profiling and stage timing
+# cover everything inside them, metrics (added last) measure preflight responses too
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(ServerTimingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
 # Include routers
 app.include_router(edi_router)
+app.include_router(jobs_router)
 app.include_router(health_router)
+app.include_router(metrics_router)
+app.include_router(diagnostics_router)
 
 @app.get("/")
 async def root():
     return {
         "message": "Welcome to Cargo EDI API",
-        "docs_url": "/docs",
-        "redoc_url": "/redoc"
+        "docs_url": app.docs_url if DOCS_ENABLED else None,
+        "redoc_url": app.redoc_url if DOCS_ENABLED else None
     }
 
 if __name__ == "__main__":
-    import uvicorn
\ No newline at end of file
+    # Same as python server.py
+    from server import main
+    main()
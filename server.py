@@ -0,0 +1,128 @@
+"""
+Production entry point: python server.py
+
+Runs the app in one uvicorn worker process per available CPU (see
+funcs/utils/server_config.py for the settings) on a socket bound once by
+this supervisor process. Workers that exit, e.g. after EDI_MAX_REQUESTS
+requests, are replaced; SIGTERM or SIGINT drains all workers gracefully.
+"""
+import logging
+import multiprocessing
+import os
+import random
+import signal
+import socket
+import sys
+import threading
+import time
+from multiprocessing.context import SpawnProcess
+from typing import Any, Dict, List, Optional
+import uvicorn
+from funcs.utils.server_config import ServerConfig, available_cpus, load_server_config
+
+APP = "main:app"
+# A worker failing before it has run this long is a startup failure, not a crash to recover from
+WORKER_STARTUP_SECONDS = 10
+# Extra time, beyond the graceful timeout, before workers that do not exit are killed
+KILL_GRACE_SECONDS = 5
+
+logger = logging.getLogger("uvicorn.error")
+
+multiprocessing.allow_connection_pickling()
+spawn = multiprocessing.get_context("spawn")
+
+
+def run_worker(options: Dict[str, Any], max_requests: Optional[int], sockets: List[socket.socket]):
+    """Body of one worker process: serve the app on the supervisor's socket."""
+    config = uvicorn.Config(APP, limit_max_requests=max_requests, **options)
+    uvicorn.Server(config).run(sockets=sockets)
+
+
+class Supervisor:
+    """Keeps config.workers worker processes serving one listening socket."""
+
+    def __init__(self, config: ServerConfig):
+        self.config = config
+        self.should_exit = threading.Event()
+        self.processes: List[SpawnProcess] = []
+        self.started_at: Dict[int, float] = {}
+        self.sockets: List[socket.socket] = []
+
+    def worker_max_requests(self) -> Optional[int]:
+        if not self.config.max_requests:
+            return None
+        return self.config.max_requests + random.randint(0, max(0, self.config.max_requests_jitter))
+
+    def spawn_worker(self) -> SpawnProcess:
+        process = spawn.Process(
+            target=run_worker,
+            args=(self.config.uvicorn_options(), self.worker_max_requests(), self.sockets),
+            daemon=False
+        )
+        process.start()
+        self.started_at[process.pid] = time.monotonic()
+        return process
+
+    def handle_signal(self, sig: int, frame: Any):
+        self.should_exit.set()
+
+    def run(self) -> int:
+        """Serve until signalled; returns the process exit code."""
+        bind_config = uvicorn.Config(APP, **self.config.uvicorn_options())
+        self.sockets = [bind_config.bind_socket()]
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.handle_signal)
+
+        logger.info(
+            "Starting %d workers (loop=%s, http=%s, max requests=%s)",
+            self.config.workers, self.config.loop, self.config.http, self.config.max_requests or "unlimited"
+        )
+        self.processes = [self.spawn_worker() for _ in range(self.config.workers)]
+
+        exit_code = 0
+        while not self.should_exit.wait(0.5):
+            for index, process in enumerate(self.processes):
+                if process.is_alive():
+                    continue
+                process.join()
+                uptime = time.monotonic() - self.started_at.pop(process.pid, 0.0)
+                if process.exitcode != 0 and uptime < WORKER_STARTUP_SECONDS:
+                    logger.error("Worker %d failed to start (exit code %s), stopping", process.pid, process.exitcode)
+                    exit_code = 1
+                    self.should_exit.set()
+                    break
+                logger.info("Worker %d exited (exit code %s), starting a new one", process.pid, process.exitcode)
+                self.processes[index] = self.spawn_worker()
+
+        self.shutdown()
+        return exit_code
+
+    def shutdown(self):
+        """Ask every worker to drain, then kill those still running after the graceful timeout."""
+        for process in self.processes:
+            if process.is_alive():
+                process.terminate()
+        deadline = time.monotonic() + self.config.graceful_timeout + KILL_GRACE_SECONDS
+        for process in self.processes:
+            process.join(max(0.0, deadline - time.monotonic()))
+            if process.is_alive():
+                logger.warning("Worker %d did not stop in time, killing it", process.pid)
+                process.kill()
+                process.join()
+        for sock in self.sockets:
+            sock.close()
+        logger.info("Stopped all workers")
+
+
+def main():
+    config = load_server_config()
+    # Share the CPUs between the workers' batch pools and offload threads
+    # instead of giving every worker one per CPU
+    per_worker = str(max(1, available_cpus() // config.workers))
+    os.environ.setdefault("EDI_PROCESS_POOL_WORKERS", per_worker)
+    os.environ.setdefault("EDI_OFFLOAD_WORKERS", per_worker)
+    sys.exit(Supervisor(config).run())
+
+
+if __name__ == "__main__":
+    main()
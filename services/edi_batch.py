@@ -0,0 +1,87 @@
+from typing import Any, Dict, List
+from pydantic import ValidationError
+from services.edi_decoder import decode_edi_records
+from services.edi_generator import generate_edi_message
+from services.form_validator import EDIFormRequest
+from funcs.utils.edi_logging import log_edi
+
+
+def decode_edi_message_result(edi: str) -> Dict[str, Any]:
+    """
+    Decode one EDI message of a batch into a result record.
+    Failures are returned as structured errors rather than raised, so one bad
+    message never fails the rest of the batch.
+    """
+    if not edi or not edi.strip():
+        return {
+            "status": "error",
+            "message": "EDI message is required",
+            "code": "EMPTY_EDI"
+        }
+
+    try:
+        records = decode_edi_records(edi)
+    except Exception as e:
+        log_edi("error", "Batch EDI decoding failed: %s", e)
+        return {
+            "status": "error",
+            "message": "EDI decoding failed",
+            "code": "DECODE_ERROR",
+            "error": str(e)
+        }
+
+    return {
+        "status": "success",
+        "cargo_items": [record.to_dict() for record in records]
+    }
+
+
+def decode_edi_batch(messages: List[str]) -> List[Dict[str, Any]]:
+    """Decode a list of EDI messages, returning one result record per message in order."""
+    return [decode_edi_message_result(edi) for edi in messages]
+
+
+def validation_error_detail(e: ValidationError) -> Dict[str, Any]:
+    """Structured error of a booking that failed the EDIFormRequest rules."""
+    errors = [
+        {"loc": list(error["loc"]), "msg": error["msg"], "type": error["type"]}
+        for error in e.errors()
+    ]
+    return {
+        "message": "; ".join(error["msg"] for error in errors),
+        "code": "VALIDATION_ERROR",
+        "errors": errors
+    }
+
+
+def generate_edi_booking_result(booking: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Validate one booking with the EDIFormRequest rules and render its EDI message.
+    Validation failures are returned as structured errors, one per booking.
+    """
+    try:
+        form_data = EDIFormRequest.model_validate(booking)
+    except ValidationError as e:
+        return {"status": "error", **validation_error_detail(e)}
+
+    try:
+        edi_output = generate_edi_message(form_data.cargo_items)
+    except Exception as e:
+        log_edi("error", "Batch EDI generation failed: %s", e)
+        return {
+            "status": "error",
+            "message": "EDI generation failed",
+            "code": "GENERATION_ERROR",
+            "error": str(e)
+        }
+
+    return {
+        "status": "success",
+        "edi": edi_output,
+        "item_count": len(form_data.cargo_items)
+    }
+
+
+def generate_edi_batch(bookings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Validate and render a list of bookings, returning one result record per booking in order."""
+    return [generate_edi_booking_result(booking) for booking in bookings]
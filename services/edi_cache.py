@@ -0,0 +1,388 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+from services.edi_decoder import decode_edi_records
+from services.edi_serializer import RawJSON, cargo_items_json
+from funcs.utils.edi_logging import log_edi
+from funcs.utils.process_pool import in_pool_process
+from funcs.utils.stage_timing import stage
+
+# Defaults for the decode cache, overridable through the environment
+DEFAULT_DECODE_CACHE_SIZE = 1024
+DEFAULT_DECODE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_DECODE_CACHE_TTL = 300.0
+DEFAULT_GENERATE_CACHE_SIZE = 256
+DEFAULT_GENERATE_CACHE_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_GENERATE_CACHE_TTL = 3600.0
+
+# Approximate CPython size of an entry and of the strings it holds, on top of
+# their lengths
+ENTRY_OVERHEAD = 200
+
+
+class CacheEntry(NamedTuple):
+    """
+    Outcome of decoding one EDI message.
+
+    Exactly one of items and error is set: the item count and serialized
+    cargo items of a message that decoded, as the decode endpoints return
+    them, or the ValueError message of one that did not. size is the
+    approximate memory charged against the byte budget.
+    """
+    items: Optional[Tuple[int, RawJSON]]
+    error: Optional[str]
+    size: int
+    expires_at: float
+
+
+class GeneratedResponse(NamedTuple):
+    """
+    Rendered /generate response body.
+    fingerprint is the canonical hash of the request it was generated from.
+    """
+    fingerprint: str
+    body: bytes
+    etag: str
+    size: int
+    expires_at: float
+
+
+class IdempotencyEntry(NamedTuple):
+    """
+    Idempotency-Key pinned to the fingerprint of its first request.
+    The response itself is only stored once, under that fingerprint.
+    """
+    fingerprint: str
+    size: int
+    expires_at: float
+
+
+class CacheBackend(ABC):
+    """
+    Storage behind DecodeCache and GenerateCache.
+
+    Backends map cache keys to entries (CacheEntry, GeneratedResponse,
+    IdempotencyEntry) that carry their own size and expires_at, and own
+    eviction and expiry, so a shared store (e.g. Redis) can replace the
+    in-process one by implementing these methods. Entries hold only tuples,
+    strings and bytes, so they pickle.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Any]:
+        """The live entry stored under key, or None."""
+
+    @abstractmethod
+    def set(self, key: str, entry: Any):
+        """Store entry under key, evicting others as needed."""
+
+    @abstractmethod
+    def clear(self):
+        """Drop every entry."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, int]:
+        """Counters and sizes, as the cache stats endpoints report them."""
+
+
+class InMemoryLRUBackend(CacheBackend):
+    """
+    Process-local LRU store bounded by entry count and approximate bytes.
+
+    Each uvicorn worker (and each batch pool process) holds its own copy;
+    nothing is shared between processes, and a forked child starts empty
+    with a fresh lock instead of inheriting one that may be held.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._reset()
+
+    def _reset(self):
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def get(self, key: str) -> Optional[Any]:
+        self._check_fork()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= time.monotonic():
+                del self._entries[key]
+                self.bytes -= entry.size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def set(self, key: str, entry: Any):
+        self._check_fork()
+        if entry.size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes -= previous.size
+            self._entries[key] = entry
+            self.bytes += entry.size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= evicted.size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        self._check_fork()
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+def normalize_edi(edi: str) -> str:
+    """
+    Normalize a message for cache keying.
+    Only CRLF line endings are folded into LF: every other difference can
+    change the decode result or the validation errors reported.
+    """
+    return edi.replace("\r\n", "\n")
+
+
+def make_cache_key(edi: str) -> str:
+    """Content address of an EDI message: BLAKE2b-128 of the normalized text."""
+    data = normalize_edi(edi).encode("utf-8", "surrogatepass")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def make_bytes_cache_key(data: bytes) -> str:
+    """
+    make_cache_key for a raw UTF-8 message, without decoding it.
+    A raw body shares its cache entry with the same message sent as JSON.
+    """
+    if b"\r" in data:
+        data = data.replace(b"\r\n", b"\n")
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class DecodeCache:
+    """
+    Content-addressed cache of decoded and serialized messages.
+
+    Successful decodes and validation failures are both cached for ttl
+    seconds, so a resent document, valid or not, skips validation and
+    decoding entirely. Only plain ValueErrors are cached negatively; other
+    failures are re-raised every time.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_hits = 0
+
+    def decode(self, edi: str) -> Tuple[int, RawJSON]:
+        """
+        Item count and cargo items JSON of decode_edi_records(edi), served
+        from the cache when possible. Raises ValueError like it.
+        """
+        if not edi or not edi.strip():
+            # Cheaper to reject again than to hash
+            return decode_edi_records(edi)
+        with stage("cache"):
+            key = make_cache_key(edi)
+        items = self.lookup(key)
+        if items is not None:
+            return items
+        try:
+            records = decode_edi_records(edi)
+        except ValueError as e:
+            self.store_error(key, e)
+            raise
+        items = len(records), cargo_items_json(records)
+        self.store(key, *items)
+        return items
+
+    def lookup(self, key: str) -> Optional[Tuple[int, RawJSON]]:
+        """
+        The item count and items JSON cached under key, or None on a miss.
+        Raises the cached ValueError of a message that failed to decode.
+        """
+        with stage("cache"):
+            entry = self.backend.get(key)
+        if entry is None:
+            return None
+        log_edi("debug", "Decode cache hit for %s", key)
+        if entry.error is not None:
+            self.negative_hits += 1
+            raise ValueError(entry.error)
+        return entry.items
+
+    def store(self, key: str, item_count: int, items_json: RawJSON):
+        """Cache the items a message decoded to."""
+        size = ENTRY_OVERHEAD + len(items_json.text)
+        self.backend.set(key, CacheEntry((item_count, items_json), None, size, time.monotonic() + self.ttl))
+
+    def store_error(self, key: str, error: ValueError):
+        """Cache the failure of a message, if it is one that decoding it again would repeat."""
+        if type(error) is ValueError:
+            message = str(error)
+            self.backend.set(key, CacheEntry(None, message, len(message), time.monotonic() + self.ttl))
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.backend.stats(), "negative_hits": self.negative_hits}
+
+    def clear(self):
+        self.backend.clear()
+
+
+_decode_cache: Optional[DecodeCache] = None
+
+
+def get_decode_cache() -> Optional[DecodeCache]:
+    """
+    Return the shared decode cache, creating it on first use.
+    Returns None when EDI_DECODE_CACHE_SIZE is 0, and in process pool
+    workers, which would each hold another copy of the worker's entries.
+    """
+    global _decode_cache
+    if in_pool_process():
+        return None
+    if _decode_cache is None:
+        max_entries = int(os.getenv("EDI_DECODE_CACHE_SIZE", DEFAULT_DECODE_CACHE_SIZE))
+        if max_entries <= 0:
+            return None
+        backend = InMemoryLRUBackend(
+            max_entries=max_entries,
+            max_bytes=int(os.getenv("EDI_DECODE_CACHE_MAX_BYTES", DEFAULT_DECODE_CACHE_MAX_BYTES))
+        )
+        _decode_cache = DecodeCache(backend, ttl=float(os.getenv("EDI_DECODE_CACHE_TTL", DEFAULT_DECODE_CACHE_TTL)))
+    return _decode_cache
+
+
+def make_payload_fingerprint(payload: Any) -> str:
+    """
+    Canonical hash of a parsed JSON payload.
+    Key order and whitespace do not matter, so reformatted retries still match.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.blake2b(canonical.encode("utf-8", "surrogatepass"), digest_size=16).hexdigest()
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag of a response body."""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+class IdempotencyKeyMismatch(ValueError):
+    """An Idempotency-Key was reused with a different request payload."""
+
+
+class GenerateCache:
+    """
+    Rendered /generate responses, stored by payload fingerprint and by
+    Idempotency-Key.
+
+    Generation is deterministic, so any request whose canonical payload was
+    seen within ttl seconds gets the stored bytes back without validation or
+    rendering. An Idempotency-Key pins the fingerprint of its first request,
+    so the body is stored and charged once; reusing the key with another
+    payload raises IdempotencyKeyMismatch.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: float):
+        self.backend = backend
+        self.ttl = ttl
+        self.replays = 0
+
+    def lookup(self, fingerprint: str, idempotency_key: Optional[str] = None) -> Tuple[Optional[GeneratedResponse], bool]:
+        """
+        Stored response for this request, if any, and whether it is a replay
+        of an earlier request with the same Idempotency-Key.
+        """
+        pinned = None
+        if idempotency_key is not None:
+            pinned = self.backend.get("idempotency:" + idempotency_key)
+            if pinned is not None and pinned.fingerprint != fingerprint:
+                raise IdempotencyKeyMismatch("Idempotency-Key was already used with a different request payload")
+
+        entry = self.backend.get("payload:" + fingerprint)
+        if entry is None:
+            # A key whose response was evicted is pinned again by put()
+            return None, False
+        if pinned is not None:
+            self.replays += 1
+            return entry, True
+        if idempotency_key is not None:
+            # First use of this key: pin it to the payload it came with
+            self._pin(idempotency_key, fingerprint)
+        return entry, False
+
+    def put(self, fingerprint: str, body: bytes, idempotency_key: Optional[str] = None) -> GeneratedResponse:
+        """Store a rendered response body and return its entry."""
+        entry = GeneratedResponse(fingerprint, body, make_etag(body), len(body), time.monotonic() + self.ttl)
+        self.backend.set("payload:" + fingerprint, entry)
+        if idempotency_key is not None:
+            self._pin(idempotency_key, fingerprint)
+        return entry
+
+    def _pin(self, idempotency_key: str, fingerprint: str):
+        size = ENTRY_OVERHEAD + len(idempotency_key) + len(fingerprint)
+        self.backend.set("idempotency:" + idempotency_key, IdempotencyEntry(fingerprint, size, time.monotonic() + self.ttl))
+
+    def stats(self) -> Dict[str, int]:
+        return {**self.backend.stats(), "idempotent_replays": self.replays}
+
+    def clear(self):
+        self.backend.clear()
+
+
+_generate_cache: Optional[GenerateCache] = None
+
+
+def get_generate_cache() -> Optional[GenerateCache]:
+    """
+    Return the shared /generate response cache, creating it on first use.
+    Returns None when EDI_GENERATE_CACHE_SIZE is 0.
+    """
+    global _generate_cache
+    if _generate_cache is None:
+        max_entries = int(os.getenv("EDI_GENERATE_CACHE_SIZE", DEFAULT_GENERATE_CACHE_SIZE))
+        if max_entries <= 0:
+            return None
+        backend = InMemoryLRUBackend(
+            max_entries=max_entries,
+            max_bytes=int(os.getenv("EDI_GENERATE_CACHE_MAX_BYTES", DEFAULT_GENERATE_CACHE_MAX_BYTES))
+        )
+        _generate_cache = GenerateCache(backend, ttl=float(os.getenv("EDI_GENERATE_CACHE_TTL", DEFAULT_GENERATE_CACHE_TTL)))
+    return _generate_cache
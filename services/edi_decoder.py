@@ -1,7 +1,13 @@
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
 from pydantic import BaseModel
-from services.edi_validator import validate_edi_message
-from funcs.utils.edi_logging import log_edi 
+from services.edi_validator import EDIMessageValidator, EMPTY_LINE_PATTERN, RFF_FIELDS, UNQUALIFIED_SEGMENT
+from funcs.utils.edi_logging import log_edi, PayloadPreview
+from funcs.utils.server_config import get_max_body_bytes
+from funcs.utils.stage_timing import stage
+
+# Bytes of a raw EDI body decoded to text at a time by decode_edi_bytes
+RAW_DECODE_BLOCK_SIZE = 64 * 1024
+
 
 class CargoItem(BaseModel):
     cargo_type: str
@@ -10,6 +16,36 @@ class CargoItem(BaseModel):
     master_bill_number: Optional[str] = None
     house_bill_number: Optional[str] = None
 
+
+class DecodedCargoItem(NamedTuple):
+    """
+    Compact, tuple-backed cargo item produced by the decoder.
+
+    Has the same fields as CargoItem but skips Pydantic validation, which
+    the segment grammar has already done. Use to_cargo_item() where the
+    Pydantic model is needed.
+    """
+    cargo_type: str
+    package_count: int
+    container_number: Optional[str] = None
+    master_bill_number: Optional[str] = None
+    house_bill_number: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Fields that are set, as the decode endpoints return them."""
+        return {field: value for field, value in zip(self._fields, self) if value is not None}
+
+    def to_cargo_item(self) -> CargoItem:
+        return CargoItem(**self.to_dict())
+
+
+def make_decoded_item(fields: Dict[str, Any]) -> DecodedCargoItem:
+    """Build a DecodedCargoItem from the fields collected for one LIN block."""
+    if "cargo_type" not in fields or "package_count" not in fields:
+        # Let CargoItem raise the same validation error it always has
+        CargoItem(**fields)
+    return DecodedCargoItem(**fields)
+
 # Function to remove trailing segment terminator
 def unescape_edi_content(content: str, original_line: str) -> str:
     """
@@ -21,73 +57,250 @@ def unescape_edi_content(content: str, original_line: str) -> str:
     return content
 
 
-def decode_edi_to_items(edi: str) -> List[CargoItem]:
+def classify_segment(line: str):
     """
-    Parse a validated EDI string into structured CargoItem objects.
+    Map a segment line to the (field, value) it contributes to a cargo item
+    by its tag alone. Used for lines the validator accepted without a known
+    RFF qualifier, so they decode exactly as they always have.
+    """
+    if line.startswith("LIN+"):
+        return "LIN", None
+    if line.startswith("PAC+++"):
+        return "cargo_type", line.split("+++", 1)[1].split(":")[0]
+    if line.startswith("PAC+"):
+        parts = line.split("+")
+        if len(parts) >= 3 and parts[2].startswith("1"):
+            return "package_count", int(parts[1])
+        return None, None
+    for prefix, field in RFF_FIELDS.items():
+        if line.startswith(prefix):
+            return field, unescape_edi_content(line.split(":", 1)[1], line)
+    return None, None
+
+
+class StreamingEDIDecoder:
+    """
+    Incremental decoder that yields cargo items as each LIN block closes.
+
+    Text can be fed in arbitrary chunks with feed(), or as already split
+    lines with feed_line(). Only the current partial line and the item being
+    built are held in memory, and a partial line longer than max_line
+    characters (default: EDI_MAX_BODY_BYTES; 0 for no limit) raises
+    ValueError. Items are released while the message is valid so far;
+    close() raises ValueError with the same messages as decode_edi_to_items
+    if the complete message turns out to be invalid.
+    """
+
+    def __init__(self, max_line: Optional[int] = None):
+        self.validator = EDIMessageValidator()
+        self.item_count = 0
+        self.max_line = get_max_body_bytes() if max_line is None else max_line
+        self._current = {}
+        self._parse_error = None
+        # Chunks of the current partial line, joined once its newline arrives
+        self._pending: List[str] = []
+        self._pending_size = 0
+        self._after_newline = False
+
+    def feed(self, chunk: str) -> List[DecodedCargoItem]:
+        """Consume a chunk of raw EDI text and return the items it completed."""
+        # Only the new chunk is searched, so each character is scanned once
+        cut = chunk.rfind("\n")
+        if cut == -1:
+            self._hold(chunk)
+            return []
+        self._pending.append(chunk[:cut])
+        pieces = "".join(self._pending).split("\n")
+        self._pending = []
+        self._pending_size = 0
+        self._hold(chunk[cut + 1:])
+        items = []
+        for piece in pieces:
+            # A blank piece between two newlines is what EMPTY_LINE_PATTERN flags
+            if self._after_newline and not piece.strip():
+                self.validator.mark_empty_lines()
+            self._after_newline = True
+            for line in piece.splitlines():
+                item = self.feed_line(line.strip())
+                if item is not None:
+                    items.append(item)
+        return items
+
+    def _hold(self, text: str):
+        if not text:
+            return
+        self._pending.append(text)
+        self._pending_size += len(text)
+        if self.max_line and self._pending_size > self.max_line:
+            raise ValueError(f"EDI line longer than {self.max_line} characters")
+
+    def feed_line(self, line: str) -> Optional[DecodedCargoItem]:
+        """Consume one segment line and return the item it completed, if any."""
+        if not line:
+            return None
+
+        validator = self.validator
+        field, value = validator.feed(line)
+        if field is None or self._parse_error is not None or not validator.is_valid:
+            return None
+
+        completed = None
+        try:
+            if field == UNQUALIFIED_SEGMENT:
+                field, value = classify_segment(line)
+                if field is None:
+                    return None
+
+            if field == "LIN":
+                if self._current:
+                    # Create cargo item with only the fields that actually exist
+                    completed = make_decoded_item(self._current)
+                    self.item_count += 1
+                    if validator.debug:
+                        log_edi("debug", "Added cargo item: %s", self._current)
+                self._current = {}
+                if validator.debug:
+                    log_edi("debug", "Start new cargo item")
+            else:
+                self._current[field] = value
+                if validator.debug:
+                    log_edi("debug", "%s set: %s", field, value)
+
+        except Exception as e:
+            # Reported only once the whole message is known to be valid
+            log_edi("error", "Error parsing line '%s': %s", line, e)
+            self._parse_error = ValueError(f"Failed to parse line: {line}")
+            self._parse_error.__cause__ = e
+
+        return completed
+
+    def close(self) -> List[DecodedCargoItem]:
+        """
+        Finish the message and return the items its last line completed.
+        Raises ValueError if the message was empty, invalid or unparsable.
+        """
+        # The unterminated last line can close a block, like any other LIN
+        items = []
+        if self._pending:
+            for line in "".join(self._pending).splitlines():
+                item = self.feed_line(line.strip())
+                if item is not None:
+                    items.append(item)
+            self._pending = []
+            self._pending_size = 0
+
+        validator = self.validator
+        # Check for empty EDI
+        if validator.line_count == 0:
+            log_edi("error", "Empty EDI message")
+            raise ValueError("EDI message cannot be empty")
+
+        errors = validator.finish()
+        if errors:
+            log_edi("error", "EDI validation failed with %d errors: %s", len(errors), PayloadPreview(errors))
+            raise ValueError(f"Invalid EDI format: {errors}")
+        log_edi("info", "EDI passed validation")
+
+        if self._parse_error is not None:
+            raise self._parse_error
+
+        if self._current:
+            items.append(make_decoded_item(self._current))
+            self.item_count += 1
+            log_edi("debug", "Final cargo item added: %s", self._current)
+            self._current = {}
+
+        log_edi("info", "EDI decoding completed. Total lines: %d, total cargo items: %d", validator.line_count, self.item_count)
+        return items
+
+
+@stage("decode")
+def decode_edi_records(edi: str) -> List[DecodedCargoItem]:
+    """
+    Parse a validated EDI string into compact DecodedCargoItem records.
     Raises ValueError if EDI is invalid or empty.
+
+    Validation and decoding share a single pass over the segments: every line
+    is fed to EDIMessageValidator, which reports the cargo field it carries.
+    Items are only built while no errors have been seen, and validation errors
+    always take precedence over parse errors, as when the two ran separately.
     """
     # Check for empty EDI
     if not edi or not edi.strip():
         log_edi("error", "Empty EDI message")
         raise ValueError("EDI message cannot be empty")
 
-    lines = [line.strip() for line in edi.strip().splitlines() if line.strip()]
-    log_edi("info", f"Starting EDI decode. Total lines: {len(lines)}")
+    log_edi("info", "Starting EDI decode")
 
-    # Check for empty lines list after stripping
-    if not lines:
-        log_edi("error", "No valid EDI segments found after stripping whitespace")
-        raise ValueError("EDI message contains no valid segments")
+    decoder = StreamingEDIDecoder()
+    if EMPTY_LINE_PATTERN.search(edi):
+        decoder.validator.mark_empty_lines()
 
-    # Step 1: Validate the EDI format structure
-    is_valid, errors = validate_edi_message(edi)
-    if not is_valid:
-        log_edi("error", f"EDI validation failed: {errors}")
-        raise ValueError(f"Invalid EDI format: {errors}")
-    log_edi("info", "EDI passed validation")
+    records = []
+    for line in edi.strip().splitlines():
+        item = decoder.feed_line(line.strip())
+        if item is not None:
+            records.append(item)
 
-    cargo_items = []
-    current = {}
+    records.extend(decoder.close())
+    return records
 
-    for line in lines:
-        try:
-            if line.startswith("LIN+"):
-                if current:
-                    # Create CargoItem object with only the fields that actually exist
-                    cargo_items.append(CargoItem(**current))
-                    log_edi("debug", f"Added cargo item: {current}")
-                current = {}
-                log_edi("debug", "Start new cargo item")
-
-            elif line.startswith("PAC+++"):
-                current["cargo_type"] = line.split("+++", 1)[1].split(":")[0]
-                log_edi("debug", f"cargo_type set: {current['cargo_type']}")
-
-            elif line.startswith("PAC+"):
-                parts = line.split("+")
-                if len(parts) >= 3 and parts[2].startswith("1"):
-                    current["package_count"] = int(parts[1])
-                    log_edi("debug", f"package_count set: {current['package_count']}")
-
-            elif line.startswith("RFF+AAQ:"):
-                current["container_number"] = unescape_edi_content(line.split(":", 1)[1], line)
-                log_edi("debug", f"container_number set: {current['container_number']}")
-
-            elif line.startswith("RFF+MB:"):
-                current["master_bill_number"] = unescape_edi_content(line.split(":", 1)[1], line)
-                log_edi("debug", f"master_bill_number set: {current['master_bill_number']}")
-
-            elif line.startswith("RFF+BH:"):
-                current["house_bill_number"] = unescape_edi_content(line.split(":", 1)[1], line)
-                log_edi("debug", f"house_bill_number set: {current['house_bill_number']}")
 
-        except Exception as e:
-            log_edi("error", f"Error parsing line '{line}': {e}")
-            raise ValueError(f"Failed to parse line: {line}") from e
+@stage("decode")
+def decode_edi_bytes(data: bytes, progress: Optional[Callable[[int], None]] = None) -> List[DecodedCargoItem]:
+    """
+    Parse a raw UTF-8 EDI body into DecodedCargoItem records.
+    Same results and errors as decode_edi_records(data.decode("utf-8")).
+    Raises UnicodeDecodeError if the body is not UTF-8.
+    progress, if given, is called with the items decoded so far after each block.
+
+    The body is cut into blocks of about RAW_DECODE_BLOCK_SIZE bytes at
+    segment boundaries found with bytes.rfind, and each block is decoded
+    from a memoryview of the body. Neither a str copy of the whole message
+    nor a list of all its lines is ever built: memory beyond the input is
+    the records plus one block.
+    """
+    log_edi("info", "Starting raw EDI decode")
+
+    decoder = StreamingEDIDecoder()
+    validator = decoder.validator
+    view = memoryview(data)
+    size = len(data)
+    records = []
+    start = 0
+    while start < size:
+        end = start + RAW_DECODE_BLOCK_SIZE
+        if end >= size:
+            end = size
+        else:
+            # Blocks end just after a newline byte, which never occurs inside
+            # a multi-byte UTF-8 sequence or a CRLF pair
+            cut = data.rfind(b"\n", start, end)
+            if cut == -1:
+                cut = data.find(b"\n", end)
+            end = size if cut == -1 else cut + 1
+
+        text = str(view[start:end], "utf-8")
+        # The previous block's final newline can start an empty-line match
+        if not validator.has_empty_lines and EMPTY_LINE_PATTERN.search(text if start == 0 else "\n" + text):
+            validator.mark_empty_lines()
 
-    if current:
-        cargo_items.append(CargoItem(**current))
-        log_edi("debug", f"Final cargo item added: {current}")
+        for line in text.splitlines():
+            item = decoder.feed_line(line.strip())
+            if item is not None:
+                records.append(item)
+        start = end
+        if progress is not None:
+            progress(decoder.item_count)
 
-    log_edi("info", f"EDI decoding completed. Total cargo items: {len(cargo_items)}")
-    return cargo_items
+    view.release()
+    records.extend(decoder.close())
+    return records
+
+
+def decode_edi_to_items(edi: str) -> List[CargoItem]:
+    """
+    Parse a validated EDI string into structured CargoItem objects.
+    Raises ValueError if EDI is invalid or empty.
+    """
+    return [record.to_cargo_item() for record in decode_edi_records(edi)]
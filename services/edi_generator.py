@@ -1,6 +1,7 @@
-from typing import List, Optional
+from typing import Iterable, Iterator, List, Optional
 from pydantic import BaseModel
 from enum import Enum
+from funcs.utils.stage_timing import stage
 
 
 class CargoTypes(str, Enum):
@@ -22,27 +23,53 @@ def escape_edi_content(text: str) -> str:
     return text.replace("'", "?'") if text else text
 
 
-def generate_edi_segment(item: CargoItem, index: int) -> str:
-    lines = []
-    lines.append(f"LIN+{index}+I'")
-    lines.append(f"PAC+++{item.cargo_type}:67:95'")
-    lines.append(f"PAC+{item.package_count}+1'")
+def iter_segment_lines(item: CargoItem, index: int) -> Iterator[str]:
+    """Yield the EDI segment lines for one cargo item, without separators."""
+    yield f"LIN+{index}+I'"
+    yield f"PAC+++{item.cargo_type}:67:95'"
+    yield f"PAC+{item.package_count}+1'"
 
     if item.container_number:
-        lines.append("PCI+1'")
-        lines.append(f"RFF+AAQ:{escape_edi_content(item.container_number)}'")
+        yield "PCI+1'"
+        yield f"RFF+AAQ:{escape_edi_content(item.container_number)}'"
 
     if item.master_bill_number:
-        lines.append("PCI+1'")
-        lines.append(f"RFF+MB:{escape_edi_content(item.master_bill_number)}'")
+        yield "PCI+1'"
+        yield f"RFF+MB:{escape_edi_content(item.master_bill_number)}'"
 
     if item.house_bill_number:
-        lines.append("PCI+1'")
-        lines.append(f"RFF+BH:{escape_edi_content(item.house_bill_number)}'")
+        yield "PCI+1'"
+        yield f"RFF+BH:{escape_edi_content(item.house_bill_number)}'"
+
+
+def iter_edi_lines(cargo_items: Iterable[CargoItem]) -> Iterator[str]:
+    """Yield every EDI segment line of the message, in order."""
+    for idx, item in enumerate(cargo_items, start=1):
+        yield from iter_segment_lines(item, idx)
+
 
-    return "\n".join(lines)
+def iter_edi_message(cargo_items: Iterable[CargoItem], items_per_chunk: int = 500) -> Iterator[str]:
+    """
+    Yield the EDI message in text chunks of items_per_chunk cargo items.
+    Concatenating the chunks gives exactly generate_edi_message(cargo_items).
+    """
+    separator = ""
+    lines = []
+    for idx, item in enumerate(cargo_items, start=1):
+        lines.extend(iter_segment_lines(item, idx))
+        if idx % items_per_chunk == 0:
+            yield separator + "\n".join(lines)
+            separator = "\n"
+            lines = []
+
+    if lines:
+        yield separator + "\n".join(lines)
+
+
+def generate_edi_segment(item: CargoItem, index: int) -> str:
+    return "\n".join(iter_segment_lines(item, index))
 
 
+@stage("render")
 def generate_edi_message(cargo_items: List[CargoItem]) -> str:
-    segments = [generate_edi_segment(item, idx + 1) for idx, item in enumerate(cargo_items)]
-    return "\n".join(segments)
+    return "\n".join(iter_edi_lines(cargo_items))
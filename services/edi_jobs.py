@@ -0,0 +1,454 @@
+import asyncio
+import json
+import multiprocessing
+import os
+import secrets
+import sqlite3
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import closing, suppress
+from typing import Any, Dict, NamedTuple, Optional, Set, Tuple
+from pydantic import ValidationError
+from services.edi_batch import validation_error_detail
+from services.edi_decoder import decode_edi_bytes
+from services.edi_generator import iter_edi_message
+from services.edi_serializer import cargo_items_json, dump_envelope
+from services.form_validator import EDIFormRequest
+from funcs.utils.edi_logging import log_edi
+from funcs.utils.metrics import REGISTRY, CallbackMetric, Counter
+
+# Defaults for the job store and runner, overridable through the environment
+DEFAULT_JOB_DB = "edi_jobs.db"
+DEFAULT_JOB_WORKERS = 1
+DEFAULT_JOB_TTL = 3600.0
+# Seconds a job may run before it is presumed lost with its worker and queued again
+DEFAULT_JOB_LEASE = 600.0
+DEFAULT_JOB_NICE = 10
+# Seconds between looks for jobs accepted by other worker processes
+DEFAULT_JOB_POLL_INTERVAL = 1.0
+# Seconds between deletions of expired jobs
+JOB_CLEANUP_INTERVAL = 60.0
+# Least seconds between two progress writes of one job
+PROGRESS_INTERVAL = 0.25
+# Cargo items rendered between two progress reports of a generate job
+GENERATE_CHUNK_ITEMS = 500
+
+JOB_TYPES = ("decode", "generate")
+
+JOBS_SUBMITTED = Counter(
+    "edi_jobs_submitted_total",
+    "Jobs accepted by this worker process",
+    ("type",),
+    registry=REGISTRY
+)
+JOBS_COMPLETED = Counter(
+    "edi_jobs_completed_total",
+    "Jobs run by this worker process's job pool, by final state",
+    ("state",),
+    registry=REGISTRY
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    items_processed INTEGER NOT NULL DEFAULT 0,
+    items_total INTEGER,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    expires_at REAL NOT NULL,
+    error TEXT,
+    payload BLOB,
+    result TEXT,
+    result_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (state, created_at);
+CREATE INDEX IF NOT EXISTS jobs_expiry ON jobs (expires_at);
+"""
+
+
+class Job(NamedTuple):
+    """
+    Status of a job, without its payload or result.
+
+    state is queued, running, succeeded or failed. items_total is known
+    once the job has started: the cargo items of a generate job, or the
+    LIN segments of a decode job. error is set when the job failed, with
+    the message and code the synchronous endpoint would have returned;
+    result_size, the length of the stored response body, when it succeeded.
+    """
+    id: str
+    type: str
+    state: str
+    items_processed: int
+    items_total: Optional[int]
+    created_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    expires_at: float
+    error: Optional[Dict[str, Any]]
+    result_size: Optional[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+JOB_COLUMNS = ", ".join(Job._fields)
+
+
+def job_from_row(row: Tuple[Any, ...]) -> Job:
+    job = Job(*row)
+    return job._replace(error=json.loads(job.error)) if job.error is not None else job
+
+
+class JobStore:
+    """
+    Job queue and result store in a SQLite file, shared by every worker
+    process on the host: a job accepted by one worker can be run by
+    another, and its status read from any of them.
+
+    Each call opens its own connection, so a store can be used from the
+    event loop, offload threads and job processes alike, and pickled: a
+    job process unpickles only the path and ttl, and connects itself.
+    Jobs are deleted ttl seconds after they finish, or after they were
+    started or accepted if they never finish. A job still running lease
+    seconds after it was claimed is presumed lost with the worker that
+    claimed it, and queued again for the next claim.
+    """
+
+    def __init__(self, path: str, ttl: float, lease: float = DEFAULT_JOB_LEASE):
+        self.path = path
+        self.ttl = ttl
+        self.lease = lease
+        with closing(self.connect()) as conn:
+            # Readers do not block the writer, and commits skip fsync
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def create(self, job_type: str, payload: bytes) -> Job:
+        """Queue a job of job_type for payload, the raw request body."""
+        now = time.time()
+        job = Job(
+            id=secrets.token_hex(16), type=job_type, state="queued", items_processed=0, items_total=None,
+            created_at=now, started_at=None, finished_at=None, expires_at=now + self.ttl, error=None, result_size=None
+        )
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, type, state, created_at, expires_at, payload) VALUES (?, ?, ?, ?, ?, ?)",
+                (job.id, job.type, job.state, job.created_at, job.expires_at, payload)
+            )
+        return job
+
+    def claim(self) -> Optional[str]:
+        """
+        Mark the oldest queued job running and return its id, or None when
+        none is queued. Jobs whose lease has run out are queued again first.
+        """
+        now = time.time()
+        with closing(self.connect()) as conn:
+            # Taken before reading, so two workers never claim the same job
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                requeued = conn.execute(
+                    "UPDATE jobs SET state = 'queued', started_at = NULL WHERE state = 'running' AND started_at <= ?",
+                    (now - self.lease,)
+                ).rowcount
+                row = conn.execute("SELECT id FROM jobs WHERE state = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE jobs SET state = 'running', started_at = ?, expires_at = ? WHERE id = ?",
+                        (now, now + self.ttl, row[0])
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if requeued:
+            log_edi("warning", "Queued %d jobs again after their lease ran out", requeued)
+        return row[0] if row is not None else None
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job's status, or None if it does not exist or has expired."""
+        with closing(self.connect()) as conn:
+            row = conn.execute(
+                f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ? AND expires_at > ?", (job_id, time.time())
+            ).fetchone()
+        return job_from_row(row) if row is not None else None
+
+    def result(self, job_id: str) -> Optional[str]:
+        """The JSON response body of a succeeded job."""
+        with closing(self.connect()) as conn:
+            row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def payload(self, job_id: str) -> Tuple[str, bytes]:
+        """The type and request body of a job."""
+        with closing(self.connect()) as conn:
+            return conn.execute("SELECT type, payload FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+    def report_progress(self, job_id: str, items_processed: int, items_total: Optional[int]):
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET items_processed = ?, items_total = ? WHERE id = ?",
+                (items_processed, items_total, job_id)
+            )
+
+    def finish(self, job_id: str, items_processed: int, result: Optional[str], error: Optional[Dict[str, Any]]):
+        """Store the outcome of a job: its response body, or the error it failed with. The payload is dropped."""
+        now = time.time()
+        with closing(self.connect()) as conn:
+            conn.execute(
+                "UPDATE jobs SET state = ?, items_processed = ?, finished_at = ?, expires_at = ?, error = ?,"
+                " result = ?, result_size = ?, payload = NULL WHERE id = ?",
+                (
+                    "failed" if error is not None else "succeeded", items_processed, now, now + self.ttl,
+                    json.dumps(error) if error is not None else None,
+                    result, len(result) if result is not None else None, job_id
+                )
+            )
+
+    def delete_expired(self) -> int:
+        with closing(self.connect()) as conn:
+            return conn.execute("DELETE FROM jobs WHERE expires_at <= ?", (time.time(),)).rowcount
+
+
+class JobProgress:
+    """Progress callback of a running job, writing to the store at most every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, store: JobStore, job_id: str):
+        self.store = store
+        self.job_id = job_id
+        self.items_processed = 0
+        self.items_total: Optional[int] = None
+        self._reported_at = time.monotonic()
+
+    def start(self, items_total: int):
+        self.items_total = items_total
+        self.store.report_progress(self.job_id, 0, items_total)
+
+    def __call__(self, items_processed: int):
+        self.items_processed = items_processed
+        now = time.monotonic()
+        if now - self._reported_at >= PROGRESS_INTERVAL:
+            self._reported_at = now
+            self.store.report_progress(self.job_id, items_processed, self.items_total)
+
+
+def run_decode_job(request: Dict[str, Any], progress: JobProgress) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Decode the message of a decode job into the /decode response body, or its error."""
+    data = request["edi"].encode("utf-8")
+    # Cargo values are letters and digits, so LIN+ only occurs at segment starts
+    progress.start(data.count(b"LIN+"))
+    try:
+        records = decode_edi_bytes(data, progress)
+    except ValueError as e:
+        return None, {"message": "EDI decoding failed", "code": "DECODE_ERROR", "error": str(e)}
+    progress.items_processed = len(records)
+    return dump_envelope({"status": "success", "cargo_items": cargo_items_json(records)}).decode("utf-8"), None
+
+
+def run_generate_job(request: Dict[str, Any], progress: JobProgress) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+    """Validate and render the booking of a generate job into the /generate response body, or its error."""
+    try:
+        form_data = EDIFormRequest.model_validate(request)
+    except ValidationError as e:
+        return None, validation_error_detail(e)
+
+    item_count = len(form_data.cargo_items)
+    progress.start(item_count)
+    chunks = []
+    for index, chunk in enumerate(iter_edi_message(form_data.cargo_items, GENERATE_CHUNK_ITEMS), start=1):
+        chunks.append(chunk)
+        progress(min(index * GENERATE_CHUNK_ITEMS, item_count))
+    return dump_envelope({"status": "success", "edi": "".join(chunks), "item_count": item_count}).decode("utf-8"), None
+
+
+def run_job(store: JobStore, job_id: str) -> str:
+    """Run a claimed job in a job process and store its outcome. Returns the job's final state."""
+    job_type, payload = store.payload(job_id)
+    log_edi("info", "Running %s job %s (%d bytes)", job_type, job_id, len(payload))
+    progress = JobProgress(store, job_id)
+    try:
+        request = json.loads(payload)
+        if job_type == "decode":
+            result, error = run_decode_job(request, progress)
+        else:
+            result, error = run_generate_job(request, progress)
+    except Exception as e:
+        log_edi("error", "Job %s failed: %s", job_id, e)
+        result, error = None, {"message": "Job failed", "code": "JOB_ERROR", "error": str(e)}
+    store.finish(job_id, progress.items_processed, result, error)
+    return "failed" if error is not None else "succeeded"
+
+
+def lower_priority(increment: int):
+    """Job process initializer: let the worker processes serving requests go first."""
+    with suppress(OSError):
+        os.nice(increment)
+
+
+class JobRunner:
+    """
+    Runs queued jobs of the store in this worker process's own job pool,
+    at most workers at a time, at a lower CPU priority than the request
+    handlers. Job processes are spawned rather than forked, so they
+    inherit neither this process's threads nor its open SQLite connections.
+
+    Any worker process may claim any queued job, so jobs accepted by a
+    worker that is restarted or busy are run by another, and so are jobs
+    whose worker died while running them, once their lease runs out. notify() starts
+    a job accepted by this worker at once; jobs from other workers are
+    found by polling every poll_interval seconds. Stopping waits for the
+    running jobs.
+    """
+
+    def __init__(self, store: JobStore, workers: int, nice: int, poll_interval: float):
+        self.store = store
+        self.workers = workers
+        self.nice = nice
+        self.poll_interval = poll_interval
+        self.running = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        cleaned_at = 0.0
+        while True:
+            self._wakeup.clear()
+            try:
+                # In threads: a write may wait for another process's transaction
+                if time.monotonic() - cleaned_at >= JOB_CLEANUP_INTERVAL:
+                    cleaned_at = time.monotonic()
+                    deleted = await asyncio.to_thread(self.store.delete_expired)
+                    if deleted:
+                        log_edi("info", "Deleted %d expired jobs", deleted)
+                while self.running < self.workers:
+                    job_id = await asyncio.to_thread(self.store.claim)
+                    if job_id is None:
+                        break
+                    self._submit(job_id)
+            except sqlite3.Error as e:
+                log_edi("error", "Job store unavailable: %s", e)
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+
+    def _submit(self, job_id: str):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                initializer=lower_priority, initargs=(self.nice,)
+            )
+        self.running += 1
+        task = asyncio.create_task(self._wait(job_id, self._pool.submit(run_job, self.store, job_id)))
+        task.add_done_callback(self._tasks.discard)
+        self._tasks.add(task)
+
+    async def _wait(self, job_id: str, future: Future):
+        try:
+            state = await asyncio.wrap_future(future)
+        except Exception as error:
+            # The job process died, or the store failed
+            log_edi("error", "Job %s failed: %r", job_id, error)
+            state = "failed"
+            if isinstance(error, BrokenProcessPool) and self._pool is not None:
+                self._pool.shutdown(wait=False)
+                self._pool = None
+            with suppress(sqlite3.Error):
+                await asyncio.to_thread(
+                    self.store.finish, job_id, 0, None, {"message": "Job failed", "code": "JOB_ERROR", "error": repr(error)}
+                )
+        finally:
+            self.running -= 1
+            self.notify()
+        JOBS_COMPLETED.inc(state)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            with suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+        if self._tasks:
+            log_edi("info", "Waiting for %d running jobs", len(self._tasks))
+            await asyncio.wait(set(self._tasks))
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+_job_store: Optional[JobStore] = None
+_job_runner: Optional[JobRunner] = None
+
+
+def get_job_store() -> JobStore:
+    """Return the job store at EDI_JOB_DB, keeping jobs EDI_JOB_TTL seconds and leasing them for EDI_JOB_LEASE."""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(
+            os.getenv("EDI_JOB_DB", DEFAULT_JOB_DB),
+            ttl=float(os.getenv("EDI_JOB_TTL", DEFAULT_JOB_TTL)),
+            lease=float(os.getenv("EDI_JOB_LEASE", DEFAULT_JOB_LEASE))
+        )
+    return _job_store
+
+
+def jobs_enabled() -> bool:
+    """Jobs are accepted and run unless EDI_JOB_WORKERS is 0."""
+    return int(os.getenv("EDI_JOB_WORKERS", DEFAULT_JOB_WORKERS)) > 0
+
+
+def get_job_runner() -> Optional[JobRunner]:
+    """
+    Return this worker process's job runner, configured from EDI_JOB_WORKERS,
+    EDI_JOB_NICE and EDI_JOB_POLL_INTERVAL, or None when jobs are disabled.
+    """
+    global _job_runner
+    if _job_runner is None and jobs_enabled():
+        _job_runner = JobRunner(
+            get_job_store(),
+            workers=int(os.getenv("EDI_JOB_WORKERS", DEFAULT_JOB_WORKERS)),
+            nice=int(os.getenv("EDI_JOB_NICE", DEFAULT_JOB_NICE)),
+            poll_interval=float(os.getenv("EDI_JOB_POLL_INTERVAL", DEFAULT_JOB_POLL_INTERVAL))
+        )
+    return _job_runner
+
+
+async def start_job_runner():
+    runner = get_job_runner()
+    if runner is not None:
+        runner.start()
+
+
+async def stop_job_runner():
+    """Stop running jobs in this worker, waiting for those already running."""
+    global _job_runner
+    if _job_runner is not None:
+        await _job_runner.stop()
+        _job_runner = None
+
+
+def _running_jobs():
+    if _job_runner is not None:
+        yield (), _job_runner.running
+
+
+CallbackMetric("edi_jobs_running", "Jobs running in this worker process's job pool", "gauge",
+               _running_jobs, registry=REGISTRY)
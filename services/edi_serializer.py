@@ -0,0 +1,69 @@
+import json
+from typing import Any, Iterable, Mapping
+from services.edi_decoder import DecodedCargoItem
+from funcs.utils.stage_timing import stage
+
+
+class RawJSON:
+    """Already encoded JSON, written into an envelope verbatim."""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+def json_string(value: str) -> str:
+    """JSON-encode a string, skipping json.dumps for the plain alphanumeric values EDI fields hold."""
+    if value.isascii() and value.isalnum():
+        return f'"{value}"'
+    return json.dumps(value, ensure_ascii=False)
+
+
+def dump_cargo_item(item: DecodedCargoItem) -> str:
+    """
+    Encode one decoded cargo item as a compact JSON object, omitting None fields.
+    Output matches the JSON FastAPI renders for the item's to_dict().
+    """
+    parts = [
+        '{"cargo_type":', json_string(item.cargo_type),
+        ',"package_count":', str(item.package_count),
+    ]
+    if item.container_number is not None:
+        parts += ',"container_number":', json_string(item.container_number)
+    if item.master_bill_number is not None:
+        parts += ',"master_bill_number":', json_string(item.master_bill_number)
+    if item.house_bill_number is not None:
+        parts += ',"house_bill_number":', json_string(item.house_bill_number)
+    parts.append("}")
+    return "".join(parts)
+
+
+@stage("serialize")
+def cargo_items_json(items: Iterable[DecodedCargoItem]) -> RawJSON:
+    """Encode decoded cargo items as a JSON array for use in an envelope."""
+    return RawJSON("[" + ",".join(map(dump_cargo_item, items)) + "]")
+
+
+def dump_cargo_items(items: Iterable[DecodedCargoItem]) -> bytes:
+    """Encode decoded cargo items as a UTF-8 JSON array."""
+    return cargo_items_json(items).text.encode("utf-8")
+
+
+def dump_json_value(value: Any) -> str:
+    """Encode one envelope value as compact JSON."""
+    if isinstance(value, RawJSON):
+        return value.text
+    if isinstance(value, str):
+        return json_string(value)
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+
+
+@stage("serialize")
+def dump_envelope(fields: Mapping[str, Any]) -> bytes:
+    """
+    Encode a response envelope to UTF-8 JSON bytes in one pass.
+    RawJSON values (such as cargo_items_json output) are inserted as they
+    are; anything else is encoded like Starlette's JSONResponse would.
+    """
+    body = ",".join(f"{json_string(key)}:{dump_json_value(value)}" for key, value in fields.items())
+    return ("{" + body + "}").encode("utf-8")
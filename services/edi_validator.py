@@ -1,6 +1,8 @@
 import re
-from typing import Tuple, List
-from funcs.utils.edi_logging import log_edi
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Pattern, Tuple
+from funcs.utils.edi_logging import log_edi, debug_enabled
+from funcs.utils.metrics import VALIDATION_FAILURES
+from funcs.utils.stage_timing import stage
 
 # Precompile regex patterns for better performance
 EMPTY_LINE_PATTERN = re.compile(r'\n\s*\n')
@@ -11,10 +13,423 @@ SPECIAL_CHARS_PATTERN = re.compile(r'[^a-zA-Z0-9]')
 CARGO_NAME_PATTERN = re.compile(r"^[A-Z][A-Za-z0-9\s\-]*$")
 # Valid cargo types
 VALID_CARGO_TYPES = ['FCX', 'LCL', 'FCL']
+# CargoItem field carried by each RFF qualifier
+RFF_QUALIFIERS = {
+    'AAQ': 'container_number',
+    'MB': 'master_bill_number',
+    'BH': 'house_bill_number',
+}
 # Add valid RFF types
-VALID_RFF_TYPES = ['RFF+AAQ:', 'RFF+MB:', 'RFF+BH:']
+VALID_RFF_TYPES = [f"RFF+{qualifier}:" for qualifier in RFF_QUALIFIERS]
+RFF_FIELDS = {f"RFF+{qualifier}:": field for qualifier, field in RFF_QUALIFIERS.items()}
 
-def validate_edi_message(edi: str) -> Tuple[bool, List[str]]:
+# Field reported for a line accepted after PCI+1' that carries no RFF qualifier
+UNQUALIFIED_SEGMENT = "segment"
+
+# Lookup tables and messages built once at import
+_CARGO_TYPES = frozenset(VALID_CARGO_TYPES)
+_CARGO_TYPE_CHOICES = ', '.join(VALID_CARGO_TYPES)
+_RFF_TYPE_CHOICES = ', '.join(VALID_RFF_TYPES)
+_RFF_PATTERN = re.compile(r"RFF\+([^:]*):")
+_REFERENCE_TAG = "PCI+1"
+# Characters of a message split into lines at a time while validating:
+# blocks start small, so early errors are found fast, and double up to the max
+VALIDATE_FIRST_BLOCK_SIZE = 1024
+VALIDATE_BLOCK_SIZE = 64 * 1024
+
+# Message template of each validation error code, formatted only when read
+ERROR_MESSAGES = {
+    "EMPTY_LINES": "Empty lines are not allowed between EDI segments",
+    "MISSING_TERMINATOR": "Line {line}: Each line must end with a single quote (')",
+    "INVALID_LIN": "Line {line}: Invalid line format. Expected Line Identifier (LIN+{value}+I'). ",
+    "EXPECTED_CARGO_TYPE": "Line {line}: Expected PAC+++<cargo_type>:67:95'",
+    "INVALID_CARGO_TYPE": "Line {line}: Invalid cargo type '{value}'. Must be one of: " + _CARGO_TYPE_CHOICES,
+    "EXPECTED_PACKAGE_COUNT": "Line {line}: Expected PAC+<number>+1'",
+    "INVALID_PACKAGE_COUNT": "Line {line}:The number of packages in PAC+ must be a whole number (no letters or symbols)",
+    "PACKAGE_COUNT_TOO_SMALL": "Line {line}: The number of packages in PAC+ must be at least 1",
+    "INVALID_RFF_QUALIFIER": "Line {line}: Invalid RFF format - must be one of: " + _RFF_TYPE_CHOICES + " (found '{value}:')",
+    "EMPTY_RFF_VALUE": "Line {line}: RFF value cannot be empty",
+    "INVALID_RFF_CHARACTERS": "Line {line}: RFF value contains invalid characters: {value}. Only letters and numbers are allowed.",
+    "EXPECTED_RFF": "Line {line}: Expected RFF+AAQ/MB/BH after PCI+1'",
+}
+
+
+class ValidationIssue(NamedTuple):
+    """
+    One validation error.
+
+    line is the segment number used in messages (None for EMPTY_LINES) and
+    offset the byte offset in the UTF-8 message where the problem was found.
+    Offsets are filled in by check_edi_message, only for reported errors.
+    The message is only formatted when read.
+    """
+    code: str
+    line: Optional[int]
+    offset: Optional[int]
+    value: Any = None
+
+    @property
+    def message(self) -> str:
+        return ERROR_MESSAGES[self.code].format(line=self.line, value=self.value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"code": self.code, "line": self.line, "offset": self.offset, "message": self.message}
+
+
+class ValidationResult(NamedTuple):
+    """
+    Outcome of check_edi_message.
+    truncated is True when checking stopped at max_errors, so the message
+    may hold more errors than reported.
+    """
+    valid: bool
+    issues: List[ValidationIssue]
+    truncated: bool
+    line_count: int
+
+
+class SegmentRule(NamedTuple):
+    """
+    One required segment of a cargo item.
+
+    pattern is matched at the start of the line and check turns the match
+    into the (field, value) reported by EDIMessageValidator.feed, recording
+    an error instead when the segment is malformed. missing is the error
+    code reported when the message ends before this segment.
+    """
+    field: str
+    pattern: Pattern
+    check: Callable[["EDIMessageValidator", Optional[re.Match], str, int], Tuple[Optional[str], Any]]
+    missing: Optional[str]
+
+
+def _check_lin(validator: "EDIMessageValidator", match: Optional[re.Match], line: str, line_num: int):
+    if match is None or match.group(1) != validator.lin_index:
+        validator.add_error("INVALID_LIN", line_num, validator.cargo_index)
+        return None, None
+    if validator.debug:
+        log_edi("debug", "Validated LIN for cargo index %d", validator.cargo_index)
+    return "LIN", None
+
+
+def _check_cargo_type(validator: "EDIMessageValidator", match: Optional[re.Match], line: str, line_num: int):
+    if match is None:
+        validator.add_error("EXPECTED_CARGO_TYPE", line_num)
+        return None, None
+    cargo_type = match.group(1)
+    if cargo_type not in _CARGO_TYPES:
+        validator.add_error("INVALID_CARGO_TYPE", line_num, cargo_type)
+        return None, None
+    if validator.debug:
+        log_edi("debug", "Validated PAC+++ line with cargo type: %s", cargo_type)
+    return "cargo_type", cargo_type
+
+
+def _check_package_count(validator: "EDIMessageValidator", match: Optional[re.Match], line: str, line_num: int):
+    if match is None:
+        validator.add_error("EXPECTED_PACKAGE_COUNT", line_num)
+        return None, None
+    # Validate that PAC+ number is a positive integer without any symbols
+    digits = match.group(1)
+    if digits is None:
+        validator.add_error("INVALID_PACKAGE_COUNT", line_num, line)
+        return None, None
+    number = int(digits)
+    if number < 1:
+        validator.add_error("PACKAGE_COUNT_TOO_SMALL", line_num, number)
+        return None, None
+    if validator.debug:
+        log_edi("debug", "Validated PAC+ line: %s", line)
+    return "package_count", number
+
+
+# Declarative grammar of one cargo item: the required segments in order,
+# followed by any number of PCI+1' / RFF reference pairs. Each pattern folds
+# every check for its segment into one match.
+ITEM_SEGMENTS = (
+    SegmentRule("LIN", re.compile(r"LIN\+([0-9]+)\+I"), _check_lin, None),
+    SegmentRule("cargo_type", re.compile(r"PAC\+\+\+([^:]*)"), _check_cargo_type, "EXPECTED_CARGO_TYPE"),
+    # The lookahead is the segment shape check ("+1'" anywhere in the line),
+    # the optional group is PAC_PATTERN
+    SegmentRule("package_count", re.compile(r"(?=.*\+1')PAC\+(?:(\d+)\+1')?"), _check_package_count,
+                "EXPECTED_PACKAGE_COUNT"),
+)
+
+# Parser states for EDIMessageValidator: indexes into ITEM_SEGMENTS, then the
+# optional PCI+1' / RFF pair states
+_AFTER_REQUIRED = len(ITEM_SEGMENTS)
+_EXPECT_RFF = _AFTER_REQUIRED + 1
+
+
+class EDIMessageValidator:
+    """
+    Incremental validator for the LIN -> PAC+++ -> PAC -> (PCI, RFF)* grammar.
+
+    Lines are fed one at a time (already stripped, never empty) so the same
+    state machine can back both validate_edi_message and the decoder. Each
+    call to feed() reports the cargo field the line carries, which lets the
+    decoder build items in the same pass instead of re-parsing the message.
+    The grammar itself lives in ITEM_SEGMENTS and RFF_QUALIFIERS.
+
+    With max_errors set, errors past the cap are not recorded and full
+    turns True, so callers can stop feeding lines.
+    """
+
+    # Offset recorded for errors found at the end of the message
+    AT_END = -1
+
+    def __init__(self, max_errors: Optional[int] = None):
+        self.line_count = 0
+        self.cargo_index = 1
+        self.lin_index = "1"
+        self.has_empty_lines = False
+        self.is_valid = True
+        self.max_errors = max_errors
+        self.error_count = 0
+        self.full = max_errors is not None and max_errors <= 0
+        self.truncated = False
+        # Checked once per message instead of once per debug line
+        self.debug = debug_enabled()
+        self._state = 0
+        self._offset: Optional[int] = None
+        self._empty_lines: List[ValidationIssue] = []
+        self._quote_issues: List[ValidationIssue] = []
+        self._issues: List[ValidationIssue] = []
+
+    @property
+    def issues(self) -> List[ValidationIssue]:
+        """All errors in the order validate_edi_message has always reported them."""
+        return self._empty_lines + self._quote_issues + self._issues
+
+    @property
+    def errors(self) -> List[str]:
+        """Messages of all errors, in the same order as issues."""
+        return [issue.message for issue in self.issues]
+
+    def _record(self, issues: List[ValidationIssue], code: str, line_num: Optional[int], value: Any, offset: Optional[int]) -> bool:
+        self.is_valid = False
+        if self.full:
+            self.truncated = True
+            return False
+        issue = ValidationIssue(code, line_num, offset, value)
+        issues.append(issue)
+        self.error_count += 1
+        VALIDATION_FAILURES.inc("edi", code)
+        if self.error_count == self.max_errors:
+            self.full = True
+        if self.debug:
+            log_edi("debug", "Validation error %s", issue)
+        return True
+
+    def add_error(self, code: str, line_num: int, value: Any = None):
+        """Record a structural error."""
+        self._record(self._issues, code, line_num, value, self._offset)
+
+    def mark_empty_lines(self):
+        """Record that the raw message contains empty lines between segments."""
+        if not self.has_empty_lines:
+            self.has_empty_lines = True
+            self._record(self._empty_lines, "EMPTY_LINES", None, None, None)
+
+    def feed(self, line: str) -> Tuple[Optional[str], Any]:
+        """
+        Validate one segment line.
+
+        Returns:
+            Tuple of (field, value): field is "LIN" when a new cargo item starts,
+            a CargoItem field name when the line carries that value,
+            UNQUALIFIED_SEGMENT (with the line as value) for an accepted
+            non-RFF line following PCI+1', or None.
+        """
+        self.line_count += 1
+        line_num = self.line_count
+
+        if not line.endswith("'"):
+            self._record(self._quote_issues, "MISSING_TERMINATOR", line_num, None, None)
+
+        state = self._state
+        if state == _AFTER_REQUIRED:
+            if line.startswith(_REFERENCE_TAG):
+                if self.debug:
+                    log_edi("debug", "Found PCI at line %d", line_num)
+                self._state = _EXPECT_RFF
+                return None, None
+            # No more optional blocks: this line opens the next cargo item
+            self.cargo_index += 1
+            self.lin_index = str(self.cargo_index)
+            state = 0
+        elif state == _EXPECT_RFF:
+            self._state = _AFTER_REQUIRED
+            return self._check_reference(line, line_num)
+
+        rule = ITEM_SEGMENTS[state]
+        self._state = state + 1
+        return rule.check(self, rule.pattern.match(line), line, line_num)
+
+    def _check_reference(self, line: str, line_num: int) -> Tuple[Optional[str], Any]:
+        """Validate the line following a PCI+1' segment."""
+        field = None
+        if line.startswith("RFF+"):
+            match = _RFF_PATTERN.match(line)
+            field = RFF_QUALIFIERS.get(match.group(1)) if match else None
+            if field is None:
+                self.add_error("INVALID_RFF_QUALIFIER", line_num, line.split(':')[0])
+                return None, None
+            rff_content = line[match.end():]
+        else:
+            # Extract RFF content for validation
+            _, separator, rff_content = line.partition(":")
+            if not separator:
+                self.add_error("EXPECTED_RFF", line_num)
+                return None, None
+
+        if rff_content.endswith("'"):
+            rff_content = rff_content[:-1]
+
+        if not rff_content:
+            self.add_error("EMPTY_RFF_VALUE", line_num)
+            return None, None
+        if not rff_content.isalnum():
+            # Check for special characters and provide detailed error
+            unique_chars = sorted(set(char for char in rff_content if not char.isalnum()))
+            self.add_error("INVALID_RFF_CHARACTERS", line_num, ', '.join(unique_chars))
+            return None, None
+        if self.debug:
+            log_edi("debug", "Found valid RFF at line %d", line_num)
+        if field is None:
+            return UNQUALIFIED_SEGMENT, line
+        return field, rff_content
+
+    def finish(self) -> List[str]:
+        """Report segments still missing at the end of the message and return all errors."""
+        state = self._state
+        end = self.line_count
+        self._offset = self.AT_END
+        if 0 < state < _AFTER_REQUIRED:
+            # Every required segment not yet seen, on the lines that would have held them
+            for line_offset, rule in enumerate(ITEM_SEGMENTS[state:], start=1):
+                self.add_error(rule.missing, end + line_offset)
+        elif state == _EXPECT_RFF:
+            self.add_error("EXPECTED_RFF", end)
+        return self.errors
+
+
+def _scan_message(edi: str, max_errors: Optional[int]) -> EDIMessageValidator:
+    """
+    Run a message through EDIMessageValidator, stopping at max_errors.
+
+    The message is split in growing blocks cut after a newline, so a
+    message with early errors is never split or searched for empty lines
+    as a whole.
+    """
+    validator = EDIMessageValidator(max_errors=max_errors)
+    size = len(edi)
+    start = 0
+    block_size = min(VALIDATE_FIRST_BLOCK_SIZE, VALIDATE_BLOCK_SIZE)
+    while start < size:
+        end = start + block_size
+        block_size = min(block_size * 2, VALIDATE_BLOCK_SIZE)
+        if end >= size:
+            end = size
+        else:
+            cut = edi.rfind("\n", start, end)
+            if cut == -1:
+                cut = edi.find("\n", end)
+            end = size if cut == -1 else cut + 1
+
+        block = edi[start:end]
+        # The previous block's final newline can start an empty-line match
+        if not validator.has_empty_lines and EMPTY_LINE_PATTERN.search(block if start == 0 else "\n" + block):
+            validator.mark_empty_lines()
+        for raw_line in block.splitlines():
+            if validator.full:
+                # Anything left unchecked may hold more errors
+                validator.truncated = True
+                return validator
+            line = raw_line.strip()
+            if line:
+                validator.feed(line)
+        start = end
+
+    validator.finish()
+    return validator
+
+
+def _iter_line_offsets(edi: str) -> Iterator[int]:
+    """Character offset of each non-empty line, in validator line order."""
+    size = len(edi)
+    start = 0
+    while start < size:
+        end = edi.find("\n", start)
+        if end == -1:
+            end = size
+        position = start
+        for raw_line in edi[start:end].splitlines(keepends=True):
+            line = raw_line.strip()
+            if line:
+                yield position + raw_line.index(line[0])
+            position += len(raw_line)
+        start = end + 1
+
+
+def _resolve_offsets(edi: str, issues: List[ValidationIssue]) -> List[ValidationIssue]:
+    """Fill in the byte offsets of issues, scanning only as far as the last one."""
+    char_offsets = {}
+    wanted = {issue.line for issue in issues if issue.offset is None and issue.line is not None}
+    if wanted:
+        last = max(wanted)
+        for line_num, offset in enumerate(_iter_line_offsets(edi), start=1):
+            if line_num in wanted:
+                char_offsets[line_num] = offset
+            if line_num == last:
+                break
+
+    empty_line = None
+    if any(issue.code == "EMPTY_LINES" for issue in issues):
+        empty_line = EMPTY_LINE_PATTERN.search(edi).start() + 1
+
+    offsets = []
+    for issue in issues:
+        if issue.code == "EMPTY_LINES":
+            offsets.append(empty_line)
+        elif issue.offset == EDIMessageValidator.AT_END:
+            offsets.append(len(edi))
+        else:
+            offsets.append(char_offsets[issue.line])
+
+    if edi.isascii():
+        byte_offsets = {offset: offset for offset in offsets}
+    else:
+        # One forward pass, encoding each stretch between two offsets once
+        byte_offsets = {}
+        char_position = byte_position = 0
+        for offset in sorted(set(offsets)):
+            byte_position += len(edi[char_position:offset].encode("utf-8", "surrogatepass"))
+            char_position = offset
+            byte_offsets[offset] = byte_position
+
+    return [issue._replace(offset=byte_offsets[offset]) for issue, offset in zip(issues, offsets)]
+
+
+@stage("validate")
+def check_edi_message(edi: str, fail_fast: bool = False, max_errors: Optional[int] = None) -> ValidationResult:
+    """
+    Validate an EDI message, returning structured errors with byte offsets.
+
+    Same rules and errors as validate_edi_message. Checking stops once
+    max_errors errors are found (one with fail_fast), so malformed input
+    costs about as much as the errors reported.
+    """
+    log_edi("info", "Starting EDI message validation")
+
+    validator = _scan_message(edi, 1 if fail_fast else max_errors)
+    issues = _resolve_offsets(edi, validator.issues)
+
+    log_edi("info", "Finished validation. Valid: %s, Errors: %d", not issues, len(issues))
+    return ValidationResult(not issues, issues, validator.truncated, validator.line_count)
+
+
+def validate_edi_message(edi: str, fail_fast: bool = False, max_errors: Optional[int] = None) -> Tuple[bool, List[str]]:
     """
     Validates the structure of an EDI message according to the defined format rules.
 
@@ -34,122 +449,15 @@ def validate_edi_message(edi: str) -> Tuple[bool, List[str]]:
 
     Args:
         edi_message (str): The raw EDI message string to validate.
+        fail_fast (bool): Stop at the first error.
+        max_errors (int): Stop once this many errors have been found.
 
     Returns:
         bool: True if the message is valid, False otherwise.
     """
-    errors = []
-    
-    # Check for empty lines using a more strict regex pattern
-    if EMPTY_LINE_PATTERN.search(edi):
-        errors.append("Empty lines are not allowed between EDI segments")
-        log_edi("error", "Found empty lines in EDI message")
-    
-    # Process lines once and store them
-    lines = [line.strip() for line in edi.strip().splitlines() if line.strip()]
-    line_count = len(lines)
-
     log_edi("info", "Starting EDI message validation")
 
-    # Check if each line ends with a single quote
-    for i, line in enumerate(lines):
-        if not line.endswith("'"):
-            errors.append(f"Line {i+1}: Each line must end with a single quote (')")
-            log_edi("error", f"Line {i+1} does not end with a single quote: {line}")
-
-    i = 0
-    cargo_index = 1
-
-    while i < line_count:
-        line_num = i + 1  # Calculate line number once
-        
-        # Validate LIN
-        if not lines[i].startswith(f"LIN+{cargo_index}+I"):
-            errors.append(f"Line {line_num}: Invalid line format. Expected Line Identifier (LIN+{cargo_index}+I'). ")
-        else:
-            log_edi("debug", f"Validated LIN for cargo index {cargo_index}")
-        i += 1
+    errors = _scan_message(edi, 1 if fail_fast else max_errors).errors
 
-        # Validate PAC+++ line
-        if i >= line_count or not lines[i].startswith("PAC+++"):
-            errors.append(f"Line {i+1}: Expected PAC+++<cargo_type>:67:95'")
-        else:
-            # Extract and validate cargo type
-            cargo_type = lines[i].split("+++", 1)[1].split(":")[0]
-            if cargo_type not in VALID_CARGO_TYPES:
-                errors.append(f"Line {i+1}: Invalid cargo type '{cargo_type}'. Must be one of: {', '.join(VALID_CARGO_TYPES)}")
-                log_edi("error", f"Invalid cargo type: {cargo_type}")
-            else:
-                log_edi("debug", f"Validated PAC+++ line with cargo type: {cargo_type}")
-        i += 1
-
-        # Validate PAC+<number>+1'
-        if i >= line_count or not (lines[i].startswith("PAC+") and "+1'" in lines[i]):
-            errors.append(f"Line {i+1}: Expected PAC+<number>+1'")
-        else:
-            # Validate that PAC+ number is a positive integer without any symbols
-            pac_match = PAC_PATTERN.match(lines[i])
-            if pac_match:
-                number = int(pac_match.group(1))
-                if number < 1:
-                    errors.append(f"Line {i+1}: The number of packages in PAC+ must be at least 1")
-                else:
-                    log_edi("debug", f"Validated PAC+ line: {lines[i]}")
-            else:
-                # If regex doesn't match, format is incorrect
-                errors.append(f"Line {i+1}:The number of packages in PAC+ must be a whole number (no letters or symbols)")
-                log_edi("debug", f"Invalid PAC+ format: {lines[i]}")
-        i += 1
-
-        # Check for optional PCI/RFF blocks
-        optional_count = 0
-        while i < line_count and lines[i].startswith("PCI+1"):
-            log_edi("debug", f"Found PCI at line {i+1}")
-            i += 1
-            if i >= line_count:
-                errors.append(f"Line {i}: Expected RFF+AAQ/MB/BH after PCI+1'")
-                break
-                
-            line = lines[i]
-            line_num = i + 1
-            
-            # Validate RFF format first
-            if line.startswith("RFF+"):
-                # Check if the RFF prefix matches any valid type
-                valid_prefix = False
-                for valid_type in VALID_RFF_TYPES:
-                    if line.startswith(valid_type):
-                        valid_prefix = True
-                        break
-                
-                if not valid_prefix:
-                    errors.append(f"Line {line_num}: Invalid RFF format - must be one of: {', '.join(VALID_RFF_TYPES)} (found '{line.split(':')[0]}:')")
-                    i += 1
-                    continue
-
-            # Extract RFF content for validation
-            rff_content = line.split(":", 1)[1]
-            if rff_content.endswith("'"):
-                rff_content = rff_content[:-1]
-            
-            if not rff_content:
-                errors.append(f"Line {line_num}: RFF value cannot be empty")
-            else:
-                # Check for special characters and provide detailed error
-                special_chars = set(char for char in rff_content if not char.isalnum())
-                if special_chars:
-                    unique_chars = sorted(special_chars)
-                    errors.append(f"Line {line_num}: RFF value contains invalid characters: {', '.join(unique_chars)}. Only letters and numbers are allowed.")
-                    log_edi("error", f"Found invalid characters in RFF value: {unique_chars}")
-                else:
-                    log_edi("debug", f"Found valid RFF at line {line_num}")
-            i += 1
-            optional_count += 1
-
-        if optional_count == 0:
-            log_edi("debug", f"No optional fields for cargo index {cargo_index}")
-
-        cargo_index += 1
-
-    log_edi("info", f"Finished validation. Valid: {len(errors) == 0}, Errors: {len(errors)}")
+    log_edi("info", "Finished validation. Valid: %s, Errors: %d", len(errors) == 0, len(errors))
     return len(errors) == 0, errors
@@ -1,18 +1,124 @@
-from pydantic import BaseModel, Field, field_validator, model_validator
-from typing import List
-from services.edi_generator import CargoItem
+import re
+from pydantic import BaseModel, Field, StringConstraints, ValidationError, model_validator
+from pydantic_core import core_schema
+from typing import Annotated, Any, Dict, List, NamedTuple, Optional
+from typing_extensions import Required, TypedDict
+from services.edi_generator import CargoItem, CargoTypes
 from funcs.utils.edi_logging import log_edi
+from funcs.utils.metrics import VALIDATION_FAILURES
+
+# Values are stripped before the pattern is checked and upper-cased after,
+# so cargo types are matched case-insensitively against CargoTypes
+CARGO_TYPE_PATTERN = r"^\s*(?i:" + "|".join(re.escape(cargo_type.value) for cargo_type in CargoTypes) + r")\s*$"
+# Letters and numbers are what str.isalnum() accepts; blank is allowed
+REFERENCE_PATTERN = r"^\s*[\p{L}\p{N}]*\s*$"
+
+CargoTypeField = Annotated[str, StringConstraints(strip_whitespace=True, to_upper=True, pattern=CARGO_TYPE_PATTERN)]
+PackageCountField = Annotated[int, Field(gt=0)]
+ReferenceField = Annotated[str, StringConstraints(strip_whitespace=True, pattern=REFERENCE_PATTERN)]
+
+
+class FormRule(NamedTuple):
+    """A business rule of the booking form: metrics code and legacy error message."""
+    code: str
+    message: str
+
+
+# Business rules by the (field, pydantic error type) they fail with
+FORM_RULES = {
+    ("cargo_type", "string_pattern_mismatch"): FormRule("INVALID_CARGO_TYPE", "Cargo type must be either LCL or FCL"),
+    ("package_count", "greater_than"): FormRule("PACKAGE_COUNT_TOO_SMALL", "Package count must be greater than 0"),
+    ("container_number", "string_pattern_mismatch"): FormRule("INVALID_CONTAINER_NUMBER", "Invalid container number format"),
+    ("master_bill_number", "string_pattern_mismatch"): FormRule("INVALID_MASTER_BILL_NUMBER", "Invalid master bill number format"),
+    ("house_bill_number", "string_pattern_mismatch"): FormRule("INVALID_HOUSE_BILL_NUMBER", "Invalid house bill number format"),
+}
+
+
+class CargoItemRules(TypedDict, total=False):
+    """
+    Business rules for a cargo item, checked by pydantic-core before the
+    CargoItem is built.
+    """
+    cargo_type: Required[CargoTypeField]
+    package_count: Required[PackageCountField]
+    container_number: Optional[ReferenceField]
+    master_bill_number: Optional[ReferenceField]
+    house_bill_number: Optional[ReferenceField]
+
+
+def failed_rule(error: Dict[str, Any]) -> Optional[FormRule]:
+    """The business rule a pydantic error reports, if any."""
+    loc = error["loc"]
+    return FORM_RULES.get((loc[-1], error["type"])) if loc else None
+
+
+def failure_code(error: Dict[str, Any]) -> str:
+    """Metrics label of a form validation error."""
+    rule = failed_rule(error)
+    if rule is not None:
+        return rule.code
+    if not error["loc"] and error["type"] == "value_error":
+        # The only model-level check: validate_items_not_empty
+        return "EMPTY_CARGO_ITEMS"
+    return error["type"].upper()
+
+
+def model_fields_of(value: Any) -> Any:
+    """Let rules read a model instance as the dict of its fields."""
+    return value.__dict__ if isinstance(value, BaseModel) else value
+
+
+class CheckedBy:
+    """
+    Annotated marker that validates input against rules first and feeds
+    the normalized result to the annotated type, as one compiled chain.
+    """
+
+    def __init__(self, rules: Any):
+        self.rules = rules
+
+    def __get_pydantic_core_schema__(self, source: Any, handler) -> core_schema.CoreSchema:
+        rules_schema = core_schema.no_info_before_validator_function(model_fields_of, handler.generate_schema(self.rules))
+        return core_schema.chain_schema([rules_schema, handler(source)])
+
 
 class EDIFormRequest(BaseModel):
     """
     EDI form request validator.
     Validates a list of cargo items ensuring they meet all business rules.
     """
-    cargo_items: List[CargoItem] = Field(
-        ..., 
+    cargo_items: List[Annotated[CargoItem, CheckedBy(CargoItemRules)]] = Field(
+        ...,
         description="List of cargo items. At least one item is required."
     )
 
+    @model_validator(mode='wrap')
+    @classmethod
+    def report_rule_errors(cls, data: Any, handler) -> 'EDIFormRequest':
+        """Report failed business rules with their legacy messages."""
+        try:
+            return handler(data)
+        except ValidationError as e:
+            errors = e.errors()
+            for error in errors:
+                VALIDATION_FAILURES.inc("form", failure_code(error))
+            if not any(failed_rule(error) for error in errors):
+                raise
+            line_errors = []
+            for error in errors:
+                rule = failed_rule(error)
+                if rule is None:
+                    line_errors.append(error)
+                    continue
+                log_edi("error", rule.message)
+                line_errors.append({
+                    "type": "value_error",
+                    "loc": error["loc"],
+                    "input": error["input"],
+                    "ctx": {"error": ValueError(rule.message)}
+                })
+            raise ValidationError.from_exception_data(e.title, line_errors)
+
     @model_validator(mode='after')
     def validate_items_not_empty(self) -> 'EDIFormRequest':
         """Validate that cargo_items is not empty."""
@@ -20,75 +126,5 @@ class EDIFormRequest(BaseModel):
             error_msg = "ensure this value has at least 1 items"
             log_edi("error", error_msg)
             raise ValueError(error_msg)
-        return self
-
-    @field_validator('cargo_items')
-    @classmethod
-    def validate_cargo_items(cls, items: List[CargoItem]) -> List[CargoItem]:
-        """
-        Validate all cargo items in the list.
-        First validates required fields existence, then validates their values.
-        """
-        for item in items:
-            # 1. Validate required fields existence
-            if not hasattr(item, 'cargo_type') or item.cargo_type is None:
-                error_msg = "cargo_type field required"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-            
-            if not hasattr(item, 'package_count') or item.package_count is None:
-                error_msg = "package_count field required"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-
-            # 2. Validate cargo_type
-            if not isinstance(item.cargo_type, str):
-                error_msg = "Cargo type must be a string"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-
-            cargo_type = item.cargo_type.strip().upper()
-            if cargo_type not in ['LCL', 'FCL', 'FCX']:
-                error_msg = "Cargo type must be either LCL or FCL"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-            item.cargo_type = cargo_type
-
-            # 3. Validate package_count
-            try:
-                package_count = int(item.package_count)
-            except (TypeError, ValueError):
-                error_msg = "Package count must be a valid integer"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-
-            if package_count <= 0:
-                error_msg = "Package count must be greater than 0"
-                log_edi("error", error_msg)
-                raise ValueError(error_msg)
-            item.package_count = package_count
-
-            # 4. Validate optional fields
-            if item.container_number is not None and item.container_number.strip() != "":
-                if not isinstance(item.container_number, str) or not item.container_number.strip().isalnum():
-                    error_msg = "Invalid container number format"
-                    log_edi("error", error_msg)
-                    raise ValueError(error_msg)
-                item.container_number = item.container_number.strip()
-
-            if item.master_bill_number is not None and item.master_bill_number.strip() != "":
-                if not isinstance(item.master_bill_number, str) or not item.master_bill_number.strip().isalnum():
-                    error_msg = "Invalid master bill number format"
-                    log_edi("error", error_msg)
-                    raise ValueError(error_msg)
-                item.master_bill_number = item.master_bill_number.strip()
-
-            if item.house_bill_number is not None and item.house_bill_number.strip() != "":
-                if not isinstance(item.house_bill_number, str) or not item.house_bill_number.strip().isalnum():
-                    error_msg = "Invalid house bill number format"
-                    log_edi("error", error_msg)
-                    raise ValueError(error_msg)
-                item.house_bill_number = item.house_bill_number.strip()
-
         log_edi("info", "Form validation passed successfully")
-        return items 
\ No newline at end of file
+        return self
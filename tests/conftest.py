@@ -41,4 +41,28 @@ def valid_edi_with_multiple_quotes():
 PAC+++LCL:67:95'
 PAC+10+1'
 PCI+1'
-RFF+BH:GHI789''""" 
\ No newline at end of file
+RFF+BH:GHI789''""" 
+
+async def call(app, method, path, headers=None, body=b""):
+    """Send one request through an ASGI app and return status, headers and body."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    response = {"headers": {}, "body": b""}
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = {key.decode(): value.decode() for key, value in message["headers"]}
+        else:
+            response["body"] += message.get("body", b"")
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "server": ("test", 80),
+        "headers": [(key.lower().encode(), value.encode()) for key, value in (headers or {}).items()]
+    }
+    await app(scope, receive, send)
+    return response
@@ -0,0 +1,96 @@
+import asyncio
+from fastapi import FastAPI, Request
+from api.admission import AdmissionMiddleware, BodySizeLimitMiddleware
+from api.v1.health import router as health_router
+from api.warmup import get_warmup
+from funcs.utils.admission import AdmissionLimiter, request_weight
+from tests.conftest import call
+
+def test_request_weight_grows_with_body_size():
+    """Test requests cost one unit plus one per unit of body bytes."""
+    assert request_weight(None, 1024) == 1
+    assert request_weight("not a number", 1024) == 1
+    assert request_weight("1023", 1024) == 1
+    assert request_weight("4096", 1024) == 5
+
+def test_limiter_admits_in_arrival_order():
+    """Test waiters are admitted first come first served as capacity frees up."""
+    limiter = AdmissionLimiter(capacity=4, max_queue=10, timeout=1.0)
+    admitted = []
+
+    async def request(name, weight):
+        assert await limiter.acquire(weight) is None
+        admitted.append(name)
+
+    async def scenario():
+        assert await limiter.acquire(4) is None
+        assert limiter.saturated
+        waiting = [asyncio.create_task(request("large", 3)), asyncio.create_task(request("small", 1))]
+        await asyncio.sleep(0)
+        assert limiter.queued == 2
+        limiter.release(4)
+        await asyncio.gather(*waiting)
+
+    asyncio.run(scenario())
+    assert admitted == ["large", "small"]
+    assert limiter.in_use == 4
+
+def test_limiter_sheds_on_timeout_and_full_queue():
+    """Test requests are shed once the queue is full or their deadline passes."""
+    limiter = AdmissionLimiter(capacity=2, max_queue=1, timeout=0.01)
+
+    async def scenario():
+        assert await limiter.acquire(10) is None  # Heavier than capacity: admitted alone
+        waiting = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0)
+        assert await limiter.acquire(1) == "queue_full"
+        assert await waiting == "timeout"
+        assert limiter.queued == 0
+        limiter.release(10)
+
+    asyncio.run(scenario())
+    assert limiter.in_use == 0
+    assert not limiter.saturated
+
+def test_saturated_worker_sheds_and_reports_not_ready(monkeypatch):
+    """Test EDI requests get 503 with Retry-After while readiness fails and liveness holds."""
+    limiter = AdmissionLimiter(capacity=1, max_queue=0, timeout=1.0)
+    monkeypatch.setattr("funcs.utils.admission._admission_limiter", limiter)
+    monkeypatch.setattr(get_warmup(), "status", "done")
+    app = FastAPI()
+
+    @app.post("/v1/edi/decode")
+    async def decode():
+        return {"status": "success"}
+
+    app.include_router(health_router)
+    app.add_middleware(AdmissionMiddleware)
+
+    assert asyncio.run(call(app, "POST", "/v1/edi/decode"))["status"] == 200
+    assert asyncio.run(call(app, "GET", "/api/v1/health/ready"))["status"] == 200
+
+    limiter.in_use = 1
+    shed = asyncio.run(call(app, "POST", "/v1/edi/decode"))
+    assert shed["status"] == 503
+    assert shed["headers"]["retry-after"] == "1"
+    assert b'"code":"SERVER_BUSY"' in shed["body"]
+    assert asyncio.run(call(app, "GET", "/api/v1/health/ready"))["status"] == 503
+    assert asyncio.run(call(app, "GET", "/api/v1/health/live"))["status"] == 200
+
+def test_oversized_bodies_are_rejected(monkeypatch):
+    """Test bodies over EDI_MAX_BODY_BYTES get 413, declared or not."""
+    monkeypatch.setenv("EDI_MAX_BODY_BYTES", "16")
+    app = FastAPI()
+
+    @app.post("/v1/edi/decode/raw")
+    async def decode_raw(request: Request):
+        return {"size": len(await request.body())}
+
+    app.add_middleware(BodySizeLimitMiddleware)
+
+    assert asyncio.run(call(app, "POST", "/v1/edi/decode/raw", body=b"x" * 16))["status"] == 200
+    response = asyncio.run(call(app, "POST", "/v1/edi/decode/raw", body=b"x" * 17))
+    assert response["status"] == 413
+    assert b'"code":"PAYLOAD_TOO_LARGE"' in response["body"]
+    declared = asyncio.run(call(app, "POST", "/v1/edi/decode/raw", {"Content-Length": "17"}, b"x"))
+    assert declared["status"] == 413
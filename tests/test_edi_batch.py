@@ -0,0 +1,129 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from api.v1.edi.router import router as edi_router
+from services.edi_batch import decode_edi_batch, generate_edi_batch
+from funcs.utils.process_pool import shutdown_process_pool
+from tests.conftest import call
+
+VALID_EDI = """LIN+1+I'
+PAC+++LCL:67:95'
+PAC+10+1'
+PCI+1'
+RFF+AAQ:ABC1234567'"""
+
+def test_decode_batch_valid_messages():
+    """Test decoding a batch of valid EDI messages."""
+    results = decode_edi_batch([VALID_EDI, VALID_EDI])
+    assert len(results) == 2
+    for result in results:
+        assert result["status"] == "success"
+        assert result["cargo_items"] == [
+            {"cargo_type": "LCL", "package_count": 10, "container_number": "ABC1234567"}
+        ]
+
+def test_decode_batch_isolates_errors():
+    """Test a failing message does not affect the rest of the batch."""
+    results = decode_edi_batch(["Invalid EDI", VALID_EDI])
+    assert results[0]["status"] == "error"
+    assert results[0]["code"] == "DECODE_ERROR"
+    assert "Invalid EDI format" in results[0]["error"]
+    assert results[1]["status"] == "success"
+
+def test_decode_batch_empty_message():
+    """Test an empty message in a batch is reported as EMPTY_EDI."""
+    results = decode_edi_batch(["  "])
+    assert results == [{
+        "status": "error",
+        "message": "EDI message is required",
+        "code": "EMPTY_EDI"
+    }]
+
+def test_generate_batch_valid_bookings():
+    """Test generating EDI for a batch of valid bookings."""
+    results = generate_edi_batch([
+        {"cargo_items": [{"cargo_type": "lcl", "package_count": 10, "container_number": "ABC123"}]},
+        {"cargo_items": [{"cargo_type": "FCL", "package_count": 2}]}
+    ])
+    assert results[0] == {
+        "status": "success",
+        "edi": "LIN+1+I'\nPAC+++LCL:67:95'\nPAC+10+1'\nPCI+1'\nRFF+AAQ:ABC123'",
+        "item_count": 1
+    }
+    assert results[1]["status"] == "success"
+    assert results[1]["edi"] == "LIN+1+I'\nPAC+++FCL:67:95'\nPAC+2+1'"
+
+def test_generate_batch_isolates_invalid_bookings():
+    """Test an invalid booking gets a structured error without failing the batch."""
+    results = generate_edi_batch([
+        {"cargo_items": [{"cargo_type": "LCL", "package_count": 0}]},
+        {"cargo_items": []},
+        {"cargo_items": [{"cargo_type": "LCL", "package_count": 1}]}
+    ])
+    assert results[0]["status"] == "error"
+    assert results[0]["code"] == "VALIDATION_ERROR"
+    assert "Package count must be greater than 0" in results[0]["message"]
+    assert results[0]["errors"][0]["loc"] == ["cargo_items", 0, "package_count"]
+    assert results[1]["status"] == "error"
+    assert "ensure this value has at least 1 items" in results[1]["message"]
+    assert results[2]["status"] == "success"
+
+@pytest.fixture
+def batch_app(monkeypatch):
+    """An app serving the EDI router, with a one-worker process pool."""
+    monkeypatch.setenv("EDI_PROCESS_POOL_WORKERS", "1")
+    app = FastAPI()
+    app.include_router(edi_router)
+    yield app
+    shutdown_process_pool()
+
+def post_json(app, path, request):
+    response = asyncio.run(call(app, "POST", path, {"Content-Type": "application/json"}, json.dumps(request).encode()))
+    return response["status"], json.loads(response["body"])
+
+def test_decode_batch_endpoint(batch_app):
+    """Test /decode/batch returns one result or error envelope per message, in order."""
+    status, body = post_json(batch_app, "/v1/edi/decode/batch", {"messages": [VALID_EDI, "Invalid EDI", " "]})
+    assert status == 200
+    assert body["status"] == "success"
+    assert body["message_count"] == 3
+    assert body["error_count"] == 2
+    assert body["results"][0] == {
+        "status": "success",
+        "cargo_items": [{"cargo_type": "LCL", "package_count": 10, "container_number": "ABC1234567"}]
+    }
+    assert body["results"][1]["status"] == "error"
+    assert body["results"][1]["code"] == "DECODE_ERROR"
+    assert body["results"][2] == {"status": "error", "message": "EDI message is required", "code": "EMPTY_EDI"}
+
+def test_decode_batch_endpoint_requires_messages(batch_app):
+    """Test /decode/batch rejects an empty batch with 422."""
+    status, body = post_json(batch_app, "/v1/edi/decode/batch", {"messages": []})
+    assert status == 422
+    assert body["detail"][0]["loc"] == ["body", "messages"]
+
+def test_generate_batch_endpoint(batch_app):
+    """Test /generate/batch isolates invalid bookings in their own error envelopes, in order."""
+    status, body = post_json(batch_app, "/v1/edi/generate/batch", {"bookings": [
+        {"cargo_items": [{"cargo_type": "FCL", "package_count": 2}]},
+        {"cargo_items": [{"cargo_type": "LCL", "package_count": 0}]},
+        {"cargo_items": "not a list"}
+    ]})
+    assert status == 200
+    assert body["status"] == "success"
+    assert body["booking_count"] == 3
+    assert body["error_count"] == 2
+    assert body["results"][0] == {"status": "success", "edi": "LIN+1+I'\nPAC+++FCL:67:95'\nPAC+2+1'", "item_count": 1}
+    for result in body["results"][1:]:
+        assert result["status"] == "error"
+        assert result["code"] == "VALIDATION_ERROR"
+        assert result["errors"][0]["loc"][0] == "cargo_items"
+    assert body["results"][1]["errors"][0]["loc"] == ["cargo_items", 0, "package_count"]
+
+def test_generate_batch_endpoint_requires_bookings(batch_app):
+    """Test /generate/batch rejects an empty batch and bookings that are not objects with 422."""
+    for bookings in ([], [[1]]):
+        status, body = post_json(batch_app, "/v1/edi/generate/batch", {"bookings": bookings})
+        assert status == 422
+        assert body["detail"][0]["loc"][:2] == ["body", "bookings"]
@@ -0,0 +1,232 @@
+import asyncio
+import json
+import pytest
+from fastapi import FastAPI
+from api.v1.edi.router import router as edi_router
+from services.edi_cache import (
+    ENTRY_OVERHEAD,
+    CacheEntry,
+    DecodeCache,
+    GenerateCache,
+    IdempotencyKeyMismatch,
+    InMemoryLRUBackend,
+    get_decode_cache,
+    make_cache_key,
+    make_payload_fingerprint
+)
+from funcs.utils.offload import OFFLOAD_CALLS, OffloadExecutor
+from tests.conftest import call
+
+VALID_EDI = """LIN+1+I'
+PAC+++LCL:67:95'
+PAC+10+1'
+PCI+1'
+RFF+AAQ:ABC1234567'"""
+
+def make_cache(max_entries=16, max_bytes=1024 * 1024, ttl=60.0):
+    return DecodeCache(InMemoryLRUBackend(max_entries, max_bytes), ttl)
+
+def test_cache_hit_returns_same_items():
+    """Test a resent message is served from the cache."""
+    cache = make_cache()
+    first = cache.decode(VALID_EDI)
+    second = cache.decode(VALID_EDI)
+    assert first == second
+    item_count, items_json = second
+    assert item_count == 1
+    assert json.loads(items_json.text)[0]["container_number"] == "ABC1234567"
+    stats = cache.stats()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+
+def test_cache_key_folds_crlf():
+    """Test CRLF and LF versions of a message share a cache key."""
+    assert make_cache_key(VALID_EDI) == make_cache_key(VALID_EDI.replace("\n", "\r\n"))
+    assert make_cache_key(VALID_EDI) != make_cache_key(VALID_EDI + "\n")
+
+def test_cache_stores_validation_errors():
+    """Test invalid messages are cached and raise the same error again."""
+    cache = make_cache()
+    with pytest.raises(ValueError) as first:
+        cache.decode("Invalid EDI")
+    with pytest.raises(ValueError) as second:
+        cache.decode("Invalid EDI")
+    assert str(first.value) == str(second.value)
+    assert "Invalid EDI format" in str(second.value)
+    assert cache.stats()["negative_hits"] == 1
+
+def test_cache_does_not_store_empty_messages():
+    """Test empty messages bypass the cache."""
+    cache = make_cache()
+    with pytest.raises(ValueError, match="EDI message cannot be empty"):
+        cache.decode("  ")
+    assert cache.stats()["entries"] == 0
+
+def test_cache_evicts_least_recently_used():
+    """Test the entry limit evicts the least recently used message."""
+    cache = make_cache(max_entries=2)
+    other = VALID_EDI.replace("ABC1234567", "XYZ1")
+    third = VALID_EDI.replace("ABC1234567", "XYZ2")
+    cache.decode(VALID_EDI)
+    cache.decode(other)
+    cache.decode(VALID_EDI)
+    cache.decode(third)
+    stats = cache.stats()
+    assert stats["entries"] == 2
+    assert stats["evictions"] == 1
+    cache.decode(VALID_EDI)
+    assert cache.stats()["hits"] == 2
+
+def test_cache_byte_budget():
+    """Test entries are evicted to stay within the byte budget."""
+    backend = InMemoryLRUBackend(max_entries=10, max_bytes=100)
+    backend.set("a", CacheEntry((), None, 60, float("inf")))
+    backend.set("b", CacheEntry((), None, 60, float("inf")))
+    backend.set("c", CacheEntry((), None, 200, float("inf")))
+    stats = backend.stats()
+    assert stats["entries"] == 1
+    assert stats["bytes"] == 60
+    assert backend.get("b") is not None
+
+def test_cache_charges_items_json_size():
+    """Test entries are charged for the items JSON they hold rather than the message length."""
+    cache = make_cache()
+    _, items_json = cache.decode(VALID_EDI)
+    assert cache.stats()["bytes"] == ENTRY_OVERHEAD + len(items_json.text)
+
+def test_decode_endpoint_offloads_only_cache_misses(monkeypatch):
+    """Test /decode looks the cache up before offloading, and caches what the executor decoded."""
+    executor = OffloadExecutor("thread", threshold=0, workers=1, queue_size=0)
+    monkeypatch.setattr("funcs.utils.offload._offload_executor", executor)
+    monkeypatch.setattr("services.edi_cache._decode_cache", make_cache())
+    app = FastAPI()
+    app.include_router(edi_router)
+    body = json.dumps({"edi": VALID_EDI}).encode()
+    headers = {"Content-Type": "application/json"}
+
+    offloaded = OFFLOAD_CALLS.value("executor")
+    first = asyncio.run(call(app, "POST", "/v1/edi/decode", headers, body))
+    second = asyncio.run(call(app, "POST", "/v1/edi/decode", headers, body))
+    assert first["status"] == second["status"] == 200
+    assert first["body"] == second["body"]
+    assert OFFLOAD_CALLS.value("executor") == offloaded + 1
+    assert get_decode_cache().stats()["hits"] == 1
+    executor.shutdown()
+
+def test_no_decode_cache_in_pool_processes(monkeypatch):
+    """Test batch pool processes decode without a cache of their own."""
+    monkeypatch.setattr("services.edi_cache.in_pool_process", lambda: True)
+    assert get_decode_cache() is None
+
+def test_cache_entries_expire():
+    """Test entries older than the TTL are decoded again."""
+    cache = make_cache(ttl=0)
+    cache.decode(VALID_EDI)
+    cache.decode(VALID_EDI)
+    stats = cache.stats()
+    assert stats["hits"] == 0
+    assert stats["expirations"] == 1
+
+def test_payload_fingerprint_is_canonical():
+    """Test key order and whitespace do not change the payload fingerprint."""
+    first = {"cargo_items": [{"cargo_type": "LCL", "package_count": 1}]}
+    second = {"cargo_items": [{"package_count": 1, "cargo_type": "LCL"}]}
+    assert make_payload_fingerprint(first) == make_payload_fingerprint(second)
+    assert make_payload_fingerprint(first) != make_payload_fingerprint({"cargo_items": []})
+
+def test_generate_cache_returns_stored_body():
+    """Test a repeated payload gets the stored body and a strong ETag."""
+    cache = GenerateCache(InMemoryLRUBackend(16, 1024 * 1024), ttl=60)
+    assert cache.lookup("fp") == (None, False)
+    stored = cache.put("fp", b'{"status":"success"}')
+    entry, replayed = cache.lookup("fp")
+    assert entry.body == b'{"status":"success"}'
+    assert entry.etag == stored.etag
+    assert entry.etag.startswith('"') and not entry.etag.startswith('W/')
+    assert replayed is False
+
+def test_generate_cache_idempotency_key():
+    """Test an Idempotency-Key replays its response and rejects other payloads."""
+    cache = GenerateCache(InMemoryLRUBackend(16, 1024 * 1024), ttl=60)
+    cache.put("fp", b"body", idempotency_key="key")
+    entry, replayed = cache.lookup("fp", "key")
+    assert entry.body == b"body"
+    assert replayed is True
+    with pytest.raises(IdempotencyKeyMismatch):
+        cache.lookup("other", "key")
+    assert cache.stats()["idempotent_replays"] == 1
+
+def generate_app(monkeypatch):
+    monkeypatch.setattr("services.edi_cache._generate_cache", GenerateCache(InMemoryLRUBackend(16, 1024 * 1024), ttl=60))
+    app = FastAPI()
+    app.include_router(edi_router)
+    return app
+
+GENERATE_BODY = json.dumps({"cargo_items": [{"cargo_type": "LCL", "package_count": 1}]}).encode()
+
+def test_generate_endpoint_not_modified(monkeypatch):
+    """Test /generate answers 304 when If-None-Match carries its ETag."""
+    app = generate_app(monkeypatch)
+    headers = {"Content-Type": "application/json"}
+    first = asyncio.run(call(app, "POST", "/v1/edi/generate", headers, GENERATE_BODY))
+    assert first["status"] == 200
+    etag = first["headers"]["etag"]
+
+    second = asyncio.run(call(app, "POST", "/v1/edi/generate", {**headers, "If-None-Match": etag}, GENERATE_BODY))
+    assert second["status"] == 304
+    assert second["headers"]["etag"] == etag
+    assert second["body"] == b""
+
+    weak = asyncio.run(call(app, "POST", "/v1/edi/generate", {**headers, "If-None-Match": "W/" + etag}, GENERATE_BODY))
+    assert weak["status"] == 304
+    other = asyncio.run(call(app, "POST", "/v1/edi/generate", {**headers, "If-None-Match": '"other"'}, GENERATE_BODY))
+    assert other["status"] == 200
+    assert other["body"] == first["body"]
+
+def test_generate_endpoint_idempotency_replay(monkeypatch):
+    """Test a repeated Idempotency-Key replays the first response."""
+    app = generate_app(monkeypatch)
+    headers = {"Content-Type": "application/json", "Idempotency-Key": "booking-1"}
+    first = asyncio.run(call(app, "POST", "/v1/edi/generate", headers, GENERATE_BODY))
+    assert first["status"] == 200
+    assert "idempotent-replayed" not in first["headers"]
+
+    # Reformatted, but the same payload
+    reformatted = json.dumps(json.loads(GENERATE_BODY), indent=2).encode()
+    second = asyncio.run(call(app, "POST", "/v1/edi/generate", headers, reformatted))
+    assert second["status"] == 200
+    assert second["headers"]["idempotent-replayed"] == "true"
+    assert second["body"] == first["body"]
+
+def test_generate_endpoint_rejects_reused_idempotency_key(monkeypatch):
+    """Test an Idempotency-Key sent with a different payload is rejected with 422."""
+    app = generate_app(monkeypatch)
+    headers = {"Content-Type": "application/json", "Idempotency-Key": "booking-1"}
+    assert asyncio.run(call(app, "POST", "/v1/edi/generate", headers, GENERATE_BODY))["status"] == 200
+
+    other = json.dumps({"cargo_items": [{"cargo_type": "FCL", "package_count": 2}]}).encode()
+    response = asyncio.run(call(app, "POST", "/v1/edi/generate", headers, other))
+    assert response["status"] == 422
+    assert json.loads(response["body"])["detail"]["code"] == "IDEMPOTENCY_KEY_REUSED"
+
+def test_generate_endpoint_rejects_non_object_body(monkeypatch):
+    """Test a JSON body that is not an object fails validation as a model type error."""
+    app = generate_app(monkeypatch)
+    response = asyncio.run(call(app, "POST", "/v1/edi/generate", {"Content-Type": "application/json"}, b"[1]"))
+    assert response["status"] == 422
+    errors = json.loads(response["body"])["detail"]
+    assert [error["type"] for error in errors] == ["model_type"]
+    assert errors[0]["loc"] == ["body"]
+
+def test_generate_cache_stores_body_once_per_idempotency_key():
+    """Test an Idempotency-Key entry holds the payload fingerprint, not another copy of the body."""
+    cache = GenerateCache(InMemoryLRUBackend(16, 1024 * 1024), ttl=60)
+    body = b"x" * 10000
+    cache.put("fp", body, idempotency_key="key")
+    assert cache.stats()["bytes"] < len(body) + 2 * ENTRY_OVERHEAD
+    # Pinned on first use through a cached lookup too
+    cache.lookup("fp", "other-key")
+    entry, replayed = cache.lookup("fp", "other-key")
+    assert entry.body == body
+    assert replayed is True
+    assert cache.stats()["bytes"] < len(body) + 4 * ENTRY_OVERHEAD
@@ -1,5 +1,11 @@
+import asyncio
+import json
 import pytest
-from services.edi_decoder import decode_edi_to_items, CargoItem
+from fastapi import FastAPI
+from api.v1.edi.router import router as edi_router
+from services.edi_decoder import decode_edi_to_items, decode_edi_records, decode_edi_bytes, CargoItem, DecodedCargoItem, StreamingEDIDecoder
+from services.edi_validator import validate_edi_message
+from tests.conftest import call
 
 def test_decode_valid_edi():
     """Test decoding a valid EDI message."""
@@ -175,4 +181,165 @@ RFF+AAQX:ABC123'"""  # Modified RFF type 'AAQX'
 
     with pytest.raises(ValueError) as exc_info:
         decode_edi_to_items(edi)
-    assert "Invalid RFF format - must be one of: RFF+AAQ:, RFF+MB:, RFF+BH:" in str(exc_info.value) 
\ No newline at end of file
+    assert "Invalid RFF format - must be one of: RFF+AAQ:, RFF+MB:, RFF+BH:" in str(exc_info.value) 
+
+def test_decode_errors_match_validator():
+    """Test decoding reports exactly the validator's error list."""
+    edi = """LIN+1+I'
+PAC+++BAD:67:95'
+PAC+0+1'
+PCI+1'
+RFF+AAQ:AB#C'
+LIN+3+I'
+PAC+++LCL:67:95'"""
+
+    _, errors = validate_edi_message(edi)
+    with pytest.raises(ValueError) as exc_info:
+        decode_edi_to_items(edi)
+    assert str(exc_info.value) == f"Invalid EDI format: {errors}"
+
+def test_streaming_decoder_yields_items_per_block():
+    """Test streaming decoding releases each item once its LIN block closes."""
+    edi = """LIN+1+I'
+PAC+++LCL:67:95'
+PAC+10+1'
+PCI+1'
+RFF+AAQ:ABC1234567'
+LIN+2+I'
+PAC+++FCL:67:95'
+PAC+20+1'"""
+
+    decoder = StreamingEDIDecoder()
+    first = decoder.feed(edi[:60])
+    assert first == []
+    second = decoder.feed(edi[60:])
+    assert [item.container_number for item in second] == ["ABC1234567"]
+    last = decoder.close()
+    assert [item.package_count for item in last] == [20]
+    assert decoder.item_count == 2
+
+def test_streaming_decoder_matches_decode_errors():
+    """Test streaming decoding raises the same errors, including empty lines."""
+    edi = """LIN+1+I'
+PAC+++LCL:67:95'
+
+PAC+10+1'"""
+
+    decoder = StreamingEDIDecoder()
+    for start in range(0, len(edi), 3):
+        decoder.feed(edi[start:start + 3])
+    with pytest.raises(ValueError) as stream_exc:
+        decoder.close()
+    with pytest.raises(ValueError) as exc_info:
+        decode_edi_to_items(edi)
+    assert str(stream_exc.value) == str(exc_info.value)
+
+def test_streaming_decoder_closes_block_on_last_line():
+    """Test an unterminated final LIN still releases the block it closes."""
+    edi = "LIN+1+I'\nPAC+++FCX:67:95'\nPAC+41+1'\nPCI+1'\nRFF+MB:XY99'\nPCI+1'\nLIN+1+I:X'"
+
+    decoder = StreamingEDIDecoder()
+    items = []
+    for start in range(0, len(edi), 6):
+        items += decoder.feed(edi[start:start + 6])
+    items += decoder.close()
+    assert items == decode_edi_records(edi)
+    assert [item.master_bill_number for item in items] == ["XY99"]
+
+def test_streaming_decoder_limits_partial_line():
+    """Test a partial line growing past max_line is rejected instead of buffered."""
+    decoder = StreamingEDIDecoder(max_line=10)
+    assert decoder.feed("LIN+1") == []
+    assert decoder.feed("+I'\nPAC") == []
+    with pytest.raises(ValueError) as exc_info:
+        decoder.feed("+++LCL:67:95'")
+    assert "longer than 10 characters" in str(exc_info.value)
+
+def test_streaming_decoder_empty():
+    """Test streaming decoding of an empty body."""
+    decoder = StreamingEDIDecoder()
+    decoder.feed("  \n ")
+    with pytest.raises(ValueError) as exc_info:
+        decoder.close()
+    assert "cannot be empty" in str(exc_info.value)
+
+def test_decode_records_are_compact_items():
+    """Test the decoder's compact records convert to the public CargoItem."""
+    edi = """LIN+1+I'
+PAC+++FCL:67:95'
+PAC+10+1'
+PCI+1'
+RFF+MB:DEF12345678'"""
+
+    records = decode_edi_records(edi)
+    assert records == [DecodedCargoItem("FCL", 10, master_bill_number="DEF12345678")]
+    assert records[0].to_dict() == {
+        "cargo_type": "FCL",
+        "package_count": 10,
+        "master_bill_number": "DEF12345678"
+    }
+    assert records[0].to_cargo_item() == decode_edi_to_items(edi)[0]
+
+def test_decode_bytes_matches_text_decode():
+    """Test the raw-bytes decoder returns the same items as the text decoder."""
+    edi = "LIN+1+I'\r\nPAC+++FCL:67:95'\r\nPAC+10+1'\r\nPCI+1'\r\nRFF+BH:GHI789'\nLIN+2+I'\nPAC+++LCL:67:95'\nPAC+2+1'\n"
+    assert decode_edi_bytes(edi.encode()) == decode_edi_records(edi)
+
+@pytest.mark.parametrize("edi", ["", "  \n ", "LIN+1+I'\n\nPAC+++LCL:67:95'\nPAC+10+1'", "Invalid EDI"])
+def test_decode_bytes_matches_text_errors(edi):
+    """Test the raw-bytes decoder raises the same errors as the text decoder."""
+    with pytest.raises(ValueError) as expected:
+        decode_edi_records(edi)
+    with pytest.raises(ValueError) as actual:
+        decode_edi_bytes(edi.encode())
+    assert str(actual.value) == str(expected.value)
+
+def test_decode_bytes_rejects_invalid_utf8():
+    """Test a body that is not UTF-8 raises UnicodeDecodeError."""
+    with pytest.raises(UnicodeDecodeError):
+        decode_edi_bytes(b"LIN+1+I'\n\xff'")
+
+@pytest.fixture
+def raw_app(monkeypatch):
+    """An app serving the EDI router, with the decode cache off."""
+    monkeypatch.setenv("EDI_DECODE_CACHE_SIZE", "0")
+    monkeypatch.setattr("services.edi_cache._decode_cache", None)
+    app = FastAPI()
+    app.include_router(edi_router)
+    return app
+
+@pytest.mark.parametrize("content_type", ["application/edifact", "text/plain; charset=utf-8"])
+def test_decode_raw_endpoint(raw_app, content_type):
+    """Test /decode/raw decodes a raw body into the same response as /decode."""
+    edi = "LIN+1+I'\r\nPAC+++FCL:67:95'\r\nPAC+10+1'\r\nPCI+1'\r\nRFF+BH:GHI789'"
+    raw = asyncio.run(call(raw_app, "POST", "/v1/edi/decode/raw", {"Content-Type": content_type}, edi.encode()))
+    wrapped = asyncio.run(call(
+        raw_app, "POST", "/v1/edi/decode", {"Content-Type": "application/json"}, json.dumps({"edi": edi}).encode()
+    ))
+    assert raw["status"] == 200
+    assert raw["body"] == wrapped["body"]
+    assert json.loads(raw["body"])["cargo_items"] == [
+        {"cargo_type": "FCL", "package_count": 10, "house_bill_number": "GHI789"}
+    ]
+
+def test_decode_raw_endpoint_rejects_other_media_types(raw_app):
+    """Test /decode/raw answers 415 for a body that is not raw EDI."""
+    response = asyncio.run(call(
+        raw_app, "POST", "/v1/edi/decode/raw", {"Content-Type": "application/json"}, b'{"edi": "LIN+1+I\'"}'
+    ))
+    assert response["status"] == 415
+    assert json.loads(response["body"])["detail"]["code"] == "UNSUPPORTED_MEDIA_TYPE"
+
+def test_decode_raw_endpoint_rejects_invalid_utf8(raw_app):
+    """Test /decode/raw answers 400 INVALID_ENCODING for a body that is not UTF-8."""
+    response = asyncio.run(call(
+        raw_app, "POST", "/v1/edi/decode/raw", {"Content-Type": "application/edifact"}, b"LIN+1+I'\n\xff'"
+    ))
+    assert response["status"] == 400
+    assert json.loads(response["body"])["detail"]["code"] == "INVALID_ENCODING"
+
+def test_decode_raw_endpoint_rejects_empty_body(raw_app):
+    """Test /decode/raw answers 400 EMPTY_EDI for an empty body."""
+    response = asyncio.run(call(raw_app, "POST", "/v1/edi/decode/raw", {"Content-Type": "application/edifact"}))
+    assert response["status"] == 400
+    assert json.loads(response["body"])["detail"]["code"] == "EMPTY_EDI"
@@ -1,5 +1,5 @@
 import pytest
-from services.edi_generator import CargoItem, generate_edi_message, generate_edi_segment
+from services.edi_generator import CargoItem, generate_edi_message, generate_edi_segment, iter_edi_message
 
 def test_generate_edi_message():
     """Test generating EDI message from cargo items."""
@@ -147,4 +147,25 @@ def test_generate_segment():
     assert "LIN+1+I'" in segment
     assert "PAC+++LCL:67:95'" in segment
     assert "PAC+10+1'" in segment
-    assert "RFF+AAQ:ABC1234567'" in segment 
\ No newline at end of file
+    assert "RFF+AAQ:ABC1234567'" in segment 
+
+
+def test_iter_edi_message_matches_generate():
+    """Test streamed chunks concatenate to the generated message."""
+    cargo_items = [
+        CargoItem(
+            cargo_type="LCL",
+            package_count=idx,
+            container_number=f"ABC{idx}" if idx % 2 else None,
+            house_bill_number=f"GHI{idx}" if idx % 3 else None
+        )
+        for idx in range(1, 8)
+    ]
+
+    chunks = list(iter_edi_message(cargo_items, items_per_chunk=3))
+    assert len(chunks) == 3
+    assert "".join(chunks) == generate_edi_message(cargo_items)
+
+def test_iter_edi_message_empty_list():
+    """Test streaming an empty list of cargo items yields nothing."""
+    assert list(iter_edi_message([])) == []
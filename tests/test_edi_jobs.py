@@ -0,0 +1,121 @@
+import asyncio
+import json
+import time
+import pytest
+from fastapi import FastAPI
+from api.v1.edi.jobs import router as jobs_router
+from services.edi_generator import generate_edi_message
+from services.edi_jobs import JobRunner, JobStore, run_job
+from services.form_validator import EDIFormRequest
+from tests.conftest import call
+
+BOOKING = {"cargo_items": [{"cargo_type": "FCL", "package_count": index + 1} for index in range(1200)]}
+
+@pytest.fixture
+def store(tmp_path):
+    """A job store in a fresh SQLite file."""
+    return JobStore(str(tmp_path / "jobs.db"), ttl=60)
+
+def test_jobs_are_claimed_once_in_order(store):
+    """Test queued jobs are claimed oldest first, each by one claimer only."""
+    first = store.create("decode", b"{}")
+    second = store.create("generate", b"{}")
+    assert store.claim() == first.id
+    assert store.claim() == second.id
+    assert store.claim() is None
+    assert store.get(first.id).state == "running"
+
+def test_lost_jobs_are_claimed_again(store):
+    """Test a job still running after its lease is queued again, and other running jobs are left alone."""
+    job = store.create("decode", b"{}")
+    assert store.claim() == job.id
+    assert store.claim() is None
+    store.lease = 0
+    assert store.claim() == job.id
+    assert store.get(job.id).state == "running"
+
+def test_finished_jobs_expire(store):
+    """Test a finished job keeps its outcome until its TTL, then is gone."""
+    job = store.create("decode", b"{}")
+    store.claim()
+    store.finish(job.id, 3, '{"status":"success"}', None)
+    finished = store.get(job.id)
+    assert finished.state == "succeeded"
+    assert finished.items_processed == 3
+    assert finished.result_size == len('{"status":"success"}')
+    assert store.result(job.id) == '{"status":"success"}'
+    assert store.payload(job.id) == ("decode", None)
+
+    store.ttl = 0
+    store.finish(job.id, 3, None, {"message": "Job failed", "code": "JOB_ERROR"})
+    assert store.get(job.id) is None
+    assert store.delete_expired() == 1
+
+def test_run_job_matches_synchronous_endpoints(store):
+    """Test generate and decode jobs store the bodies /generate and /decode would return, with progress."""
+    booking = {"type": "generate", **BOOKING}
+    job = store.create("generate", json.dumps(booking).encode())
+    store.claim()
+    assert run_job(store, job.id) == "succeeded"
+    result = json.loads(store.result(job.id))
+    edi = generate_edi_message(EDIFormRequest.model_validate(BOOKING).cargo_items)
+    assert result == {"status": "success", "edi": edi, "item_count": 1200}
+    finished = store.get(job.id)
+    assert (finished.items_processed, finished.items_total) == (1200, 1200)
+
+    job = store.create("decode", json.dumps({"type": "decode", "edi": edi}).encode())
+    store.claim()
+    assert run_job(store, job.id) == "succeeded"
+    items = json.loads(store.result(job.id))["cargo_items"]
+    assert items == BOOKING["cargo_items"]
+    assert store.get(job.id).items_processed == 1200
+
+def test_failed_jobs_report_errors(store):
+    """Test invalid messages and bookings fail with the synchronous endpoints' error codes."""
+    job = store.create("decode", json.dumps({"type": "decode", "edi": "LIN+1"}).encode())
+    assert run_job(store, job.id) == "failed"
+    assert store.get(job.id).error["code"] == "DECODE_ERROR"
+
+    bad = {"type": "generate", "cargo_items": [{"cargo_type": "XX", "package_count": 1}]}
+    job = store.create("generate", json.dumps(bad).encode())
+    assert run_job(store, job.id) == "failed"
+    error = store.get(job.id).error
+    assert error["code"] == "VALIDATION_ERROR"
+    assert error["errors"][0]["loc"] == ["cargo_items", 0, "cargo_type"]
+    assert store.result(job.id) is None
+
+def test_submitted_job_runs_in_background(store, monkeypatch):
+    """Test a job is accepted with 202 and Location, run by the job pool and its result served."""
+    runner = JobRunner(store, workers=1, nice=0, poll_interval=0.05)
+    monkeypatch.setattr("services.edi_jobs._job_store", store)
+    monkeypatch.setattr("services.edi_jobs._job_runner", runner)
+    app = FastAPI()
+    app.include_router(jobs_router)
+    body = json.dumps({"type": "generate", **BOOKING}).encode()
+    headers = {"Content-Type": "application/json"}
+
+    async def scenario():
+        runner.start()
+        try:
+            accepted = await call(app, "POST", "/v1/edi/jobs", headers, body)
+            deadline = time.monotonic() + 30
+            while True:
+                polled = await call(app, "GET", accepted["headers"]["location"])
+                if b'"state":"succeeded"' in polled["body"] or time.monotonic() > deadline:
+                    break
+                await asyncio.sleep(0.05)
+            missing = await call(app, "GET", "/v1/edi/jobs/unknown")
+            empty = await call(app, "POST", "/v1/edi/jobs", headers, b'{"type":"decode","edi":""}')
+        finally:
+            await runner.stop()
+        return accepted, polled, missing, empty
+
+    accepted, polled, missing, empty = asyncio.run(scenario())
+    assert accepted["status"] == 202
+    assert json.loads(accepted["body"])["job"]["state"] == "queued"
+    response = json.loads(polled["body"])
+    assert response["job"]["state"] == "succeeded"
+    assert response["result"]["item_count"] == 1200
+    assert missing["status"] == 404
+    assert b'"code":"JOB_NOT_FOUND"' in missing["body"]
+    assert empty["status"] == 400
@@ -0,0 +1,117 @@
+import contextvars
+import os
+import logging
+import pytest
+from funcs.utils.edi_logging import BackgroundQueueHandler, PayloadPreview, capture_request_logs, create_file_handler, log_edi
+from funcs.utils.stage_timing import collect_stage_timings
+
+def test_capture_request_logs_collects_lines():
+    """Test log lines emitted inside a capture are collected."""
+    with capture_request_logs() as captured:
+        log_edi("info", "captured line")
+    assert any("captured line" in line for line in captured)
+
+def test_capture_request_logs_disabled():
+    """Test nothing is captured when capture is not requested."""
+    with capture_request_logs(False) as captured:
+        log_edi("info", "not captured")
+    assert captured is None
+
+def test_capture_request_logs_is_bounded():
+    """Test the capture keeps only the most recent lines."""
+    with capture_request_logs(max_records=3) as captured:
+        for idx in range(10):
+            log_edi("info", f"line {idx}")
+    assert len(captured) == 3
+    assert "line 9" in captured[-1]
+
+def test_capture_request_logs_isolated_per_context():
+    """Test lines from another context do not leak into a capture."""
+    def other_request():
+        with capture_request_logs() as other:
+            log_edi("info", "other request")
+        return other
+
+    with capture_request_logs() as captured:
+        other = contextvars.copy_context().run(other_request)
+        log_edi("info", "this request")
+    assert not any("other request" in line for line in captured)
+    assert any("other request" in line for line in other)
+
+def make_record(message):
+    return logging.LogRecord("EDIService", logging.INFO, __file__, 1, message, None, None)
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+def test_background_queue_handler_writes_on_listener_thread():
+    """Test records reach the sinks through the background writer."""
+    sink = ListHandler()
+    handler = BackgroundQueueHandler([sink], maxsize=10)
+    handler.start()
+    handler.handle(make_record("first"))
+    handler.handle(make_record("second"))
+    handler.stop()
+    assert sink.messages == ["first", "second"]
+
+def test_background_queue_handler_drop_newest():
+    """Test a full queue discards incoming records by default."""
+    handler = BackgroundQueueHandler([], maxsize=2)
+    for message in ("a", "b", "c"):
+        handler.handle(make_record(message))
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ["a", "b"]
+    assert handler.dropped == 1
+
+def test_background_queue_handler_drop_oldest():
+    """Test the drop_oldest policy evicts the oldest queued record."""
+    handler = BackgroundQueueHandler([], maxsize=2, drop_policy="drop_oldest")
+    for message in ("a", "b", "c"):
+        handler.handle(make_record(message))
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == ["b", "c"]
+    assert handler.dropped == 1
+
+def test_background_queue_handler_times_queue_put():
+    """Test only handing records to the writer thread counts as the request's log stage."""
+    handler = BackgroundQueueHandler([], maxsize=10)
+    handler.handle(make_record("untimed"))
+    with collect_stage_timings() as timings:
+        handler.handle(make_record("a"))
+        handler.handle(make_record("b"))
+    assert list(timings.durations) == ["log"]
+    assert handler.queue.qsize() == 3
+
+def test_background_queue_handler_rejects_unknown_policy():
+    """Test an unknown drop policy is rejected."""
+    with pytest.raises(ValueError):
+        BackgroundQueueHandler([], maxsize=2, drop_policy="spill")
+
+def test_payload_preview_is_bounded(monkeypatch):
+    """Test payload previews stay small however large the payload is."""
+    payload = {"cargo_items": [{"cargo_type": "LCL", "package_count": 1}] * 10000}
+    preview = str(PayloadPreview(payload))
+    assert preview.startswith("{'cargo_items': [{")
+    assert len(preview) < 300
+
+    monkeypatch.setenv("EDI_LOG_PAYLOAD_LIMIT", "10")
+    assert str(PayloadPreview(payload)).endswith("more chars)")
+
+    monkeypatch.setenv("EDI_LOG_PAYLOAD_LIMIT", "0")
+    assert str(PayloadPreview(payload)) == "<payload omitted>"
+
+def test_log_file_per_process(monkeypatch, tmp_path):
+    """Test {pid} in EDI_LOG_FILE gives each process its own file."""
+    monkeypatch.setenv("EDI_LOG_FILE", str(tmp_path / "edi.{pid}.log"))
+    handler = create_file_handler()
+    assert handler.baseFilename == str(tmp_path / f"edi.{os.getpid()}.log")
+    handler.close()
+
+    monkeypatch.delenv("EDI_LOG_FILE")
+    monkeypatch.chdir(tmp_path)
+    handler = create_file_handler()
+    assert handler.baseFilename == str(tmp_path / f"edi.{os.getpid()}.log")
+    handler.close()
@@ -0,0 +1,46 @@
+import json
+from starlette.responses import JSONResponse
+from services.edi_decoder import DecodedCargoItem, decode_edi_records
+from services.edi_serializer import cargo_items_json, dump_cargo_item, dump_cargo_items, dump_envelope
+
+def test_dump_cargo_item_omits_none_fields():
+    """Test None fields are left out of the encoded item."""
+    item = DecodedCargoItem(cargo_type="LCL", package_count=10, house_bill_number="GHI1")
+    assert dump_cargo_item(item) == '{"cargo_type":"LCL","package_count":10,"house_bill_number":"GHI1"}'
+
+def test_dump_cargo_items_matches_json_encoding():
+    """Test the encoder produces the same JSON as encoding the item dicts."""
+    items = [
+        DecodedCargoItem("FCL", 1, "ABC123", "DEF456", "GHI789"),
+        DecodedCargoItem("LCL", 22, master_bill_number="Größe1"),
+    ]
+    expected = json.dumps([item.to_dict() for item in items], ensure_ascii=False, separators=(",", ":"))
+    assert dump_cargo_items(items) == expected.encode("utf-8")
+
+def test_dump_cargo_items_empty():
+    """Test encoding an empty item list."""
+    assert dump_cargo_items([]) == b"[]"
+
+def test_dump_decoded_records():
+    """Test encoding records straight from the decoder."""
+    edi = """LIN+1+I'
+PAC+++LCL:67:95'
+PAC+10+1'
+PCI+1'
+RFF+AAQ:ABC1234567'"""
+
+    assert json.loads(dump_cargo_items(decode_edi_records(edi))) == [
+        {"cargo_type": "LCL", "package_count": 10, "container_number": "ABC1234567"}
+    ]
+
+def test_dump_envelope_matches_json_response():
+    """Test envelopes encode exactly like Starlette's JSONResponse."""
+    items = [DecodedCargoItem("LCL", 3, container_number="ABC1")]
+    envelope = {
+        "status": "success",
+        "edi": "LIN+1+I'\nPAC+++LCL:67:95'\nRFF+AAQ:\"x\"'",
+        "item_count": 1,
+        "logs": ["a - b", "ü"],
+    }
+    expected = JSONResponse(dict(envelope, cargo_items=[item.to_dict() for item in items])).body
+    assert dump_envelope(dict(envelope, cargo_items=cargo_items_json(items))) == expected
@@ -1,5 +1,10 @@
+import asyncio
+import json
 import pytest
-from services.edi_validator import validate_edi_message
+from fastapi import FastAPI
+from api.v1.edi.router import MAX_VALIDATE_MAX_ERRORS, router as edi_router
+from services.edi_validator import check_edi_message, validate_edi_message
+from tests.conftest import call
 
 def test_valid_edi_message():
     """Test a valid EDI message with all required fields."""
@@ -247,4 +252,117 @@ RFF+MB:DEF1234567'"""
     
     is_valid, errors = validate_edi_message(invalid_edi)
     assert not is_valid
-    assert any("must be a whole number" in error for error in errors) 
\ No newline at end of file
+    assert any("must be a whole number" in error for error in errors) 
+
+
+def test_missing_segments_after_lin():
+    """Test every missing required segment is reported with its expected line."""
+    is_valid, errors = validate_edi_message("LIN+1+I'")
+    assert not is_valid
+    assert errors == [
+        "Line 2: Expected PAC+++<cargo_type>:67:95'",
+        "Line 3: Expected PAC+<number>+1'"
+    ]
+
+def test_check_edi_message_structured_errors():
+    """Test structured errors carry code, line and UTF-8 byte offset."""
+    edi = "LIN+1+I'\nPAC+++LCL:67:95'\nPAC+1+1'\nPCI+1'\nRFF+AAQ:É-1'"
+    result = check_edi_message(edi)
+    assert not result.valid
+    assert [(issue.code, issue.line, issue.offset) for issue in result.issues] == [
+        ("INVALID_RFF_CHARACTERS", 5, edi.encode().index(b"RFF"))
+    ]
+    assert result.issues[0].message == validate_edi_message(edi)[1][0]
+    assert result.truncated is False
+
+def test_check_edi_message_multibyte_offsets():
+    """Test byte offsets of several errors after multi-byte characters, whatever their order."""
+    edi = "LIN+1+I'\nPAC+++LCL:67:95'\nPAC+1+1'\nPCI+1'\nRFF+AAQ:É-1'\n\nLIN+2+I'\nPAC+++FCL:67:95'\nPAC+1+1'\nPCI+1'\nRFF+MB:Ü-'"
+    data = edi.encode()
+    result = check_edi_message(edi)
+    assert [(issue.code, issue.offset) for issue in result.issues] == [
+        ("EMPTY_LINES", data.index(b"\n\n") + 1),
+        ("INVALID_RFF_CHARACTERS", data.index(b"RFF")),
+        ("INVALID_RFF_CHARACTERS", data.rindex(b"RFF"))
+    ]
+
+def test_check_edi_message_fail_fast():
+    """Test fail_fast stops at the first error."""
+    result = check_edi_message("garbage\n" * 10000, fail_fast=True)
+    assert len(result.issues) == 1
+    assert result.issues[0].code == "MISSING_TERMINATOR"
+    assert result.truncated
+    assert result.line_count < 10000
+
+def test_check_edi_message_max_errors():
+    """Test max_errors caps the errors reported in the usual order."""
+    edi = "garbage\n" * 100
+    full = check_edi_message(edi)
+    capped = check_edi_message(edi, max_errors=5)
+    assert len(capped.issues) == 5
+    assert set(capped.issues) <= set(full.issues)
+    assert capped.truncated
+    assert not full.truncated
+
+def test_check_edi_message_end_and_empty_line_offsets():
+    """Test offsets of empty-line and end-of-message errors."""
+    edi = "LIN+1+I'\n\nPAC+++LCL:67:95'"
+    result = check_edi_message(edi)
+    assert [(issue.code, issue.offset) for issue in result.issues] == [
+        ("EMPTY_LINES", 9),
+        ("EXPECTED_PACKAGE_COUNT", len(edi))
+    ]
+
+def test_reference_line_without_qualifier_separator():
+    """Test a non-RFF line without ':' after PCI+1' is reported, not raised."""
+    is_valid, errors = validate_edi_message("LIN+1+I'\nPAC+++LCL:67:95'\nPAC+1+1'\nPCI+1'\nFOO'")
+    assert not is_valid
+    assert errors == ["Line 5: Expected RFF+AAQ/MB/BH after PCI+1'"]
+
+def post_validate(request):
+    app = FastAPI()
+    app.include_router(edi_router)
+    body = json.dumps(request).encode()
+    response = asyncio.run(call(app, "POST", "/v1/edi/validate", {"Content-Type": "application/json"}, body))
+    return response["status"], json.loads(response["body"])
+
+def test_validate_endpoint_valid_message():
+    """Test /validate reports a valid message with no errors."""
+    status, body = post_validate({"edi": "LIN+1+I'\nPAC+++LCL:67:95'\nPAC+10+1'"})
+    assert status == 200
+    assert body == {
+        "status": "success",
+        "valid": True,
+        "error_count": 0,
+        "truncated": False,
+        "line_count": 3,
+        "errors": []
+    }
+
+def test_validate_endpoint_max_errors():
+    """Test /validate stops at max_errors and reports the result as truncated."""
+    status, body = post_validate({"edi": "garbage\n" * 100, "max_errors": 5})
+    assert status == 200
+    assert body["valid"] is False
+    assert body["error_count"] == len(body["errors"]) == 5
+    assert body["truncated"] is True
+    assert set(body["errors"][0]) == {"code", "line", "offset", "message"}
+    assert (body["errors"][0]["code"], body["errors"][0]["line"], body["errors"][0]["offset"]) == ("MISSING_TERMINATOR", 1, 0)
+
+    status, body = post_validate({"edi": "garbage\n" * 100, "fail_fast": True})
+    assert body["error_count"] == 1
+    assert body["truncated"] is True
+
+    status, body = post_validate({"edi": "garbage\n" * 3})
+    assert body["truncated"] is False
+
+def test_validate_endpoint_rejects_bad_requests():
+    """Test /validate answers 400 EMPTY_EDI for an empty message and 422 for max_errors out of range."""
+    status, body = post_validate({"edi": ""})
+    assert status == 400
+    assert body["detail"]["code"] == "EMPTY_EDI"
+
+    for max_errors in (0, MAX_VALIDATE_MAX_ERRORS + 1):
+        status, body = post_validate({"edi": "garbage", "max_errors": max_errors})
+        assert status == 422
+        assert body["detail"][0]["loc"] == ["body", "max_errors"]
@@ -1,4 +1,5 @@
 import pytest
+from pydantic import ValidationError
 from services.form_validator import EDIFormRequest
 from services.edi_generator import CargoItem
 
@@ -225,4 +226,28 @@ def test_mixed_empty_and_valid_cargo_items():
     assert all(msg in str(exc_info.value).lower() for msg in [
         "input should be a valid string",
         "input should be a valid integer"
-    ]) 
\ No newline at end of file
+    ]) 
+
+
+def test_cargo_item_fields_are_normalized():
+    """Test cargo types are upper-cased and references stripped."""
+    form_data = EDIFormRequest.model_validate({"cargo_items": [{
+        "cargo_type": " fcx ",
+        "package_count": "3",
+        "container_number": " ABC123 "
+    }]})
+    assert form_data.cargo_items == [CargoItem(cargo_type="FCX", package_count=3, container_number="ABC123")]
+
+
+def test_rule_errors_are_reported_per_field():
+    """Test every failed rule is reported at its item and field."""
+    with pytest.raises(ValidationError) as exc_info:
+        EDIFormRequest.model_validate({"cargo_items": [
+            {"cargo_type": "LCL", "package_count": 1},
+            {"cargo_type": "BULK", "package_count": 0, "house_bill_number": "GHI_1"}
+        ]})
+    assert [(error["loc"], error["msg"]) for error in exc_info.value.errors()] == [
+        (("cargo_items", 1, "cargo_type"), "Value error, Cargo type must be either LCL or FCL"),
+        (("cargo_items", 1, "package_count"), "Value error, Package count must be greater than 0"),
+        (("cargo_items", 1, "house_bill_number"), "Value error, Invalid house bill number format")
+    ]
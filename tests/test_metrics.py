@@ -0,0 +1,87 @@
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from api.metrics import MetricsMiddleware, REQUESTS, RESPONSE_SIZE
+from funcs.utils.metrics import Counter, Histogram, MetricsRegistry, monitor_event_loop_lag
+
+async def call(app, method, path, body=b""):
+    """Send one request through an ASGI app and return the response status."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = []
+
+    async def receive():
+        return messages.pop() if messages else {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status.append(message["status"])
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": method, "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": [], "server": ("test", 80)
+    }
+    await app(scope, receive, send)
+    return status[0]
+
+def test_histogram_renders_cumulative_buckets():
+    """Test histogram buckets are cumulative and end with +Inf, sum and count."""
+    registry = MetricsRegistry()
+    histogram = Histogram("test_seconds", "Test latency", ("route",), registry=registry, buckets=(0.1, 1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, "/a")
+    assert registry.render().splitlines() == [
+        "# HELP test_seconds Test latency",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{route="/a",le="0.1"} 2',
+        'test_seconds_bucket{route="/a",le="1"} 3',
+        'test_seconds_bucket{route="/a",le="+Inf"} 4',
+        'test_seconds_sum{route="/a"} 3.65',
+        'test_seconds_count{route="/a"} 4'
+    ]
+
+def test_counter_escapes_label_values():
+    """Test label values are escaped and duplicate names are rejected."""
+    registry = MetricsRegistry()
+    counter = Counter("test_total", "Test counter", ("rule",), registry=registry)
+    counter.inc('a"b\\c')
+    counter.inc('a"b\\c', amount=2)
+    assert 'test_total{rule="a\\"b\\\\c"} 3' in registry.render()
+    with pytest.raises(ValueError):
+        Counter("test_total", "Again", registry=registry)
+
+def test_middleware_labels_requests_by_route_template():
+    """Test requests are counted under their route template, unknown paths under one label."""
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"item_id": item_id}
+
+    app.add_middleware(MetricsMiddleware)
+    before = REQUESTS.value("GET", "/items/{item_id}", "200")
+    unmatched = REQUESTS.value("GET", "unmatched", "404")
+
+    assert asyncio.run(call(app, "GET", "/items/1")) == 200
+    assert asyncio.run(call(app, "GET", "/items/2")) == 200
+    assert asyncio.run(call(app, "GET", "/missing/3")) == 404
+
+    assert REQUESTS.value("GET", "/items/{item_id}", "200") == before + 2
+    assert REQUESTS.value("GET", "unmatched", "404") == unmatched + 1
+    assert RESPONSE_SIZE.count("GET", "/items/{item_id}") >= 2
+
+def test_event_loop_lag_is_recorded():
+    """Test blocking the event loop shows up as lag."""
+    histogram = Histogram("test_lag_seconds", "Test lag", buckets=(0.01, 0.1))
+
+    async def block_loop():
+        monitor = asyncio.create_task(monitor_event_loop_lag(0.01, histogram))
+        await asyncio.sleep(0)
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+        monitor.cancel()
+
+    asyncio.run(block_loop())
+    assert histogram.count() >= 1
+    assert histogram.total() >= 0.03
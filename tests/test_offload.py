@@ -0,0 +1,75 @@
+import asyncio
+import threading
+import pytest
+from fastapi import FastAPI
+from api.v1.edi import router as edi_router
+from funcs.utils.offload import OFFLOAD_CALLS, ExecutorSaturated, OffloadExecutor
+from funcs.utils.stage_timing import collect_stage_timings, stage
+from tests.conftest import call
+
+def current_thread_name(_):
+    with stage("decode"):
+        return threading.current_thread().name
+
+def test_small_payloads_run_inline():
+    """Test payloads below the threshold run on the calling thread."""
+    executor = OffloadExecutor("thread", threshold=1024, workers=1, queue_size=0)
+    inline = OFFLOAD_CALLS.value("inline")
+    assert asyncio.run(executor.run(10, current_thread_name, None)) == threading.current_thread().name
+    assert OFFLOAD_CALLS.value("inline") == inline + 1
+    executor.shutdown()
+
+def test_large_payloads_run_in_threads_with_request_context():
+    """Test large payloads run in the pool and still record their stages."""
+    executor = OffloadExecutor("thread", threshold=1024, workers=1, queue_size=0)
+
+    async def offload():
+        with collect_stage_timings() as timings:
+            name = await executor.run(4096, current_thread_name, None)
+        return name, timings
+
+    name, timings = asyncio.run(offload())
+    assert name.startswith("edi-offload")
+    assert set(timings.durations) == {"decode", "queue"}
+    assert executor.in_flight == 0
+    executor.shutdown()
+
+def test_full_executor_rejects_calls():
+    """Test calls beyond workers plus queue size are rejected, not queued."""
+    executor = OffloadExecutor("thread", threshold=0, workers=1, queue_size=1)
+    release = threading.Event()
+
+    async def saturate():
+        running = [asyncio.ensure_future(executor.run(1, release.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturated):
+            await executor.run(1, release.wait, 5)
+        release.set()
+        return await asyncio.gather(*running)
+
+    assert asyncio.run(saturate()) == [True, True]
+    executor.shutdown()
+
+def test_unknown_executor_is_rejected():
+    """Test a misspelled EDI_OFFLOAD_EXECUTOR fails loudly."""
+    with pytest.raises(ValueError):
+        OffloadExecutor("threads", threshold=0, workers=1, queue_size=0)
+
+def test_large_generate_bodies_are_parsed_off_the_event_loop(monkeypatch):
+    """Test /generate parses and fingerprints a large body in an offload thread."""
+    executor = OffloadExecutor("thread", threshold=1024, workers=1, queue_size=0)
+    monkeypatch.setattr("funcs.utils.offload._offload_executor", executor)
+    threads = []
+
+    def fingerprint(payload):
+        threads.append(threading.current_thread().name)
+        return str(len(payload["cargo_items"]))
+
+    monkeypatch.setattr(edi_router, "make_payload_fingerprint", fingerprint)
+    app = FastAPI()
+    app.include_router(edi_router.router)
+    booking = '{"cargo_items": [%s]}' % ", ".join(['{"cargo_type": "FCL", "package_count": 1}'] * 100)
+    response = asyncio.run(call(app, "POST", "/v1/edi/generate", {"Content-Type": "application/json"}, booking.encode()))
+    assert response["status"] == 200
+    assert len(threads) == 1 and threads[0].startswith("edi-offload")
+    executor.shutdown()
@@ -0,0 +1,89 @@
+import asyncio
+import marshal
+import pstats
+from fastapi import FastAPI
+from api.diagnostics import ProfilingMiddleware, ServerTimingMiddleware, router as diagnostics_router
+from funcs.utils.profiling import ProfileStore
+from funcs.utils.stage_timing import collect_stage_timings, stage
+from tests.conftest import call
+
+def make_app():
+    app = FastAPI()
+
+    @app.post("/work")
+    async def work():
+        with stage("render"):
+            sum(range(1000))
+        with stage("render"):
+            sum(range(1000))
+        return {"status": "success"}
+
+    app.include_router(diagnostics_router)
+    app.add_middleware(ProfilingMiddleware)
+    app.add_middleware(ServerTimingMiddleware)
+    return app
+
+def test_stages_accumulate_into_server_timing():
+    """Test repeated stages add up and the header ends with the total."""
+    with stage("render"):
+        pass  # Outside a timed request nothing is recorded
+    with collect_stage_timings() as timings:
+        with stage("parse"):
+            pass
+        with stage("render"):
+            pass
+        with stage("render"):
+            pass
+    assert list(timings.durations) == ["parse", "render"]
+    entries = timings.server_timing().split(", ")
+    assert [entry.split(";")[0] for entry in entries] == ["parse", "render", "total"]
+    assert all(entry.split(";")[1].startswith("dur=") for entry in entries)
+
+def test_middleware_adds_server_timing_header():
+    """Test responses report the stages their handler went through."""
+    response = asyncio.run(call(make_app(), "POST", "/work"))
+    assert response["status"] == 200
+    assert response["headers"]["server-timing"].startswith("render;dur=")
+    assert "x-profile-id" not in response["headers"]
+
+def test_profile_store_keeps_last_profiles():
+    """Test only one profile runs at a time and the oldest ones are dropped."""
+    store = ProfileStore(2)
+    profile_ids = []
+    for _ in range(3):
+        profile_id, profiler = store.try_start()
+        assert store.try_start() is None
+        sum(range(1000))
+        store.finish(profile_id, profiler, "POST", "/work", 200, 0.0, 0.001)
+        profile_ids.append(profile_id)
+
+    profiles = store.list()
+    assert [profile.id for profile in profiles] == profile_ids[:0:-1]
+    assert store.get(profile_ids[0]) is None
+    assert "function calls" in profiles[0].text("tottime", 5)
+    assert isinstance(marshal.loads(profiles[0].stats), dict)
+
+def test_profiling_requires_token(monkeypatch, tmp_path):
+    """Test only requests with the profiling token are profiled and can read profiles."""
+    app = make_app()
+    response = asyncio.run(call(app, "GET", "/v1/debug/profiles"))
+    assert response["status"] == 404
+
+    monkeypatch.setenv("EDI_PROFILING_TOKEN", "secret")
+    monkeypatch.setattr("funcs.utils.profiling._profile_store", None)
+    response = asyncio.run(call(app, "POST", "/work", {"X-Profile-Token": "wrong"}))
+    assert "x-profile-id" not in response["headers"]
+    assert asyncio.run(call(app, "GET", "/v1/debug/profiles", {"X-Profile-Token": "wrong"}))["status"] == 403
+
+    response = asyncio.run(call(app, "POST", "/work", {"X-Profile-Token": "secret"}))
+    profile_id = response["headers"]["x-profile-id"]
+
+    listing = asyncio.run(call(app, "GET", "/v1/debug/profiles", {"X-Profile-Token": "secret"}))
+    assert b'"path":"/work"' in listing["body"]
+    assert "x-profile-id" not in listing["headers"]
+
+    download = asyncio.run(call(app, "GET", f"/v1/debug/profiles/{profile_id}", {"X-Profile-Token": "secret"}))
+    assert download["headers"]["content-type"] == "application/octet-stream"
+    profile_file = tmp_path / "request.prof"
+    profile_file.write_bytes(download["body"])
+    assert pstats.Stats(str(profile_file)).total_calls > 0
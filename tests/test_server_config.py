@@ -0,0 +1,52 @@
+import uvicorn
+from funcs.utils.server_config import load_server_config, read_cgroup_cpu_limit
+from server import Supervisor
+
+def test_cgroup_cpu_limit(tmp_path):
+    """Test CPU quotas are read from cgroup v2, then v1, and absent quotas give None."""
+    assert read_cgroup_cpu_limit(str(tmp_path)) is None
+
+    (tmp_path / "cpu.max").write_text("max 100000\n")
+    assert read_cgroup_cpu_limit(str(tmp_path)) is None
+    (tmp_path / "cpu.max").write_text("150000 100000\n")
+    assert read_cgroup_cpu_limit(str(tmp_path)) == 1.5
+
+    v1 = tmp_path / "v1"
+    (v1 / "cpu").mkdir(parents=True)
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("200000\n")
+    (v1 / "cpu" / "cpu.cfs_period_us").write_text("100000\n")
+    assert read_cgroup_cpu_limit(str(v1)) == 2.0
+    (v1 / "cpu" / "cpu.cfs_quota_us").write_text("-1\n")
+    assert read_cgroup_cpu_limit(str(v1)) is None
+
+def test_server_config_from_environment(monkeypatch):
+    """Test settings come from the environment and are valid uvicorn options."""
+    monkeypatch.setenv("EDI_WORKERS", "3")
+    monkeypatch.setenv("PORT", "8080")
+    monkeypatch.setenv("EDI_SERVER_LOOP", "asyncio")
+    monkeypatch.setenv("EDI_SERVER_HTTP", "h11")
+    monkeypatch.setenv("EDI_MAX_REQUESTS", "1000")
+    monkeypatch.setenv("EDI_MAX_CONNECTIONS", "500")
+    config = load_server_config()
+    assert config.workers == 3
+    assert config.port == 8080
+    assert config.max_requests_jitter == 100
+    assert config.max_connections == 500
+
+    options = uvicorn.Config("main:app", **config.uvicorn_options())
+    assert options.loop == "asyncio"
+    assert options.http == "h11"
+    assert options.limit_concurrency == 500
+    assert options.timeout_keep_alive == config.keepalive_timeout
+
+def test_worker_restarts_are_spread(monkeypatch):
+    """Test each worker gets its own request limit within the jitter, or none."""
+    monkeypatch.setenv("EDI_MAX_REQUESTS", "1000")
+    monkeypatch.setenv("EDI_MAX_REQUESTS_JITTER", "50")
+    supervisor = Supervisor(load_server_config())
+    limits = {supervisor.worker_max_requests() for _ in range(50)}
+    assert min(limits) >= 1000 and max(limits) <= 1050
+    assert len(limits) > 1
+
+    monkeypatch.setenv("EDI_MAX_REQUESTS", "0")
+    assert Supervisor(load_server_config()).worker_max_requests() is None
@@ -0,0 +1,81 @@
+import asyncio
+import pytest
+from fastapi import FastAPI
+from api.v1.health import router as health_router
+from api.warmup import WARMUP_BOOKING, WARMUP_EDI, Warmup, get_warmup, start_warmup
+from services.edi_generator import generate_edi_message
+from services.form_validator import EDIFormRequest
+from funcs.utils.metrics import VALIDATION_FAILURES
+from funcs.utils.offload import shutdown_offload_executor
+from funcs.utils.process_pool import shutdown_process_pool
+from tests.conftest import call
+
+@pytest.fixture
+def warmup(monkeypatch):
+    """A fresh warmup state in place of the process-wide one."""
+    state = Warmup()
+    monkeypatch.setattr("api.warmup._warmup", state)
+    monkeypatch.setenv("EDI_PROCESS_POOL_WORKERS", "1")
+    yield state
+    shutdown_offload_executor()
+    shutdown_process_pool()
+
+def test_warmup_samples_match():
+    """Test the warmup EDI is the warmup booking rendered, so both stay valid together."""
+    assert generate_edi_message(EDIFormRequest.model_validate(WARMUP_BOOKING).cargo_items) == WARMUP_EDI
+
+def test_warmup_runs_every_step(warmup):
+    """Test every step runs without errors or validation failures, and openapi only with docs."""
+    failures = sum(value for _, _, value in VALIDATION_FAILURES.samples())
+    warmup.run(FastAPI())
+    assert warmup.status == "done"
+    assert warmup.errors == {}
+    assert list(warmup.durations) == [
+        "form_validation", "generate", "decode", "validate", "serialize", "workers", "openapi", "total"
+    ]
+    assert sum(value for _, _, value in VALIDATION_FAILURES.samples()) == failures
+
+    warmup.run(FastAPI(openapi_url=None))
+    assert "openapi" not in warmup.durations
+
+def test_failed_step_is_reported(warmup, monkeypatch):
+    """Test a failing step is recorded and the others still run."""
+    def broken():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr("api.warmup.warm_decode", broken)
+    warmup.run(FastAPI(openapi_url=None))
+    assert warmup.status == "failed"
+    assert warmup.errors == {"decode": "boom"}
+    assert warmup.finished
+    assert "serialize" in warmup.durations
+
+def test_readiness_waits_for_background_warmup(warmup, monkeypatch):
+    """Test readiness is 503 until background warmup finishes, while liveness holds."""
+    monkeypatch.setenv("EDI_WARMUP", "background")
+    app = FastAPI()
+    app.include_router(health_router)
+
+    async def scenario():
+        task = await start_warmup(app)
+        assert task is not None
+        starting = await call(app, "GET", "/api/v1/health/ready")
+        live = await call(app, "GET", "/api/v1/health/live")
+        await task
+        ready = await call(app, "GET", "/api/v1/health/ready")
+        return starting, live, ready
+
+    starting, live, ready = asyncio.run(scenario())
+    assert starting["status"] == 503
+    assert b'"status":"starting"' in starting["body"]
+    assert live["status"] == 200
+    assert ready["status"] == 200
+    assert get_warmup().status == "done"
+
+def test_warmup_off(warmup, monkeypatch):
+    """Test EDI_WARMUP=off skips warmup and counts as finished."""
+    monkeypatch.setenv("EDI_WARMUP", "off")
+    assert asyncio.run(start_warmup(FastAPI())) is None
+    assert warmup.status == "off"
+    assert warmup.durations == {}
+    assert warmup.finished